@@ -1,3 +1,14 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Booking
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    """
+    Lets staff find the legacy overlapping bookings flagged by migration 0003.
+    """
+    list_display = ('id', 'listing', 'guest', 'check_in_date', 'check_out_date', 'needs_review')
+    list_filter = ('needs_review',)
+    list_select_related = ('listing', 'guest')
+    readonly_fields = ('needs_review',)
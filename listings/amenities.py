@@ -0,0 +1,192 @@
+# listings/amenities.py
+import re
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+from .caching import bump_versions, get_versions
+
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+# Bumped on every Amenity change, so each process knows when its catalog is stale.
+CATALOG_VERSION_KEY = 'listings:version:amenities'
+
+# Spellings that mean the same amenity, keyed by normalized key.
+ALIASES = {
+    'wireless': 'wifi',
+    'wlan': 'wifi',
+    'internet': 'wifi',
+    'airconditioning': 'ac',
+    'aircon': 'ac',
+    'swimmingpool': 'pool',
+    'freeparking': 'parking',
+}
+
+# Amenities any host may list. Other names are only added to the catalog by staff,
+# so free-text writes cannot use up its Amenity.MAX_BITS bits.
+STANDARD_AMENITIES = frozenset({
+    'wifi', 'kitchen', 'parking', 'washer', 'dryer', 'ac', 'heating', 'pool', 'gym', 'hottub',
+    'workspace', 'petsallowed', 'tv', 'breakfast', 'elevator', 'balcony', 'garden', 'bbq',
+    'fireplace', 'crib', 'beachaccess', 'evcharger', 'smokealarm', 'firstaidkit',
+})
+MAX_NAME_LENGTH = 50  # Amenity.key and Amenity.name
+
+
+def amenity_key(name):
+    """
+    Normalized lookup key for an amenity name: "Wi-Fi" and "wifi" are both "wifi".
+    """
+    key = NON_ALNUM_RE.sub('', (name or '').lower())
+    return ALIASES.get(key, key)
+
+
+def split_amenities(text):
+    """
+    Split the free-text amenities field ("wifi, kitchen, AC") into names.
+    """
+    return [part.strip() for part in re.split(r'[,;\n]', text or '') if part.strip()]
+
+
+class AmenityCatalog:
+    """
+    Process-local cache of the Amenity table: key -> (bit, display name).
+    An unknown key reloads it if another process changed the catalog since it
+    was loaded (see CATALOG_VERSION_KEY), so several processes adding the same
+    amenity agree on its bit; otherwise the key is unknown without a query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._version = None
+
+    def clear(self):
+        with self._lock:
+            self._by_key = None
+
+    def _load(self):
+        from .models import Amenity
+        # The version is read first: a change made during the load leaves it stale, not missed.
+        self._version, = get_versions([CATALOG_VERSION_KEY])
+        return {key: (bit, name) for key, bit, name in Amenity.objects.values_list('key', 'bit', 'name')}
+
+    def entries(self):
+        with self._lock:
+            if self._by_key is None:
+                self._by_key = self._load()
+            return self._by_key
+
+    def lookup(self, key):
+        entry = self.entries().get(key)
+        if entry is None:
+            with self._lock:
+                if self._by_key is None or get_versions([CATALOG_VERSION_KEY]) != [self._version]:
+                    self._by_key = self._load()
+                entry = self._by_key.get(key)
+        return entry
+
+    def changed(self):
+        """
+        Called on every Amenity change: drops this process's copy and marks the others stale.
+        """
+        bump_versions([CATALOG_VERSION_KEY])
+        self.clear()
+
+    def get_or_create(self, name):
+        """
+        Catalog entry for `name`, adding it with the next free bit if it is new.
+        """
+        from .models import Amenity
+        key = amenity_key(name)
+        entry = self.lookup(key)
+        if entry is not None:
+            return entry
+        for _ in range(5):
+            try:
+                with transaction.atomic():
+                    top = Amenity.objects.aggregate(top=Max('bit'))['top']
+                    bit = 0 if top is None else top + 1
+                    if bit >= Amenity.MAX_BITS:
+                        raise ValueError(f'The amenity catalog is full ({Amenity.MAX_BITS} amenities).')
+                    Amenity.objects.create(key=key, name=name, bit=bit)
+            except IntegrityError:
+                pass # Another process took the bit or added the same key first; look again.
+            self.clear()
+            entry = self.lookup(key)
+            if entry is not None:
+                return entry
+        raise IntegrityError(f'Could not add amenity {name!r} to the catalog.')
+
+    def names_for_mask(self, mask):
+        entries = sorted(self.entries().values())
+        return [name for bit, name in entries if mask & (1 << bit)]
+
+    def mask_for(self, names):
+        """
+        Mask of existing amenities; None if any name is not in the catalog,
+        which costs no query unless the catalog changed since it was loaded.
+        """
+        mask = 0
+        for name in names:
+            entry = self.lookup(amenity_key(name))
+            if entry is None:
+                return None
+            mask |= 1 << entry[0]
+        return mask
+
+
+catalog = AmenityCatalog()
+
+
+def amenity_errors(names, allow_new=False):
+    """
+    What is wrong with free-text amenity `names` before they reach the catalog:
+    names that are too long or have no letter or digit, unknown names outside
+    STANDARD_AMENITIES unless `allow_new`, and more new names than free bits.
+    """
+    from .models import Amenity
+    errors = []
+    new_keys = set()
+    for name in names:
+        key = amenity_key(name)
+        if len(name) > MAX_NAME_LENGTH:
+            errors.append(f'{name[:MAX_NAME_LENGTH]}... is longer than {MAX_NAME_LENGTH} characters.')
+        elif not key:
+            errors.append(f'"{name}" is not an amenity name.')
+        elif catalog.lookup(key) is None:
+            if allow_new or key in STANDARD_AMENITIES:
+                new_keys.add(key)
+            else:
+                errors.append(f'Unknown amenity "{name}". Only staff can add amenities to the catalog.')
+    if new_keys and len(catalog.entries()) + len(new_keys) > Amenity.MAX_BITS:
+        errors.append(f'The amenity catalog is full ({Amenity.MAX_BITS} amenities).')
+    return errors
+
+
+def normalize_amenities(text):
+    """
+    Resolve free-text amenities against the catalog, adding unknown ones.
+    Returns the canonical text and its bitmask.
+    """
+    mask = 0
+    names = []
+    for raw in split_amenities(text):
+        if not amenity_key(raw):
+            continue  # punctuation only, nothing to look up
+        bit, name = catalog.get_or_create(raw)
+        if not mask & (1 << bit):
+            mask |= 1 << bit
+            names.append(name)
+    return ', '.join(names), mask
+
+
+def filter_by_amenities(queryset, names):
+    """
+    Listings having every amenity in `names`, as one bitwise test on amenity_mask.
+    """
+    mask = catalog.mask_for(names)
+    if mask is None:
+        return queryset.none()
+    if not mask:
+        return queryset
+    return queryset.alias(matched_amenities=F('amenity_mask').bitand(mask)).filter(matched_amenities=mask)
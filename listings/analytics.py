@@ -0,0 +1,197 @@
+# listings/analytics.py
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+
+from .models import BookedNight, DailyStat, Listing
+from .pricing import from_cents, to_cents
+
+# A booking as the rollup sees it
+BOOKING_FIELDS = ('listing_id', 'check_in_date', 'check_out_date', 'total_price')
+# A night of the occupancy index with the booking that holds it, as the rebuild sees it
+NIGHT_FIELDS = ('listing_id', 'night', 'booking__check_in_date', 'booking__check_out_date', 'booking__total_price')
+PERIODS = ('day', 'week', 'month')
+
+
+def booking_row(booking):
+    return tuple(getattr(booking, field) for field in BOOKING_FIELDS)
+
+
+def expand_nights(bookings):
+    """
+    Expand (listing_id, check_in_date, check_out_date, total_price) tuples into
+    one entry per night without a Python loop over the nights: arrays of the
+    listing id, the night, its revenue in cents and whether it is a check-in.
+    The cents a booking does not divide evenly go to its first nights.
+    """
+    listing_ids, check_ins, check_outs, totals = zip(*bookings)
+    check_ins = np.array(check_ins, dtype='datetime64[D]')
+    lengths = (np.array(check_outs, dtype='datetime64[D]') - check_ins).astype(np.int64)
+    firsts = np.cumsum(lengths) - lengths  # index of each booking's first night
+    position = np.arange(lengths.sum()) - np.repeat(firsts, lengths)
+    base, remainder = np.divmod(np.array([to_cents(total) for total in totals], dtype=np.int64), lengths)
+    return (
+        np.repeat(np.array(listing_ids, dtype=np.int64), lengths),
+        np.repeat(check_ins, lengths) + position,
+        np.repeat(base, lengths) + (position < np.repeat(remainder, lengths)),
+        position == 0,
+    )
+
+
+def build_daily_stats(bookings, model=DailyStat):
+    """
+    Unsaved rollup rows for the nights of `bookings`, given as BOOKING_FIELDS tuples.
+    """
+    bookings = [booking for booking in bookings if booking[2] > booking[1]]
+    if not bookings:
+        return []
+    listing_ids, nights, revenue, check_ins = expand_nights(bookings)
+    return [
+        model(listing_id=listing_id, day=night, booked_nights=1, check_ins=int(check_in), revenue=from_cents(cents))
+        for listing_id, night, cents, check_in in zip(listing_ids.tolist(), nights.tolist(), revenue.tolist(), check_ins)
+    ]
+
+
+def build_night_stats(nights, model=DailyStat):
+    """
+    Unsaved rollup rows for held nights, given as NIGHT_FIELDS tuples: each night
+    gets its booking's share of the revenue, split as in expand_nights().
+    """
+    nights = list(nights)
+    if not nights:
+        return []
+    listing_ids, days, check_ins, check_outs, totals = zip(*nights)
+    check_ins = np.array(check_ins, dtype='datetime64[D]')
+    position = (np.array(days, dtype='datetime64[D]') - check_ins).astype(np.int64)
+    lengths = (np.array(check_outs, dtype='datetime64[D]') - check_ins).astype(np.int64)
+    base, remainder = np.divmod(np.array([to_cents(total) for total in totals], dtype=np.int64), lengths)
+    revenue = base + (position < remainder)
+    return [
+        model(listing_id=listing_id, day=day, booked_nights=1, check_ins=int(first), revenue=from_cents(cents))
+        for listing_id, day, cents, first in zip(listing_ids, days, revenue.tolist(), (position == 0).tolist())
+    ]
+
+
+def apply_booking_change(previous=None, current=None):
+    """
+    Move a booking's nights in the rollup from `previous` to `current` (BOOKING_FIELDS
+    tuples, None for a created or deleted booking). A listing's night belongs to at
+    most one booking (BookedNight's unique constraint), so the rows of the previous
+    stay can be deleted by range.
+    """
+    if previous == current:
+        return
+    if previous:
+        listing_id, check_in, check_out, _ = previous
+        DailyStat.objects.filter(listing_id=listing_id, day__gte=check_in, day__lt=check_out).delete()
+    if current:
+        DailyStat.objects.bulk_create(build_daily_stats([current]))
+
+
+def refresh_daily_stats(stay):
+    """
+    Recompute the rollup of a stay's days (a BOOKING_FIELDS tuple, or None) from
+    the occupancy index, whichever bookings hold them.
+    """
+    if not stay:
+        return
+    listing_id, check_in, check_out, _ = stay
+    DailyStat.objects.filter(listing_id=listing_id, day__gte=check_in, day__lt=check_out).delete()
+    nights = BookedNight.objects.filter(listing_id=listing_id, night__gte=check_in, night__lt=check_out)
+    DailyStat.objects.bulk_create(build_night_stats(nights.values_list(*NIGHT_FIELDS)))
+
+
+def rebuild_daily_stats(batch_size=5000):
+    """
+    Recompute the whole rollup from the occupancy index, `batch_size` nights
+    at a time, in one transaction. Returns the number of rows written.
+
+    Built from the nights rather than the bookings: bookings made before
+    migration 0003 may overlap, and only the one holding a night counts.
+    """
+    written = 0
+    last_pk = 0
+    nights = BookedNight.objects.order_by('pk').values_list('pk', *NIGHT_FIELDS)
+    with transaction.atomic():
+        DailyStat.objects.all().delete()
+        while True:
+            batch = list(nights.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return written
+            last_pk = batch[-1][0]
+            stats = build_night_stats(row[1:] for row in batch)
+            DailyStat.objects.bulk_create(stats, batch_size=batch_size)
+            written += len(stats)
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_buckets(start, end, period):
+    """
+    {first day of the period: number of its days within [start, end)}.
+    """
+    buckets = {}
+    day = start
+    while day < end:
+        key = period_start(day, period)
+        buckets[key] = buckets.get(key, 0) + 1
+        day += timedelta(days=1)
+    return buckets
+
+
+def summarize(days, nights, check_ins, revenue):
+    return {
+        'days': days,
+        'booked_nights': nights,
+        'check_ins': check_ins,
+        'occupancy': round(nights / days, 4) if days else 0.0,
+        'adr': str(from_cents(to_cents(revenue) // nights)) if nights else None,  # average daily rate
+        'revenue': str(from_cents(to_cents(revenue))),
+    }
+
+
+def owner_report(owner, start, end, period='day', listing_id=None):
+    """
+    Occupancy, average daily rate and revenue of `owner`'s listings for the nights
+    from `start` up to (not including) `end`, per listing and per `period`, read
+    from the rollup with one grouped query.
+    """
+    listings = Listing.objects.filter(owner=owner)
+    stats = DailyStat.objects.filter(listing__owner=owner, day__gte=start, day__lt=end)
+    if listing_id is not None:
+        listings = listings.filter(pk=listing_id)
+        stats = stats.filter(listing_id=listing_id)
+    rows = stats.annotate(
+        period=Trunc('day', period, output_field=DateField()),
+    ).order_by().values('listing_id', 'period').annotate(
+        nights=Sum('booked_nights'), check_ins=Sum('check_ins'), revenue=Sum('revenue'),
+    )
+    totals = {}
+    for row in rows:
+        totals[row['listing_id'], row['period']] = (row['nights'], row['check_ins'], row['revenue'])
+
+    buckets = period_buckets(start, end, period)
+    report = []
+    for listing_id, title in listings.order_by('id').values_list('id', 'title'):
+        periods = []
+        overall = [0, 0, 0]
+        for key, days in buckets.items():
+            nights, check_ins, revenue = totals.get((listing_id, key), (0, 0, 0))
+            periods.append(dict(summarize(days, nights, check_ins, revenue), period=key))
+            overall = [overall[0] + nights, overall[1] + check_ins, overall[2] + revenue]
+        report.append({
+            'listing': listing_id,
+            'title': title,
+            'totals': summarize(sum(buckets.values()), *overall),
+            'periods': periods,
+        })
+    return {'start': start, 'end': end, 'period': period, 'listings': report}
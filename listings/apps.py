@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers the signal receivers
+        from . import metrics  # noqa: F401 - registers the Celery signal receivers
+        from . import routers  # noqa: F401 - routes Celery tasks to the primary database
@@ -0,0 +1,91 @@
+# listings/async_views.py
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import NotFound
+
+from .amenities import filter_by_amenities, split_amenities
+from .geo import within_bbox, within_radius
+from .models import Booking, Listing
+from .pagination import KeysetPagination
+from .search import search_index, search_listings, uses_database_search
+from .serializers import BookingSerializer, ListingQuerySerializer, ListingSerializer
+
+# Native async read endpoints for ASGI deployments. They query through the async
+# ORM (async iteration, aget) instead of running a sync DRF view in a worker
+# thread, so one ASGI worker can keep many slow clients waiting on I/O at once.
+# Serialization is pure Python: every related object used is select_related.
+
+
+def error_response(detail, status):
+    return JsonResponse(detail if isinstance(detail, dict) else {'detail': detail}, status=status)
+
+
+async def paginated_response(request, queryset, serializer_class, ordering=None):
+    paginator = KeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(queryset, request, ordering=ordering)
+    except NotFound as exc:
+        return error_response(str(exc.detail), 404)
+    data = serializer_class(page, many=True, context={'request': request}).data
+    return JsonResponse(paginator.get_paginated_data(data))
+
+
+async def listing_list(request):
+    """
+    GET /api/async/listings/ with the filters of the sync list: `q`, `amenities`,
+    `min_rating`, `near`/`radius_km`, `bbox` and `ordering`.
+    """
+    if request.method != 'GET':
+        return error_response('Method not allowed.', 405)
+    params = ListingQuerySerializer(data=request.GET)
+    if not params.is_valid():
+        return error_response(params.errors, 400)
+    params = params.validated_data
+    query = request.GET.get('q', '').strip()
+    queryset = Listing.objects.select_related('owner')
+
+    amenities = split_amenities(request.GET.get('amenities'))
+    if amenities:
+        # Resolving the names may load or reload the process-wide catalog (an unknown
+        # name, or one added by another process), so the whole lookup runs in a thread.
+        queryset = await sync_to_async(filter_by_amenities)(queryset, amenities)
+    if params.get('min_rating') is not None:
+        queryset = queryset.filter(rating_avg__gte=params['min_rating'])
+    if 'bbox' in params:
+        queryset = within_bbox(queryset, *params['bbox'])
+    if 'near' in params:
+        queryset = within_radius(queryset, *params['near'], params['radius_km'])
+
+    ordering = ListingQuerySerializer.ORDERINGS.get(params.get('ordering'))
+    if query:
+        if not uses_database_search() and not search_index.built:
+            await sync_to_async(search_index.build)()
+        queryset = search_listings(queryset, query)
+        ordering = ordering or ('-rank', '-id')
+    return await paginated_response(request, queryset, ListingSerializer, ordering)
+
+
+async def listing_detail(request, pk):
+    if request.method != 'GET':
+        return error_response('Method not allowed.', 405)
+    try:
+        listing = await Listing.objects.select_related('owner').aget(pk=pk)
+    except Listing.DoesNotExist:
+        return error_response('No Listing matches the given query.', 404)
+    return JsonResponse(ListingSerializer(listing, context={'request': request}).data)
+
+
+async def booking_list(request):
+    """
+    GET /api/async/bookings/: every booking for staff, the user's own otherwise.
+    Authenticates from the session only, like the rest of Django's async auth.
+    """
+    if request.method != 'GET':
+        return error_response('Method not allowed.', 405)
+    user = await request.auser()
+    queryset = Booking.objects.select_related('listing', 'guest')
+    if not user.is_authenticated:
+        queryset = queryset.none()
+    elif not user.is_staff:
+        queryset = queryset.filter(guest=user)
+    return await paginated_response(request, queryset, BookingSerializer)
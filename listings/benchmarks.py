@@ -0,0 +1,286 @@
+# listings/benchmarks.py
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, Client
+
+from .amenities import normalize_amenities
+from .analytics import rebuild_daily_stats
+from .caching import invalidate_listing
+from .geo import geohash_for
+from .instrumentation import endpoint_stats
+from .models import BookedNight, Booking, Listing, Review
+from .occupancy import build_nights
+from .ratings import reconcile_ratings
+from .search import search_index
+
+USER_PREFIX = 'bench-user-'
+CITIES = [('Nairobi', 'Kenya', -1.29, 36.82), ('Mombasa', 'Kenya', -4.04, 39.67), ('Kampala', 'Uganda', 0.35, 32.58),
+          ('Kigali', 'Rwanda', -1.95, 30.06), ('Arusha', 'Tanzania', -3.37, 36.68)]
+AMENITY_SETS = ['wifi', 'wifi, kitchen', 'wifi, pool', 'pool, kitchen, parking', 'wifi, kitchen, washer, parking']
+TITLE_WORDS = ['cosy', 'sunny', 'quiet', 'modern', 'garden', 'loft', 'flat', 'villa', 'cottage', 'studio']
+FIRST_NIGHT = date(2024, 1, 1)
+# Bookings made by the create scenario start here: clear of the seeded ones (which span
+# a few months from FIRST_NIGHT) and well inside the booking horizon.
+CREATE_FROM = FIRST_NIGHT + timedelta(days=365)
+
+# Quantities compared against a baseline: latency and query counts regress upwards,
+# throughput downwards.
+HIGHER_IS_WORSE = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+LOWER_IS_WORSE = ('requests_per_second',)
+
+
+def fixture_users():
+    return User.objects.filter(username__startswith=USER_PREFIX).order_by('id')
+
+
+def seed_fixture(listings=1000, users=100, bookings_per_listing=5, reviews_per_listing=3, seed=0, batch_size=2000):
+    """
+    Create a deterministic fixture: `users` users owning `listings` listings, each
+    with back-to-back bookings and some reviews. Derived data (booked nights,
+    amenity masks, geohashes, rating aggregates) is filled in as the app would.
+    Does nothing if a fixture already exists.
+    """
+    if fixture_users().exists():
+        return False
+    rng = random.Random(seed)
+    User.objects.bulk_create(User(username=f'{USER_PREFIX}{i}') for i in range(users))
+    user_ids = list(fixture_users().values_list('id', flat=True))
+    masks = {text: normalize_amenities(text) for text in AMENITY_SETS}
+
+    new_listings = []
+    for i in range(listings):
+        city, country, latitude, longitude = rng.choice(CITIES)
+        amenities, mask = masks[rng.choice(AMENITY_SETS)]
+        latitude += rng.uniform(-0.1, 0.1)
+        longitude += rng.uniform(-0.1, 0.1)
+        new_listings.append(Listing(
+            title=f'{rng.choice(TITLE_WORDS).title()} {rng.choice(TITLE_WORDS)} {i}',
+            description=f'A {rng.choice(TITLE_WORDS)} place in {city}.',
+            address=f'{i} Benchmark Road', city=city, country=country,
+            latitude=latitude, longitude=longitude, geohash=geohash_for(latitude, longitude),
+            price_per_night=Decimal(rng.randrange(20, 400)), max_guests=rng.randrange(1, 9),
+            number_of_beds=rng.randrange(1, 5), amenities=amenities, amenity_mask=mask,
+            owner_id=rng.choice(user_ids),
+        ))
+    Listing.objects.bulk_create(new_listings, batch_size=batch_size)
+
+    bookings = []
+    reviews = []
+    for listing in new_listings:
+        night = FIRST_NIGHT + timedelta(days=rng.randrange(30))
+        for _ in range(bookings_per_listing):
+            stay = rng.randrange(1, 6)
+            bookings.append(Booking(
+                listing_id=listing.id, guest_id=rng.choice(user_ids), check_in_date=night,
+                check_out_date=night + timedelta(days=stay), total_price=listing.price_per_night * stay,
+            ))
+            night += timedelta(days=stay + rng.randrange(3))
+        for _ in range(reviews_per_listing):
+            reviews.append(Review(listing_id=listing.id, guest_id=rng.choice(user_ids), rating=rng.randrange(1, 6)))
+    Booking.objects.bulk_create(bookings, batch_size=batch_size)
+    BookedNight.objects.bulk_create((night for booking in bookings for night in build_nights(booking)), batch_size=batch_size)
+    Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+    # bulk_create ran none of the signal receivers.
+    reconcile_ratings()
+    rebuild_daily_stats()
+    search_index.reset()
+    invalidate_listing(None)
+    return True
+
+
+class Scenario:
+    """
+    One benchmarked request: `method` on the path built by `path(context, i)`,
+    with the body built by `payload(context, i)` for writes.
+    """
+
+    def __init__(self, name, method, path, payload=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.payload = payload
+
+
+def booking_payload(context, i):
+    check_in = CREATE_FROM + timedelta(days=2 * i)
+    return {
+        'listing': context['listing_ids'][0], 'check_in_date': check_in.isoformat(),
+        'check_out_date': (check_in + timedelta(days=1)).isoformat(), 'total_price': '100.00',
+    }
+
+
+SCENARIOS = [
+    Scenario('listing-list', 'get', lambda context, i: '/api/listings/'),
+    Scenario('listing-detail', 'get', lambda context, i: f"/api/listings/{context['listing_ids'][i % len(context['listing_ids'])]}/"),
+    Scenario('listing-search', 'get', lambda context, i: f"/api/listings/?q={TITLE_WORDS[i % len(TITLE_WORDS)]}"),
+    Scenario('listing-facets', 'get', lambda context, i: '/api/listings/?facets=city,price,amenities'),
+    Scenario('booking-list', 'get', lambda context, i: '/api/bookings/'),
+    Scenario('booking-detail', 'get', lambda context, i: f"/api/bookings/{context['booking_ids'][i % len(context['booking_ids'])]}/"),
+    Scenario('booking-create', 'post', lambda context, i: '/api/bookings/', booking_payload),
+]
+
+
+def fixture_listings():
+    return Listing.objects.filter(owner__username__startswith=USER_PREFIX)
+
+
+def benchmark_context():
+    """
+    Ids the scenarios pick from, and the user they run as: the fixture user with the
+    most bookings, who sees only their own bookings like any other guest.
+    """
+    user = fixture_users().annotate(booking_count=Count('bookings')).order_by('-booking_count', 'id').first()
+    return {
+        'user': user,
+        'listing_ids': list(fixture_listings().order_by('id').values_list('id', flat=True)[:500]),
+        'booking_ids': list(user.bookings.order_by('id').values_list('id', flat=True)[:500]),
+    }
+
+
+def created_bookings(context):
+    """
+    The bookings the create scenario may have made: the user's, on its listing, from CREATE_FROM.
+    """
+    return Booking.objects.filter(
+        listing_id=context['listing_ids'][0], guest=context['user'], check_in_date__gte=CREATE_FROM,
+    )
+
+
+def summarize(name, latencies, errors, elapsed, concurrency):
+    latencies = sorted(latencies)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    stats = endpoint_stats.snapshot()
+    requests = sum(totals['requests'] for totals in stats.values())
+    queries = sum(totals['queries'] for totals in stats.values())
+    return {
+        'scenario': name,
+        'requests': len(latencies) + errors,
+        'concurrency': concurrency,
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(cuts[49] * 1000, 3) if cuts else None,
+        'p95_ms': round(cuts[94] * 1000, 3) if cuts else None,
+        'p99_ms': round(cuts[98] * 1000, 3) if cuts else None,
+        'queries_per_request': round(queries / requests, 2) if requests else None,
+    }
+
+
+def run_wsgi(scenario, context, requests, concurrency):
+    """
+    Drive a scenario through the sync stack from `concurrency` threads, one test client each.
+    """
+    latencies = []
+    errors = []
+
+    def worker(indexes):
+        client = Client()
+        client.force_login(context['user'])
+        try:
+            for i in indexes:
+                kwargs = {}
+                if scenario.payload:
+                    kwargs = {'data': scenario.payload(context, i), 'content_type': 'application/json'}
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(scenario.path(context, i), **kwargs)
+                if response.status_code < 400:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors.append(response.status_code)
+        finally:
+            if concurrency > 1:
+                connection.close()
+
+    endpoint_stats.reset()
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(range(requests))
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker, [range(k, requests, concurrency) for k in range(concurrency)]))
+    return summarize(scenario.name, latencies, len(errors), time.perf_counter() - started, concurrency)
+
+
+async def run_asgi(scenario, context, requests, concurrency):
+    """
+    Drive a scenario through the ASGI handler with `concurrency` requests in flight.
+    """
+    latencies = []
+    errors = 0
+    client = AsyncClient()
+    await client.aforce_login(context['user'])
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        kwargs = {}
+        if scenario.payload:
+            kwargs = {'data': scenario.payload(context, i), 'content_type': 'application/json'}
+        async with semaphore:
+            start = time.perf_counter()
+            response = await getattr(client, scenario.method)(scenario.path(context, i), **kwargs)
+        if response.status_code < 400:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+
+    endpoint_stats.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(scenario.name, latencies, errors, time.perf_counter() - started, concurrency)
+
+
+def run_suite(requests=200, concurrency=1, client='wsgi', names=None):
+    """
+    Run the scenarios (all, or those in `names`) against the seeded fixture.
+    The bookings made by the create scenario are deleted afterwards.
+    """
+    context = benchmark_context()
+    results = {}
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        if client == 'asgi':
+            # async_to_sync, not asyncio.run: the ORM calls of the views then come back to
+            # this thread and its connection, which is what makes the suite work inside a test.
+            results[scenario.name] = async_to_sync(run_asgi)(scenario, context, requests, concurrency)
+        else:
+            results[scenario.name] = run_wsgi(scenario, context, requests, concurrency)
+    # The create scenario always starts from the same dates.
+    created_bookings(context).delete()
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of `results` against a stored `baseline`: quantities more than
+    `tolerance` worse, and any increase in queries per request.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            old, new = previous.get(key), current.get(key)
+            if old is None or new is None:
+                continue
+            if key == 'queries_per_request':
+                worse = new > old
+            elif key in HIGHER_IS_WORSE:
+                worse = new > old * (1 + tolerance)
+            else:
+                worse = new < old * (1 - tolerance)
+            if worse:
+                regressions.append({'scenario': name, 'metric': key, 'baseline': old, 'current': new})
+    return regressions
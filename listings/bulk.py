@@ -0,0 +1,200 @@
+# listings/bulk.py
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .amenities import normalize_amenities
+from .caching import invalidate_listing
+from .analytics import booking_row, build_daily_stats
+from .geo import geohash_for
+from .models import BookedNight, Booking, DailyStat, Listing
+from .occupancy import build_nights
+from .outbox import enqueue_many, booking_confirmation_message
+from .pricing import get_calendars, quote_stay
+from .search import search_index
+from .serializers import BookingSerializer, ListingSerializer
+
+
+class BulkImportError(Exception):
+    """
+    Raised inside the import transaction to roll it back; carries the per-row errors.
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def default_chunk_size():
+    return getattr(settings, 'BULK_IMPORT_CHUNK_SIZE', 500)
+
+
+def validate_chunk(serializer_class, chunk, offset, context):
+    """
+    Validate a chunk with the serializer in list mode. Returns the validated
+    rows (None for invalid ones) and the errors keyed by absolute row index.
+    """
+    errors = []
+    if not all(isinstance(row, dict) for row in chunk):
+        for index, row in enumerate(chunk, offset):
+            if not isinstance(row, dict):
+                errors.append({'index': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+        return [None] * len(chunk), errors
+
+    serializer = serializer_class(data=chunk, many=True, context=context)
+    if serializer.is_valid():
+        return list(serializer.validated_data), errors
+    validated = []
+    for index, (row, row_errors) in enumerate(zip(chunk, serializer.errors), offset):
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+            validated.append(None)
+        else:
+            # Valid rows are validated again on their own: a ListSerializer that
+            # failed exposes no validated_data at all.
+            child = serializer_class(data=row, context=context)
+            child.is_valid()
+            validated.append(child.validated_data)
+    return validated, errors
+
+
+def run_import(rows, import_chunk, max_rows=None, chunk_size=None):
+    """
+    Validate and insert `rows` chunk by chunk in one transaction. Any row error
+    rolls the whole import back. Returns the created ids; raises BulkImportError.
+    """
+    chunk_size = chunk_size or default_chunk_size()
+    max_rows = max_rows or getattr(settings, 'BULK_IMPORT_MAX_ROWS', 10000)
+    created = []
+    errors = []
+    with transaction.atomic():
+        offset = 0
+        for chunk in chunked(rows, chunk_size):
+            if offset + len(chunk) > max_rows:
+                errors.append({'index': max_rows, 'errors': {'non_field_errors': [f'At most {max_rows} rows per import.']}})
+                break
+            # Once a row has failed nothing will be kept, so later chunks are only validated.
+            chunk_errors, chunk_ids = import_chunk(chunk, offset, insert=not errors)
+            errors.extend(chunk_errors)
+            created.extend(chunk_ids)
+            offset += len(chunk)
+        if errors:
+            raise BulkImportError(errors)
+    return created
+
+
+def import_listings(rows, owner, context=None, chunk_size=None):
+    """
+    Bulk-create listings owned by `owner` from serializer-shaped rows.
+    """
+    context = context or {}
+    created = []
+
+    def import_chunk(chunk, offset, insert):
+        validated, errors = validate_chunk(ListingSerializer, chunk, offset, context)
+        if errors or not insert:
+            return errors, []
+        listings = []
+        for attrs in validated:
+            listing = Listing(owner=owner, **attrs)
+            # bulk_create skips the pre_save receivers that normally do this
+            listing.amenities, listing.amenity_mask = normalize_amenities(listing.amenities)
+            listing.geohash = geohash_for(listing.latitude, listing.longitude)
+            listings.append(listing)
+        Listing.objects.bulk_create(listings)
+        created.extend(listings)
+        return [], [listing.id for listing in listings]
+
+    ids = run_import(rows, import_chunk, chunk_size=chunk_size)
+    # The post_save receivers did not run for these rows either.
+    for listing in created:
+        search_index.update(listing)
+    invalidate_listing(None)
+    return ids
+
+
+def find_overlaps(incoming, existing):
+    """
+    Indexes of `incoming` (index, check_in, check_out) ranges that overlap an
+    `existing` (check_in, check_out) range or an earlier incoming one, for a
+    single listing. Sorts once and sweeps, instead of querying per row.
+    """
+    # Existing bookings never overlap each other, so once sorted their ends are
+    # sorted too and the only candidate is the last one starting before check-out.
+    existing = sorted(existing)
+    starts = [check_in for check_in, _ in existing]
+    overlapping = set()
+    for index, check_in, check_out in incoming:
+        position = bisect_left(starts, check_out) - 1
+        if position >= 0 and existing[position][1] > check_in:
+            overlapping.add(index)
+
+    booked_until = None
+    for check_in, index, check_out in sorted(
+        (check_in, index, check_out) for index, check_in, check_out in incoming if index not in overlapping
+    ):
+        if booked_until is not None and check_in < booked_until:
+            overlapping.add(index)
+        else:
+            booked_until = check_out
+    return overlapping
+
+
+def import_bookings(rows, guest, context=None, chunk_size=None):
+    """
+    Bulk-create bookings for `guest`. Overlap with existing bookings and within
+    the upload is checked with one range query per chunk and a per-listing sweep.
+    """
+    context = dict(context or {}, bulk=True)
+
+    def import_chunk(chunk, offset, insert):
+        listing_ids = {row.get('listing') for row in chunk if isinstance(row, dict)}
+        listing_ids = [pk for pk in listing_ids if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit())]
+        chunk_context = dict(context, prefetched={'listing': Listing.objects.in_bulk(listing_ids)})
+        validated, errors = validate_chunk(BookingSerializer, chunk, offset, chunk_context)
+        if errors:
+            return errors, []
+
+        by_listing = {}
+        for index, attrs in enumerate(validated, offset):
+            by_listing.setdefault(attrs['listing'].id, []).append((index, attrs['check_in_date'], attrs['check_out_date']))
+        start = min(attrs['check_in_date'] for attrs in validated)
+        end = max(attrs['check_out_date'] for attrs in validated)
+        existing = {}
+        for listing_id, check_in, check_out in Booking.objects.filter(
+            listing_id__in=by_listing, check_in_date__lt=end, check_out_date__gt=start,
+        ).values_list('listing_id', 'check_in_date', 'check_out_date'):
+            existing.setdefault(listing_id, []).append((check_in, check_out))
+
+        for listing_id, incoming in by_listing.items():
+            for index in sorted(find_overlaps(incoming, existing.get(listing_id, []))):
+                errors.append({'index': index, 'errors': {
+                    'non_field_errors': ['The listing is already booked for some of the requested nights.'],
+                }})
+        if errors or not insert:
+            return sorted(errors, key=lambda error: error['index']), []
+
+        # Compile (or fetch) the rate calendars of the whole chunk at once; each quote then only reads the cache.
+        listings = {attrs['listing'].id: attrs['listing'] for attrs in validated}.values()
+        get_calendars(listings, range(start.year, end.year + 1))
+        for attrs in validated:
+            attrs['total_price'] = quote_stay(attrs['listing'], attrs['check_in_date'], attrs['check_out_date'])['total']
+        bookings = Booking.objects.bulk_create([Booking(guest=guest, **attrs) for attrs in validated])
+        # The unique (listing, night) constraint still guards against concurrent writers.
+        BookedNight.objects.bulk_create([night for booking in bookings for night in build_nights(booking)])
+        DailyStat.objects.bulk_create(build_daily_stats([booking_row(booking) for booking in bookings]))
+        enqueue_many([booking_confirmation_message(booking) for booking in bookings])
+        return [], [booking.id for booking in bookings]
+
+    return run_import(rows, import_chunk, chunk_size=chunk_size)
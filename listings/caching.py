@@ -0,0 +1,138 @@
+# listings/caching.py
+import hashlib
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import reading_replicas, use_primary
+
+COLLECTION_VERSION_KEY = 'listings:version:collection'
+
+
+def listing_version_key(listing_id):
+    return f'listings:version:listing:{listing_id}'
+
+
+def recent_bump_key(key):
+    return f'{key}:recent'
+
+
+def _initial_version():
+    # Versions start from the clock rather than 1, so a counter that was evicted
+    # never comes back with a value that older cache entries were stored under.
+    return time.time_ns()
+
+
+def get_versions(keys):
+    """
+    Current value of each version counter, creating missing ones.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+    # Expires once the replicas can be assumed to have the write, see fill_reads().
+    cache.set_many({recent_bump_key(key): True for key in keys}, settings.REPLICA_PIN_SECONDS)
+
+
+def fill_reads(version_keys):
+    """
+    Routing for the reads that fill a cache entry stored under `version_keys`.
+
+    Replicas as usual, except while one of the counters was bumped in the last
+    REPLICA_PIN_SECONDS: a lagging replica could then store rows older than the
+    version under that version, so those reads go to the primary.
+    """
+    if reading_replicas() and cache.get_many([recent_bump_key(key) for key in version_keys]):
+        return use_primary()
+    return nullcontext()
+
+
+def invalidate_listing(listing_id):
+    """
+    Invalidate the cached list pages and the cached detail of one listing.
+
+    Bumped right away, so the writer's own transaction never sees stale data,
+    and again on commit, so a reader that raced the commit and cached the old
+    rows under the first bump is invalidated as well.
+    """
+    keys = [COLLECTION_VERSION_KEY]
+    if listing_id is not None:
+        keys.append(listing_version_key(listing_id))
+    bump_versions(keys)
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+class VersionedCacheMixin:
+    """
+    Caches GET list/retrieve responses of a viewset under version counters.
+
+    The cache key is the URL with its query parameters sorted, the negotiated
+    renderer and the current version of every counter the response depends on.
+    Since any change bumps a counter, the key doubles as a strong ETag, and a
+    matching `If-None-Match` is answered with 304 before touching the database.
+    Misses are built from the replicas unless a counter was just bumped, see
+    fill_reads().
+    """
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'LISTING_CACHE_TIMEOUT', 300)
+
+    def list_version_keys(self):
+        return [COLLECTION_VERSION_KEY]
+
+    def retrieve_version_keys(self):
+        return [listing_version_key(self.kwargs[self.lookup_url_kwarg or self.lookup_field])]
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.list_version_keys(), lambda: super(VersionedCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(self.retrieve_version_keys(), lambda: super(VersionedCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    def response_cache_key(self, versions):
+        request = self.request
+        query = sorted(request.query_params.lists())
+        # Host and scheme too: the cached pages carry absolute next/previous links.
+        signature = repr((request.scheme, request.get_host(), request.path, query, request.accepted_media_type, versions))
+        return 'listings:response:' + hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+    def cached_response(self, version_keys, build):
+        cache_key = self.response_cache_key(get_versions(version_keys))
+        etag = f'"{cache_key.rsplit(":", 1)[1]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if etag in parse_etags(self.request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = cache.get(cache_key)
+        if data is None:
+            with fill_reads(version_keys):
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, self.get_cache_timeout())
+        else:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        return response
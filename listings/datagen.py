@@ -0,0 +1,204 @@
+# listings/datagen.py
+import csv
+import io
+import math
+import multiprocessing
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from .analytics import booking_row, build_daily_stats
+from .geo import geohash_for
+from .models import BookedNight, Booking, DailyStat, Listing, Review
+from .occupancy import nights_between
+
+# (city, country, latitude, longitude, median nightly price in USD, relative weight)
+CITIES = [
+    ('Nairobi', 'Kenya', -1.2864, 36.8172, 60, 10),
+    ('Mombasa', 'Kenya', -4.0435, 39.6682, 70, 6),
+    ('Diani', 'Kenya', -4.2797, 39.5947, 110, 3),
+    ('Kampala', 'Uganda', 0.3476, 32.5825, 45, 6),
+    ('Kigali', 'Rwanda', -1.9441, 30.0619, 55, 5),
+    ('Arusha', 'Tanzania', -3.3869, 36.6830, 65, 4),
+    ('Zanzibar', 'Tanzania', -6.1659, 39.2026, 95, 5),
+    ('Addis Ababa', 'Ethiopia', 8.9806, 38.7578, 50, 5),
+    ('Cape Town', 'South Africa', -33.9249, 18.4241, 90, 8),
+    ('Lagos', 'Nigeria', 6.5244, 3.3792, 55, 7),
+    ('Accra', 'Ghana', 5.6037, -0.1870, 50, 5),
+    ('Marrakesh', 'Morocco', 31.6295, -7.9811, 75, 6),
+]
+# (amenity, probability that a listing has it)
+AMENITIES = [
+    ('WiFi', 0.9), ('Kitchen', 0.7), ('Parking', 0.45), ('Washer', 0.4), ('Air conditioning', 0.35),
+    ('Pool', 0.15), ('Gym', 0.1), ('Hot tub', 0.05), ('Workspace', 0.3), ('Pets allowed', 0.12),
+]
+ADJECTIVES = ['Cosy', 'Sunny', 'Quiet', 'Modern', 'Spacious', 'Charming', 'Bright', 'Stylish', 'Rustic', 'Airy']
+KINDS = [('studio', 1, 2), ('flat', 2, 4), ('loft', 2, 3), ('cottage', 3, 6), ('house', 4, 8), ('villa', 6, 12)]
+STAYS = [1, 2, 2, 3, 3, 3, 4, 5, 7, 7, 10, 14]
+RATINGS = [1, 2, 3, 3, 4, 4, 4, 5, 5, 5, 5, 5]
+FIRST_NIGHT = date(2023, 1, 1)
+STREETS = ['Main Street', 'Station Road', 'Beach Road', 'Market Street', 'Hill View', 'Garden Lane']
+
+# Set once per worker process by init_worker, rather than pickled into every task.
+shared = {}
+
+
+def shard_rng(seed, shard):
+    # A fixed stream per shard: the output does not depend on the number of workers.
+    return random.Random(f'{seed}:{shard}')
+
+
+def make_listing(rng, index, owner_id, amenity_catalog):
+    city, country, latitude, longitude, median_price, _ = rng.choices(CITIES, weights=[c[5] for c in CITIES])[0]
+    adjective = rng.choice(ADJECTIVES)
+    kind, min_guests, max_guests = rng.choice(KINDS)
+    guests = rng.randint(min_guests, max_guests)
+    # Log-normal prices around the city median, scaled by size.
+    price = median_price * (guests / 3) ** 0.6 * rng.lognormvariate(0, 0.35)
+    amenities = [amenity_catalog[name] for name, probability in AMENITIES if rng.random() < probability]
+    latitude += rng.gauss(0, 0.03)
+    longitude += rng.gauss(0, 0.03)
+    return Listing(
+        title=f'{adjective} {kind} in {city} #{index}',
+        description=f'{adjective} {kind} for up to {guests} guests in {city}, {country}.',
+        address=f'{rng.randint(1, 400)} {rng.choice(STREETS)}',
+        city=city, country=country, latitude=latitude, longitude=longitude,
+        geohash=geohash_for(latitude, longitude),
+        price_per_night=Decimal(max(price, 10)).quantize(Decimal('1.00')),
+        max_guests=guests, number_of_beds=max(1, math.ceil(guests / 2)),
+        number_of_baths=Decimal(max(1, guests // 3)),
+        amenities=', '.join(name for _, name in amenities), amenity_mask=sum(1 << bit for bit, _ in amenities),
+        owner_id=owner_id,
+    )
+
+
+def plan_stays(rng, mean_bookings):
+    """
+    Non-overlapping (check_in, nights) stays of one listing, in date order, within
+    the API's booking horizon counted from FIRST_NIGHT, so that the API would
+    accept every stay too (see serializers.stay_error).
+    """
+    horizon = settings.BOOKING_HORIZON_DAYS
+    count = min(int(rng.expovariate(1 / mean_bookings)) if mean_bookings else 0, horizon // 2)
+    stays = []
+    night = FIRST_NIGHT + timedelta(days=rng.randrange(14))
+    for _ in range(count):
+        nights = min(rng.choice(STAYS), settings.MAX_STAY_NIGHTS)
+        if (night - FIRST_NIGHT).days + nights > horizon:
+            break
+        stays.append((night, nights))
+        night += timedelta(days=nights + int(rng.expovariate(1 / 4)))
+    return stays
+
+
+def copy_rows(model, fields, rows):
+    """
+    Load rows with Postgres COPY (psycopg2 or psycopg 3).
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.read())
+
+
+def write_rows(model, fields, objects, use_copy, batch_size):
+    if use_copy:
+        copy_rows(model, fields, ([getattr(obj, field) for field in fields] for obj in objects))
+    else:
+        model.objects.bulk_create(objects, batch_size=batch_size)
+
+
+def generate_shard(task):
+    """
+    Generate and write one shard of listings with their bookings, booked nights,
+    reviews and analytics rollup. Runs in a worker process; returns the row counts written.
+    """
+    seed, shard, first_index, count = task
+    user_ids, amenity_catalog, options = shared['user_ids'], shared['amenities'], shared['options']
+    rng = shard_rng(seed, shard)
+    use_copy = options['copy'] and connection.vendor == 'postgresql'
+    batch_size = options['batch_size']
+    now = timezone.now()
+
+    listings = []
+    plans = []
+    for index in range(first_index, first_index + count):
+        listing = make_listing(rng, index, rng.choice(user_ids), amenity_catalog)
+        stays = plan_stays(rng, options['bookings_per_listing'])
+        guests = [rng.choice(user_ids) for _ in stays]
+        ratings = [rng.choice(RATINGS) if rng.random() < options['review_rate'] else None for _ in stays]
+        # Rating aggregates are known before the listing is written.
+        given = [rating for rating in ratings if rating is not None]
+        listing.rating_count = len(given)
+        listing.rating_sum = sum(given)
+        listing.rating_avg = listing.rating_sum / listing.rating_count if given else 0.0
+        for star in range(1, 6):
+            setattr(listing, f'rating_{star}', given.count(star))
+        listings.append(listing)
+        plans.append((stays, guests, ratings))
+    Listing.objects.bulk_create(listings, batch_size=batch_size)
+
+    bookings = []
+    reviews = []
+    for listing, (stays, guests, ratings) in zip(listings, plans):
+        for (check_in, nights), guest_id, rating in zip(stays, guests, ratings):
+            bookings.append(Booking(
+                listing_id=listing.id, guest_id=guest_id, check_in_date=check_in,
+                check_out_date=check_in + timedelta(days=nights), total_price=listing.price_per_night * nights,
+            ))
+            if rating is not None:
+                reviews.append(Review(listing_id=listing.id, guest_id=guest_id, rating=rating, created_at=now,
+                                      comment=rng.choice(['', 'Great stay!', 'Would come back.', 'As described.'])))
+    # Bookings are written with bulk_create even when COPY is available: their ids are needed for the nights.
+    Booking.objects.bulk_create(bookings, batch_size=batch_size)
+    nights = [
+        BookedNight(listing_id=booking.listing_id, booking_id=booking.id, night=night)
+        for booking in bookings
+        for night in nights_between(booking.check_in_date, booking.check_out_date)
+    ]
+    write_rows(BookedNight, ['listing_id', 'booking_id', 'night'], nights, use_copy, batch_size)
+    write_rows(Review, ['listing_id', 'guest_id', 'rating', 'comment', 'created_at'], reviews, use_copy, batch_size)
+    stats = build_daily_stats(booking_row(booking) for booking in bookings)
+    write_rows(DailyStat, ['listing_id', 'day', 'booked_nights', 'check_ins', 'revenue'], stats, use_copy, batch_size)
+    return {'listings': len(listings), 'bookings': len(bookings), 'booked_nights': len(nights), 'reviews': len(reviews),
+            'daily_stats': len(stats)}
+
+
+def init_worker(user_ids, amenities, options, setup=True):
+    """
+    Pool initializer: set Django up under the spawn start method, make sure no
+    database connection inherited from the parent is reused, and keep the data
+    every shard needs.
+    """
+    if setup:
+        django.setup()
+        connections.close_all()
+    shared.update(user_ids=user_ids, amenities=amenities, options=options)
+
+
+def run_shards(tasks, workers, user_ids, amenities, options):
+    """
+    Run `generate_shard` over the tasks, in a pool of `workers` processes, yielding
+    each shard's counts as it finishes.
+    """
+    if workers <= 1:
+        init_worker(user_ids, amenities, options, setup=False)
+        yield from map(generate_shard, tasks)
+        return
+    connections.close_all()
+    pool = multiprocessing.get_context().Pool(workers, initializer=init_worker, initargs=(user_ids, amenities, options))
+    with pool:
+        yield from pool.imap_unordered(generate_shard, tasks)
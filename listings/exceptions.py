@@ -0,0 +1,12 @@
+# listings/exceptions.py
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class BookingConflict(APIException):
+    """
+    Raised when the requested nights were taken by a concurrent booking.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The listing is already booked for some of the requested nights.'
+    default_code = 'booking_conflict'
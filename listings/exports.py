@@ -0,0 +1,88 @@
+# listings/exports.py
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# (column name, values() lookup) pairs. Rows are streamed as plain tuples from
+# values_list(), never as model instances or through the DRF serializers.
+BOOKING_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('listing', 'listing_id'),
+    ('listing_title', 'listing__title'),
+    ('guest', 'guest_id'),
+    ('guest_username', 'guest__username'),
+    ('check_in_date', 'check_in_date'),
+    ('check_out_date', 'check_out_date'),
+    ('total_price', 'total_price'),
+    ('created_at', 'created_at'),
+]
+
+LISTING_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('address', 'address'),
+    ('city', 'city'),
+    ('country', 'country'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('price_per_night', 'price_per_night'),
+    ('max_guests', 'max_guests'),
+    ('number_of_beds', 'number_of_beds'),
+    ('number_of_baths', 'number_of_baths'),
+    ('amenities', 'amenities'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('owner', 'owner_id'),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, columns, chunk_size=None):
+    """
+    Iterate the rows of `queryset` as tuples, a chunk at a time, over a
+    server-side cursor where the database has one.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    lookups = [lookup for _, lookup in columns]
+    return queryset.order_by().values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows, columns):
+    names = [name for name, _ in columns]
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def streaming_export(queryset, columns, fmt, filename):
+    """
+    A StreamingHttpResponse exporting `queryset` as CSV or NDJSON in constant memory.
+    """
+    rows = export_rows(queryset, columns)
+    lines = csv_lines(rows, columns) if fmt == 'csv' else ndjson_lines(rows, columns)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,112 @@
+# listings/facets.py
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.db.models.lookups import GreaterThan
+
+from .amenities import amenity_key, catalog
+from .caching import COLLECTION_VERSION_KEY, fill_reads, get_versions
+
+# Lower edges of the bands of the numeric facets; the last band is open-ended.
+PRICE_EDGES = (0, 50, 100, 200, 500)
+GUEST_EDGES = (1, 3, 5, 7)
+BED_EDGES = (1, 2, 3, 5)
+
+# Facet name -> listing column. Banded facets and the amenity bits are counted
+# with conditional aggregates; the others are grouped by value.
+FACET_COLUMNS = {
+    'city': 'city',
+    'country': 'country',
+    'price': 'price_per_night',
+    'guests': 'max_guests',
+    'beds': 'number_of_beds',
+    'amenities': 'amenity_mask',
+}
+FACET_BANDS = {'price': PRICE_EDGES, 'guests': GUEST_EDGES, 'beds': BED_EDGES}
+FACETS = tuple(FACET_COLUMNS)
+# Grouped facets report their most common values only.
+FACET_VALUE_LIMIT = 20
+
+
+def band_filters(column, edges):
+    """
+    A filter per band of `column`; values below the first edge count in the first band.
+    """
+    filters = [Q(**{f'{column}__lt': edges[1]})]
+    filters += [Q(**{f'{column}__gte': lower, f'{column}__lt': upper}) for lower, upper in zip(edges[1:], edges[2:])]
+    filters.append(Q(**{f'{column}__gte': edges[-1]}))
+    return filters
+
+
+def band_labels(edges, continuous=False):
+    labels = []
+    for lower, upper in zip(edges, edges[1:]):
+        top = upper if continuous else upper - 1
+        labels.append(f'{lower}-{top}' if top != lower else str(lower))
+    labels.append(f'{edges[-1]}+')
+    return labels
+
+
+def compute_facets(queryset, names):
+    """
+    Counts for every facet in `names` over `queryset`. The bands and the amenity
+    bits are conditional counts of one aggregate query, whatever the number of
+    matching listings; city and country are grouped one at a time and capped at
+    FACET_VALUE_LIMIT values.
+    """
+    queryset = queryset.order_by()
+    aggregates = {}
+    bits = {}
+    for name in names:
+        column = FACET_COLUMNS[name]
+        if name in FACET_BANDS:
+            for index, band in enumerate(band_filters(column, FACET_BANDS[name])):
+                aggregates[f'{name}_{index}'] = Count('id', filter=band)
+        elif name == 'amenities':
+            bits = {bit: label for bit, label in catalog.entries().values()}
+            for bit in bits:
+                aggregates[f'amenity_{bit}'] = Count('id', filter=GreaterThan(F(column).bitand(1 << bit), 0))
+    totals = queryset.aggregate(**aggregates) if aggregates else {}
+
+    facets = {}
+    for name in names:
+        column = FACET_COLUMNS[name]
+        if name in FACET_BANDS:
+            labels = band_labels(FACET_BANDS[name], continuous=name == 'price')
+            facets[name] = [{'value': label, 'count': totals[f'{name}_{index}']} for index, label in enumerate(labels)]
+        elif name == 'amenities':
+            counts = sorted((-totals[f'amenity_{bit}'], bit) for bit in bits if totals[f'amenity_{bit}'])
+            facets[name] = [{'value': bits[bit], 'count': -count} for count, bit in counts]
+        else:
+            rows = (
+                queryset.values(column).annotate(facet_count=Count('id'))
+                .order_by('-facet_count', column)[:FACET_VALUE_LIMIT]
+            )
+            facets[name] = [{'value': row[column], 'count': row['facet_count']} for row in rows]
+    return facets
+
+
+def facet_cache_key(names, params, query, amenities):
+    """
+    Keyed on what selects the result set only (the validated ListingQuerySerializer
+    filters, the search query and the amenity keys), so its pages, orderings and
+    field selections share the facets, and on the collection version, so any
+    listing change invalidates them.
+    """
+    location = (params.get('near'), params.get('radius_km') if 'near' in params else None, params.get('bbox'))
+    amenities = sorted({amenity_key(name) for name in amenities})
+    version, = get_versions([COLLECTION_VERSION_KEY])
+    signature = repr((sorted(names), params.get('min_rating'), location, query, amenities, version))
+    return 'listings:facets:' + hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+
+def cached_facets(queryset, names, params, query, amenities):
+    key = facet_cache_key(names, params, query, amenities)
+    facets = cache.get(key)
+    if facets is None:
+        with fill_reads([COLLECTION_VERSION_KEY]):
+            facets = compute_facets(queryset, names)
+        cache.set(key, facets, getattr(settings, 'LISTING_CACHE_TIMEOUT', 300))
+    return facets
@@ -0,0 +1,157 @@
+# listings/fastpath.py
+from django.conf import settings
+from rest_framework import relations, serializers
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from .profiling import phase
+from .sparse import SparseFieldsViewMixin, is_column
+
+
+class RowProxy:
+    """
+    Attribute access over a values() row, for the SerializerMethodFields.
+    """
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getattr__(self, name):
+        try:
+            return self.row[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def compile_converter(field):
+    """
+    A function turning the database value of a bound serializer `field` into what
+    field.to_representation() returns, with the per-call setting lookups done once.
+    Fields without a shortcut use to_representation() itself.
+    """
+    if isinstance(field, serializers.DecimalField):
+        if getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) and not field.localize:
+            quantize = field.quantize
+            return lambda value: '{:f}'.format(quantize(value))
+    elif isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format and output_format.lower() == ISO_8601 and timezone is not None:
+            def datetime_iso(value):
+                value = value.astimezone(timezone).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return datetime_iso
+    elif isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return lambda value: value.isoformat()
+    elif isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        return lambda value: value  # values() already gives the primary key
+    elif type(field) in (serializers.CharField, serializers.URLField, serializers.EmailField):
+        return str
+    elif type(field) is serializers.IntegerField:
+        return int
+    elif type(field) is serializers.FloatField:
+        return float
+    return field.to_representation
+
+
+class RowSerializer:
+    """
+    Read-only serialization of values() rows into exactly the data `serializer`
+    (an unbound-to-data ModelSerializer with its context) renders for the same
+    objects, without building a model instance or a serializer per row.
+    """
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.columns = {}  # values() lookups, in order
+        self.plan = []  # (name, column or None for whole-row fields, converter)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*':
+                for column in serializer.field_columns(name, field):
+                    self.columns[column] = None
+                self.plan.append((name, None, field.to_representation))
+            else:
+                column = '__'.join(field.source_attrs)
+                self.columns[column] = None
+                self.plan.append((name, column, compile_converter(field)))
+        self.finish = getattr(serializer, 'finish_representation', None)
+
+    def values(self, queryset, extra=()):
+        """
+        `queryset` as the rows to serialize; `extra` names further columns or annotations to fetch.
+        """
+        columns = dict(self.columns, pk=None)
+        for name in extra:
+            if name in queryset.query.annotations or is_column(queryset.model, name):
+                columns[name] = None
+        return queryset.values(*columns)
+
+    def to_representation(self, rows):
+        plan = self.plan
+        finish = self.finish
+        data = []
+        with phase('serialize'):
+            for row in rows:
+                item = {}
+                proxy = None
+                for name, column, convert in plan:
+                    if column is None:
+                        proxy = proxy or RowProxy(row)
+                        item[name] = convert(proxy)
+                    else:
+                        value = row[column]
+                        item[name] = None if value is None else convert(value)
+                if finish is not None:
+                    item = finish(row['pk'], item)
+                data.append(item)
+        return data
+
+
+class RowListSerializer:
+    """
+    Stands in for `serializer_class(page, many=True)` on the fast path: only `.data` is used.
+    """
+
+    def __init__(self, row_serializer, rows):
+        self.row_serializer = row_serializer
+        self.rows = rows
+
+    @property
+    def data(self):
+        return ReturnList(self.row_serializer.to_representation(self.rows), serializer=self)
+
+
+class FastListMixin(SparseFieldsViewMixin):
+    """
+    Serves the pages of list actions from values() rows through a RowSerializer,
+    with the same output as the viewset's serializer (see the parity tests).
+    Switched off with FAST_LIST_SERIALIZATION = False.
+    """
+    fast_actions = ('list',)
+
+    def use_fast_path(self):
+        return self.action in self.fast_actions and getattr(settings, 'FAST_LIST_SERIALIZATION', True)
+
+    def row_serializer(self):
+        if not hasattr(self, '_row_serializer'):
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            self._row_serializer = RowSerializer(serializer)
+        return self._row_serializer
+
+    def paginate_queryset(self, queryset):
+        if self.use_fast_path():
+            queryset = self.row_serializer().values(queryset, extra=self.required_columns())
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and self.use_fast_path():
+            row_serializer = self.row_serializer()
+            # The context may have grown since the rows were selected (the quotes of the page).
+            row_serializer.serializer._context = self.get_serializer_context()
+            return RowListSerializer(row_serializer, args[0])
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,149 @@
+# listings/geo.py
+import math
+
+from django.db.models import Q
+from django.db.models.functions import Cos, Power, Radians, Sin
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12  # length of the stored geohash, ~3.7 cm cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# A query is pruned with at most this many cell prefixes (one range scan each).
+MAX_CELLS = 16
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """
+    Geohash of a point: interleaved longitude/latitude bisection bits, five per character.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return ''
+    return encode(latitude, longitude)
+
+
+def cell_size(precision):
+    """
+    (height, width) in degrees of a geohash cell of the given length.
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_CELLS):
+    """
+    Geohash prefixes whose cells together cover the box, using the longest
+    prefixes that need no more than `max_cells` of them.
+    """
+    if min_lon > max_lon:  # box crosses the antimeridian
+        return covering_cells(min_lat, min_lon, max_lat, 180.0, max_cells) + \
+            covering_cells(min_lat, -180.0, max_lat, max_lon, max_cells)
+    cells = ['']
+    for precision in range(1, PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = range(int((min_lat + 90) // height), int(min((max_lat + 90) // height, 180 / height - 1)) + 1)
+        columns = range(int((min_lon + 180) // width), int(min((max_lon + 180) // width, 360 / width - 1)) + 1)
+        if len(rows) * len(columns) > max_cells:
+            break
+        cells = [
+            encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+            for row in rows for column in columns
+        ]
+    return cells
+
+
+def successor(prefix):
+    """
+    The smallest geohash greater than every hash starting with `prefix`, or None.
+    """
+    while prefix:
+        position = BASE32.index(prefix[-1])
+        if position < len(BASE32) - 1:
+            return prefix[:-1] + BASE32[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def cell_filter(cells):
+    """
+    Q matching geohashes under any of the prefixes, written as half-open ranges
+    rather than LIKE so the btree index on geohash is used on every backend.
+    """
+    condition = Q()
+    for prefix in cells:
+        if not prefix:
+            return Q(geohash__gt='')
+        upper = successor(prefix)
+        condition |= Q(geohash__gte=prefix, geohash__lt=upper) if upper else Q(geohash__gte=prefix)
+    return condition
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    queryset = queryset.filter(cell_filter(covering_cells(min_lat, min_lon, max_lat, max_lon)))
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon > max_lon:
+        return queryset.filter(Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+    return queryset.filter(longitude__gte=min_lon, longitude__lte=max_lon)
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """
+    (min_lat, min_lon, max_lat, max_lon) of a box enclosing the circle.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, -180.0, max_lat, 180.0
+    lon_delta = lat_delta / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if lon_delta >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon = (longitude - lon_delta + 540.0) % 360.0 - 180.0
+    max_lon = (longitude + lon_delta + 540.0) % 360.0 - 180.0
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def haversine(latitude, longitude):
+    """
+    SQL expression for the haversine of the central angle between the point and
+    each row's latitude/longitude: 0 for the same point, 1 for the antipode.
+    """
+    lat1 = math.radians(latitude)
+    dlat = Radians('latitude') - lat1
+    dlon = Radians('longitude') - math.radians(longitude)
+    return Power(Sin(dlat / 2), 2) + math.cos(lat1) * Cos(Radians('latitude')) * Power(Sin(dlon / 2), 2)
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Listings within `radius_km` of the point: pruned by cell prefixes and the
+    enclosing box, then refined with the haversine formula, all in one query.
+    """
+    queryset = within_bbox(queryset, *radius_bbox(latitude, longitude, radius_km))
+    # The haversine grows with the distance, so compare it with that of the radius.
+    limit = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+    return queryset.alias(haversine=haversine(latitude, longitude)).filter(haversine__lte=limit)
@@ -0,0 +1,79 @@
+# listings/instrumentation.py
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts queries and the time spent running them.
+    """
+
+    def __init__(self, capture_sql=False):
+        self.count = 0
+        self.duration = 0.0
+        self.capture_sql = capture_sql
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            if self.capture_sql:
+                self.queries.append(sql)
+
+
+@contextmanager
+def count_queries(capture_sql=False):
+    """
+    Count the queries run on every configured database inside the block.
+    """
+    counter = QueryCounter(capture_sql=capture_sql)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield counter
+
+
+class EndpointStats:
+    """
+    Per-endpoint running totals of requests, queries and DB time for this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: {'requests': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0})
+
+    def record(self, endpoint, queries, db_time):
+        with self._lock:
+            totals = self._totals[endpoint]
+            totals['requests'] += 1
+            totals['queries'] += queries
+            totals['db_time'] += db_time
+            totals['max_queries'] = max(totals['max_queries'], queries)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(totals) for endpoint, totals in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def endpoint_name(request):
+    """
+    Stable name for the endpoint that served a request, e.g. "GET listing-list".
+    """
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name or match.route) if match else 'unresolved'
+    return f'{request.method} {view}'
@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from listings.benchmarks import SCENARIOS, compare, run_suite, seed_fixture
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a deterministic fixture (once) and benchmark the listing and booking '
+        'endpoints in-process, reporting latency percentiles, throughput and queries '
+        'per request as JSON. With --baseline, fails if anything regressed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--bookings', type=int, default=5, help='Bookings per listing.')
+        parser.add_argument('--reviews', type=int, default=3, help='Reviews per listing.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--client', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--scenarios', default='', help='Comma-separated subset of: '
+                            + ', '.join(scenario.name for scenario in SCENARIOS))
+        parser.add_argument('--baseline', help='JSON report of an earlier run to compare against.')
+        parser.add_argument('--save', help='Write this run\'s report to the given path.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative slowdown before a metric counts as regressed.')
+
+    def handle(self, *args, **options):
+        seeded = seed_fixture(
+            listings=options['listings'], users=options['users'], bookings_per_listing=options['bookings'],
+            reviews_per_listing=options['reviews'], seed=options['seed'],
+        )
+        if seeded:
+            self.stderr.write('Seeded a new benchmark fixture.')
+        names = {name.strip() for name in options['scenarios'].split(',') if name.strip()}
+        report = {
+            'config': {key: options[key] for key in ('listings', 'users', 'bookings', 'reviews', 'seed',
+                                                     'requests', 'concurrency', 'client')},
+        }
+        # The test clients call themselves "testserver", which the test runner normally allows.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            report['results'] = run_suite(options['requests'], options['concurrency'], options['client'], names)
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            report['regressions'] = compare(report['results'], baseline['results'], options['tolerance'])
+        output = json.dumps(report, indent=2)
+        if options['save']:
+            Path(options['save']).write_text(output + '\n')
+        self.stdout.write(output)
+        if report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} metric(s) regressed against {options['baseline']}.")
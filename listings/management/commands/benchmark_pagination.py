@@ -0,0 +1,82 @@
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings.models import Listing
+from listings.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare page-N latency of keyset and OFFSET pagination on the listings '
+        'queryset as the table grows. Runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma-separated table sizes to measure at.')
+        parser.add_argument('--depths', default='1,10,100,1000',
+                            help='Comma-separated page numbers to fetch.')
+        parser.add_argument('--page-size', type=int, default=KeysetPagination.page_size)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement (median is kept).')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        depths = [int(depth) for depth in options['depths'].split(',')]
+        page_size = options['page_size']
+        paginator = KeysetPagination()
+        ordering = list(paginator.ordering)
+        results = []
+
+        with transaction.atomic():
+            owner = User.objects.create(username='benchmark-pagination-owner')
+            queryset = Listing.objects.select_related('owner').order_by(*ordering)
+            for size in sizes:
+                self.seed(owner, size, options['batch_size'])
+                for depth in depths:
+                    offset = (depth - 1) * page_size
+                    if offset >= size:
+                        continue
+                    keyset_query = queryset
+                    if offset:
+                        boundary = queryset.values_list('created_at', 'id')[offset - 1]
+                        keyset_query = queryset.filter(paginator.keyset_filter(ordering, list(boundary)))
+                    results.append({
+                        'rows': size,
+                        'page': depth,
+                        'keyset_ms': self.measure(lambda: list(keyset_query[:page_size]), options['repeat']),
+                        'offset_ms': self.measure(lambda: list(queryset[offset:offset + page_size]), options['repeat']),
+                    })
+                    self.stderr.write(json.dumps(results[-1]))
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, owner, size, batch_size):
+        existing = Listing.objects.count()
+        while existing < size:
+            count = min(batch_size, size - existing)
+            Listing.objects.bulk_create(
+                Listing(
+                    title=f'Benchmark listing {existing + i}', description='', address='', city='Nairobi',
+                    country='Kenya', price_per_night=Decimal('50.00'), max_guests=2, owner=owner,
+                )
+                for i in range(count)
+            )
+            existing += count
+
+    @staticmethod
+    def measure(func, repeat):
+        func()  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 3)
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import statistics
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.models import Listing
+
+FIXTURE_OWNER = 'loadtest-owner'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of the sync read endpoints served over WSGI with the '
+        'async ones (/api/async/...) served over ASGI, at high concurrency against '
+        'the same database. Start both servers first, e.g. '
+        '"gunicorn wsgi:application -b :8000 --threads 8" and '
+        '"uvicorn asgi:application --port 8001".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001')
+        parser.add_argument('--paths', default='listings/,listings/?q=flat,listings/?ordering=-rating',
+                            help='Comma-separated paths under /api/ (WSGI) and /api/async/ (ASGI).')
+        parser.add_argument('--concurrency', type=int, default=256, help='Requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per server.')
+        parser.add_argument('--read-delay', type=float, default=0.0,
+                            help='Seconds each client waits before reading its response, to mimic slow clients.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Make sure the fixture has at least this many listings before starting.')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+        paths = [path.strip().lstrip('/') for path in options['paths'].split(',') if path.strip()]
+        results = {}
+        for mode, base_url, prefix in (('wsgi', options['wsgi_url'], '/api/'), ('asgi', options['asgi_url'], '/api/async/')):
+            targets = [prefix + path for path in paths]
+            results[mode] = asyncio.run(self.run(base_url, targets, options))
+            self.stderr.write(json.dumps({mode: results[mode]}))
+        if results['wsgi']['requests_per_second']:
+            results['asgi_speedup'] = round(results['asgi']['requests_per_second'] / results['wsgi']['requests_per_second'], 2)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, size):
+        owner, _ = User.objects.get_or_create(username=FIXTURE_OWNER)
+        existing = Listing.objects.filter(owner=owner).count()
+        Listing.objects.bulk_create(
+            (
+                Listing(
+                    title=f'Load test flat {i}', description='A flat for load testing.', address='', city='Nairobi',
+                    country='Kenya', price_per_night=Decimal('50.00'), max_guests=2, owner=owner,
+                )
+                for i in range(existing, size)
+            ),
+            batch_size=5000,
+        )
+
+    async def run(self, base_url, targets, options):
+        url = urlsplit(base_url)
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError(f'Expected a plain http:// URL, got {base_url!r}')
+        host, port = url.hostname, url.port or 80
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        errors = 0
+
+        async def fetch(path):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    status = await self.get(host, port, path, options['read_delay'])
+                except OSError:
+                    status = None
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch(targets[i % len(targets)]) for i in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'requests': options['requests'],
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': self.percentile(latencies, 50),
+            'p95_ms': self.percentile(latencies, 95),
+            'p99_ms': self.percentile(latencies, 99),
+        }
+
+    @staticmethod
+    async def get(host, port, path, read_delay):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            if read_delay:
+                await asyncio.sleep(read_delay)
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return None
+        if len(values) == 1:
+            return round(values[0] * 1000, 2)
+        return round(statistics.quantiles(values, n=100)[percent - 1] * 1000, 2)
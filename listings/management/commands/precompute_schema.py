@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from listings.schema import CONTENT_TYPES, write_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema into SCHEMA_DIR, to be served as a static file (run at deploy time).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(CONTENT_TYPES), action='append', dest='formats',
+                            help='Only write this format (repeatable; default: all).')
+
+    def handle(self, *args, **options):
+        for path in write_artifacts(options['formats'] or tuple(CONTENT_TYPES)):
+            self.stdout.write(f'Wrote {path}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.analytics import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily occupancy and revenue rollup from the bookings table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_stats(batch_size=options['batch_size'])
+        self.stdout.write(f'{written} daily stat row(s) written.')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from listings.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized listing rating aggregates from the reviews table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many listings drifted.')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_ratings(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(f'{corrected} listing(s) {verb}.')
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.outbox import prune, relay
+
+
+class Command(BaseCommand):
+    help = 'Publish pending outbox messages to the Celery broker (once, or continuously with --loop).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when drained.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when there is nothing to relay.')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--prune', action='store_true', help='Also delete dispatched messages past retention.')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                relayed = relay(batch_size=options['batch_size'])
+            except Exception as exc:
+                if not options['loop']:
+                    raise
+                # Broker outage: the batch stayed pending, try again after a pause.
+                self.stderr.write(f'Outbox relay failed: {exc}')
+                relayed = 0
+            if relayed:
+                self.stdout.write(f'Relayed {relayed} outbox message(s).')
+            if options['prune']:
+                pruned = prune()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} dispatched outbox message(s).')
+            if not options['loop']:
+                break
+            if not relayed:
+                time.sleep(options['interval'])
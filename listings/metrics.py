@@ -0,0 +1,129 @@
+# listings/metrics.py
+import os
+import time
+
+from celery.signals import (
+    before_task_publish, task_failure, task_postrun, task_prerun, worker_process_shutdown,
+)
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# With PROMETHEUS_MULTIPROC_DIR set (before any process starts), every web and
+# Celery worker process writes its samples to memory-mapped files in that
+# directory, and /metrics sums them up. The directory must be emptied when the
+# whole deployment restarts; gunicorn's child_exit hook should call
+# multiprocess.mark_process_dead(worker.pid).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+http_requests = Counter(
+    'http_requests_total', 'HTTP requests served.', ['method', 'endpoint', 'status'],
+)
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response.', ['method', 'endpoint'], buckets=LATENCY_BUCKETS,
+)
+http_request_db_duration = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL per request.', ['method', 'endpoint'], buckets=LATENCY_BUCKETS,
+)
+http_request_queries = Histogram(
+    'http_request_queries', 'SQL queries per request.', ['method', 'endpoint'], buckets=QUERY_BUCKETS,
+)
+celery_tasks_published = Counter(
+    'celery_tasks_published_total', 'Tasks sent to the broker.', ['task'],
+)
+celery_task_queue_wait = Histogram(
+    'celery_task_queue_wait_seconds', 'Time from publishing a task to a worker starting it.', ['task'],
+    buckets=TASK_BUCKETS,
+)
+celery_task_duration = Histogram(
+    'celery_task_duration_seconds', 'Task run time.', ['task', 'state'], buckets=TASK_BUCKETS,
+)
+celery_tasks = Counter(
+    'celery_tasks_total', 'Tasks run, by final state (SUCCESS, FAILURE, RETRY, ...).', ['task', 'state'],
+)
+celery_task_failures = Counter(
+    'celery_task_failures_total', 'Tasks that raised, by exception type.', ['task', 'exception'],
+)
+
+PUBLISHED_AT_HEADER = 'published_at'
+
+# task_id -> perf_counter() at task_prerun, for this worker process.
+_task_started = {}
+
+
+def observe_request(method, endpoint, status, duration, db_duration, queries):
+    http_requests.labels(method, endpoint, str(status)).inc()
+    http_request_duration.labels(method, endpoint).observe(duration)
+    http_request_db_duration.labels(method, endpoint).observe(db_duration)
+    http_request_queries.labels(method, endpoint).observe(queries)
+
+
+def task_name(sender):
+    return getattr(sender, 'name', None) or str(sender)
+
+
+@before_task_publish.connect
+def record_task_published(sender=None, headers=None, **kwargs):
+    """
+    Stamp the message with its publish time so the worker can measure queue wait.
+    """
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+    celery_tasks_published.labels(task_name(sender)).inc()
+
+
+@task_prerun.connect
+def record_task_started(sender=None, task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    request = getattr(task, 'request', None)
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None) or (getattr(request, 'headers', None) or {}).get(PUBLISHED_AT_HEADER)
+    if published_at:
+        celery_task_queue_wait.labels(task_name(task or sender)).observe(max(time.time() - float(published_at), 0))
+
+
+@task_postrun.connect
+def record_task_finished(sender=None, task_id=None, task=None, state=None, **kwargs):
+    name = task_name(task or sender)
+    state = state or 'UNKNOWN'
+    celery_tasks.labels(name, state).inc()
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        celery_task_duration.labels(name, state).observe(time.perf_counter() - started)
+
+
+@task_failure.connect
+def record_task_failure(sender=None, exception=None, **kwargs):
+    celery_task_failures.labels(task_name(sender), type(exception).__name__).inc()
+
+
+@worker_process_shutdown.connect
+def mark_worker_dead(pid=None, **kwargs):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def metrics_registry():
+    """
+    The registry to expose: this process's, or all processes' in multiprocess mode.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """
+    GET /metrics in the Prometheus text format. When METRICS_TOKEN is set,
+    scrapers must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,52 @@
+# listings/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import count_queries, endpoint_name, endpoint_stats
+from .metrics import observe_request
+
+
+class QueryCountMiddleware:
+    """
+    Records the number of queries, the DB time and the latency of every request
+    per endpoint, in-process and as Prometheus metrics (listings/metrics.py).
+    In debug mode the DB figures are also reported in a `Server-Timing` header.
+    Works in both sync and async chains, so it does not force async views
+    under ASGI through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with count_queries() as counter:
+            response = self.get_response(request)
+        return self.record(request, response, counter, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with count_queries() as counter:
+            response = await self.get_response(request)
+        return self.record(request, response, counter, time.perf_counter() - start)
+
+    def record(self, request, response, counter, duration):
+        endpoint = endpoint_name(request)
+        endpoint_stats.record(endpoint, counter.count, counter.duration)
+        observe_request(request.method, endpoint.split(' ', 1)[1], response.status_code,
+                        duration, counter.duration, counter.count)
+        if settings.DEBUG:
+            # Appended: ProfilingMiddleware, further in, may have written its breakdown already.
+            timing = f'db;dur={counter.duration * 1000:.2f};desc="{counter.count} queries"'
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_booked_nights(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    nights = []
+    for booking in Booking.objects.only('id', 'listing_id', 'check_in_date', 'check_out_date').iterator():
+        night = booking.check_in_date
+        while night < booking.check_out_date:
+            nights.append(BookedNight(listing_id=booking.listing_id, booking_id=booking.id, night=night))
+            night += timedelta(days=1)
+        if len(nights) >= 5000:
+            BookedNight.objects.bulk_create(nights)
+            nights = []
+    BookedNight.objects.bulk_create(nights)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['city', 'max_guests'], name='listing_city_guests_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookednight',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='listings.booking'),
+        ),
+        migrations.AddField(
+            model_name='bookednight',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.listing'),
+        ),
+        migrations.AddIndex(
+            model_name='bookednight',
+            index=models.Index(fields=['listing', 'night'], name='bookednight_listing_night_idx'),
+        ),
+        migrations.RunPython(backfill_booked_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_double_booked_nights(apps, schema_editor):
+    # Bookings made under the old unique_together rule may overlap; the earliest
+    # booking keeps the contested nights so the unique constraint can be created.
+    # The others are flagged rather than cancelled: they still claim nights they
+    # no longer hold, until staff move or cancel them.
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    keep = (
+        BookedNight.objects.values('listing_id', 'night')
+        .annotate(keep_id=Min('id'))
+        .values_list('keep_id', flat=True)
+    )
+    contested = BookedNight.objects.exclude(id__in=list(keep))
+    Booking.objects.filter(id__in=contested.values('booking_id')).update(needs_review=True)
+    contested.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_booked_night_occupancy'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookednight',
+            name='bookednight_listing_night_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='needs_review',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(drop_double_booked_nights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bookednight',
+            constraint=models.UniqueConstraint(fields=('listing', 'night'), name='bookednight_listing_night_uniq'),
+        ),
+    ]
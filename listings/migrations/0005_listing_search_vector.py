@@ -0,0 +1,55 @@
+# Full-text search column, GIN index and maintenance trigger for Postgres.
+# Other databases use the in-process index in listings/search.py instead, so
+# every operation here is a no-op off Postgres.
+
+from django.db import migrations
+
+FORWARD_SQL = [
+    'ALTER TABLE listings_listing ADD COLUMN search_vector tsvector',
+    '''
+    CREATE FUNCTION listings_listing_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.amenities, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER listings_listing_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, amenities, description ON listings_listing
+    FOR EACH ROW EXECUTE FUNCTION listings_listing_search_vector_update()
+    ''',
+    # Fires the trigger once for existing rows.
+    'UPDATE listings_listing SET title = title',
+    'CREATE INDEX listing_search_vector_idx ON listings_listing USING GIN (search_vector)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX IF EXISTS listing_search_vector_idx',
+    'DROP TRIGGER IF EXISTS listings_listing_search_vector_trigger ON listings_listing',
+    'DROP FUNCTION IF EXISTS listings_listing_search_vector_update()',
+    'ALTER TABLE listings_listing DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import re
+
+from django.db import migrations, models
+
+# Copies of the listings/amenities.py helpers as they were when this migration
+# was written, so later changes to the app cannot change what it does.
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+ALIASES = {
+    'wireless': 'wifi',
+    'wlan': 'wifi',
+    'internet': 'wifi',
+    'airconditioning': 'ac',
+    'aircon': 'ac',
+    'swimmingpool': 'pool',
+    'freeparking': 'parking',
+}
+
+
+def amenity_key(name):
+    key = NON_ALNUM_RE.sub('', (name or '').lower())
+    return ALIASES.get(key, key)
+
+
+def split_amenities(text):
+    return [part.strip() for part in re.split(r'[,;\n]', text or '') if part.strip()]
+
+
+def parse_free_text_amenities(apps, schema_editor):
+    Amenity = apps.get_model('listings', 'Amenity')
+    Listing = apps.get_model('listings', 'Listing')
+    catalog = {amenity.key: amenity for amenity in Amenity.objects.all()}
+    updated = []
+    for listing in Listing.objects.only('id', 'amenities').iterator():
+        mask = 0
+        names = []
+        for raw in split_amenities(listing.amenities):
+            key = amenity_key(raw)
+            if key not in catalog:
+                if len(catalog) >= 63:
+                    raise ValueError('More than 63 distinct amenities; clean up the data before migrating.')
+                catalog[key] = Amenity.objects.create(key=key, name=raw, bit=len(catalog))
+            amenity = catalog[key]
+            if not mask & (1 << amenity.bit):
+                mask |= 1 << amenity.bit
+                names.append(amenity.name)
+        listing.amenities = ', '.join(names)
+        listing.amenity_mask = mask
+        updated.append(listing)
+        if len(updated) >= 2000:
+            Listing.objects.bulk_update(updated, ['amenities', 'amenity_mask'])
+            updated = []
+    Listing.objects.bulk_update(updated, ['amenities', 'amenity_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Amenity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=50)),
+                ('bit', models.PositiveSmallIntegerField(unique=True)),
+            ],
+            options={
+                'ordering': ['bit'],
+            },
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='amenity_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(parse_free_text_amenities, migrations.RunPython.noop),
+    ]
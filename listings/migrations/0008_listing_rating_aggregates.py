@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    stars = range(1, 6)
+    rows = Review.objects.order_by().values('listing_id').annotate(
+        count=Count('id'), total=Sum('rating'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in stars},
+    )
+    listings = []
+    for row in rows.iterator():
+        listing = Listing(id=row['listing_id'], rating_count=row['count'], rating_sum=row['total'],
+                          rating_avg=row['total'] / row['count'])
+        for star in stars:
+            setattr(listing, f'rating_{star}', row[f'rating_{star}'])
+        listings.append(listing)
+    fields = ['rating_count', 'rating_sum', 'rating_avg'] + [f'rating_{star}' for star in stars]
+    Listing.objects.bulk_update(listings, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-rating_avg', '-id'], name='listing_rating_id_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('season', 'Seasonal rate'), ('weekend', 'Weekend rate'), ('weekly_discount', 'Weekly discount'), ('monthly_discount', 'Monthly discount'), ('cleaning_fee', 'Cleaning fee')], max_length=20)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('percent', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pricing_rules', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'start_date', 'id'],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 class Listing(models.Model):
@@ -7,19 +9,99 @@ class Listing(models.Model):
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, editable=False) # Derived from latitude/longitude on save
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     max_guests = models.IntegerField()
     number_of_beds = models.IntegerField(default=1)
     number_of_baths = models.DecimalField(max_digits=3, decimal_places=1, default=1.0)
-    amenities = models.TextField(blank=True) # e.g., "wifi, kitchen, AC"
+    amenities = models.TextField(blank=True) # e.g., "wifi, kitchen, AC"; normalized to catalog names on save
+    amenity_mask = models.BigIntegerField(default=0, editable=False) # One bit per Amenity.bit
     image_url = models.URLField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
+    # Review aggregates, kept current by the Review signal receivers (listings/ratings.py)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False) # 0 while there are no reviews
+    rating_1 = models.PositiveIntegerField(default=0, editable=False) # Per-star histogram
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'max_guests'], name='listing_city_guests_idx'),
+            # Matches the keyset pagination order of the listings API
+            models.Index(fields=['-created_at', '-id'], name='listing_created_id_idx'),
+            # ?ordering=-rating and ?min_rating=
+            models.Index(fields=['-rating_avg', '-id'], name='listing_rating_id_idx'),
+            # Radius and bounding-box search prune by geohash prefix ranges (listings/geo.py)
+            models.Index(fields=['geohash'], name='listing_geohash_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+class Amenity(models.Model):
+    """
+    Catalog of known amenities. Each one owns a bit of Listing.amenity_mask.
+    """
+    MAX_BITS = 63 # amenity_mask is a signed 64-bit integer
+
+    key = models.CharField(max_length=50, unique=True) # normalized lookup key, e.g. "wifi"
+    name = models.CharField(max_length=50) # display name, e.g. "WiFi"
+    bit = models.PositiveSmallIntegerField(unique=True)
+
+    class Meta:
+        ordering = ['bit']
+
+    def __str__(self):
+        return self.name
+
+class PricingRule(models.Model):
+    """
+    A pricing adjustment for one listing, compiled with its base price into a
+    nightly-rate calendar by listings/pricing.py.
+    """
+    SEASON = 'season' # nightly `amount` for nights from start_date to end_date (inclusive)
+    WEEKEND = 'weekend' # nightly `amount` for Friday and Saturday nights
+    WEEKLY_DISCOUNT = 'weekly_discount' # `percent` off stays of 7 nights or more
+    MONTHLY_DISCOUNT = 'monthly_discount' # `percent` off stays of 28 nights or more (instead of weekly)
+    CLEANING_FEE = 'cleaning_fee' # flat `amount` per stay
+    KIND_CHOICES = [
+        (SEASON, 'Seasonal rate'),
+        (WEEKEND, 'Weekend rate'),
+        (WEEKLY_DISCOUNT, 'Weekly discount'),
+        (MONTHLY_DISCOUNT, 'Monthly discount'),
+        (CLEANING_FEE, 'Cleaning fee'),
+    ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='pricing_rules')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    percent = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True,
+                                  validators=[MinValueValidator(0), MaxValueValidator(100)])
+
+    class Meta:
+        ordering = ['listing', 'start_date', 'id'] # later seasons override earlier ones where they overlap
+
+    def clean(self):
+        if self.kind == self.SEASON and not (self.start_date and self.end_date and self.start_date <= self.end_date):
+            raise ValidationError('A seasonal rate needs a start date on or before its end date.')
+        if self.kind in (self.SEASON, self.WEEKEND, self.CLEANING_FEE) and self.amount is None:
+            raise ValidationError('This rule needs an amount.')
+        if self.kind in (self.WEEKLY_DISCOUNT, self.MONTHLY_DISCOUNT) and self.percent is None:
+            raise ValidationError('A discount needs a percent.')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for listing {self.listing_id}"
+
 class Booking(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bookings')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -27,13 +109,86 @@ class Booking(models.Model):
     check_out_date = models.DateField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set by migration 0003 on legacy bookings that overlapped an earlier one: they lost
+    # the contested nights in the occupancy index, so staff must move or cancel them.
+    needs_review = models.BooleanField(default=False, editable=False)
 
     class Meta:
-        unique_together = ('listing', 'check_in_date', 'check_out_date') # Prevent overlapping bookings for the same listing and dates
+        indexes = [
+            # Keyset pagination order for staff, and for guests filtered to their own bookings
+            models.Index(fields=['-created_at', '-id'], name='booking_created_id_idx'),
+            models.Index(fields=['guest', '-created_at', '-id'], name='booking_guest_created_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The BookedNight rows written by the post_save receiver enforce the no-overlap rule,
+        # so they must commit (or fail) together with the booking itself.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Booking for {self.listing.title} by {self.guest.username}"
 
+class BookedNight(models.Model):
+    """
+    One row per occupied night of a booking (check-in inclusive, check-out exclusive).
+    Acts as the per-listing day occupancy index used by availability search, and its
+    unique (listing, night) constraint is what makes overlapping bookings impossible.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booked_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='nights')
+    night = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'night'], name='bookednight_listing_night_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} booked on {self.night}"
+
+class DailyStat(models.Model):
+    """
+    Daily occupancy and revenue rollup of a listing, one row per booked night,
+    kept in step with the bookings by listings/analytics.py. A booking's revenue
+    is spread evenly over its nights.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    booked_nights = models.PositiveIntegerField(default=0)
+    check_ins = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index every analytics query ranges over
+            models.UniqueConstraint(fields=['listing', 'day'], name='dailystat_listing_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} on {self.day}"
+
+class OutboxMessage(models.Model):
+    """
+    A Celery task to enqueue, written in the same transaction as the change that
+    triggers it and relayed to the broker after commit (see listings/outbox.py).
+    """
+    task = models.CharField(max_length=200) # registered Celery task name
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    dedup_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay only ever scans undispatched messages, oldest first
+            models.Index(fields=['id'], condition=models.Q(dispatched_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)}"
+
 class Review(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='reviews')
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
@@ -41,5 +196,15 @@ class Review(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # The listing's rating aggregates are updated by the post_save receiver
+        # and must commit together with the review.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"Review for {self.listing.title} by {self.guest.username} - Rating: {self.rating}"
@@ -0,0 +1,58 @@
+# listings/occupancy.py
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+
+from .models import BookedNight, Listing
+
+
+def nights_between(check_in_date, check_out_date):
+    """
+    Yield every night of a stay: check-in inclusive, check-out exclusive.
+    """
+    night = check_in_date
+    while night < check_out_date:
+        yield night
+        night += timedelta(days=1)
+
+
+def build_nights(booking):
+    """
+    Build (unsaved) BookedNight rows for a booking.
+    """
+    return [
+        BookedNight(listing_id=booking.listing_id, booking_id=booking.id, night=night)
+        for night in nights_between(booking.check_in_date, booking.check_out_date)
+    ]
+
+
+def sync_booking_nights(booking):
+    """
+    Rewrite the occupancy rows of a booking after it was created or its dates/listing changed.
+    """
+    BookedNight.objects.filter(booking_id=booking.id).delete()
+    BookedNight.objects.bulk_create(build_nights(booking))
+
+
+def occupied_between(check_in_date, check_out_date):
+    """
+    Subquery matching listings that have at least one booked night in the range.
+    """
+    return BookedNight.objects.filter(
+        listing=OuterRef('pk'),
+        night__gte=check_in_date,
+        night__lt=check_out_date,
+    )
+
+
+def available_listings(check_in_date, check_out_date, queryset=None, city=None, guests=None):
+    """
+    Listings that are free for every night from check_in_date up to check_out_date.
+    """
+    if queryset is None:
+        queryset = Listing.objects.all()
+    if city:
+        queryset = queryset.filter(city=city)
+    if guests:
+        queryset = queryset.filter(max_guests__gte=guests)
+    return queryset.filter(~Exists(occupied_between(check_in_date, check_out_date)))
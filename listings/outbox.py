@@ -0,0 +1,116 @@
+# listings/outbox.py
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+BOOKING_CONFIRMATION_TASK = 'listings.tasks.send_booking_confirmation_email_task'
+
+# Single-item tasks whose consecutive messages the relay folds into one call of
+# a batch task taking the list of their first arguments.
+BATCH_TASKS = {
+    BOOKING_CONFIRMATION_TASK: 'listings.tasks.send_booking_confirmation_emails_task',
+}
+
+
+def enqueue(task, args=(), kwargs=None, dedup_key=None):
+    """
+    Record a task to be sent to the broker once the current transaction commits.
+    A message with an already recorded `dedup_key` is dropped.
+    """
+    enqueue_many([OutboxMessage(task=task, args=list(args), kwargs=kwargs or {}, dedup_key=dedup_key)])
+
+
+def enqueue_many(messages):
+    """
+    Record several unsaved OutboxMessage instances with one INSERT.
+    """
+    OutboxMessage.objects.bulk_create(
+        messages, ignore_conflicts=any(message.dedup_key is not None for message in messages),
+    )
+
+
+def booking_confirmation_message(booking):
+    return OutboxMessage(
+        task=BOOKING_CONFIRMATION_TASK, args=[booking.id], dedup_key=f'booking-confirmation:{booking.id}',
+    )
+
+
+def enqueue_booking_confirmation(booking):
+    enqueue_many([booking_confirmation_message(booking)])
+
+
+def publish(task, args=(), kwargs=None):
+    """
+    Send one task message to the broker.
+    """
+    current_app.send_task(task, args=list(args), kwargs=kwargs or {})
+
+
+def plan_dispatch(messages, batch_size):
+    """
+    Turn outbox messages (oldest first) into the task calls to publish, in order.
+    Runs of consecutive batchable messages collapse into batch task calls.
+    """
+    calls = []
+    for message in messages:
+        batch_task = BATCH_TASKS.get(message.task)
+        if batch_task and not message.kwargs and len(message.args) == 1:
+            previous = calls[-1] if calls else None
+            if previous and previous[0] == batch_task and len(previous[1][0]) < batch_size:
+                previous[1][0].append(message.args[0])
+            else:
+                calls.append((batch_task, [[message.args[0]]], {}))
+        else:
+            calls.append((message.task, message.args, message.kwargs))
+    return calls
+
+
+def relay(batch_size=None, max_batches=None):
+    """
+    Publish pending outbox messages to the broker in id order, a batch at a time.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED (where the
+    database supports it) so several relays can run side by side, and marked
+    dispatched in the same transaction. If the broker is unreachable the
+    transaction rolls back and the batch is retried on the next run; delivery
+    is therefore at-least-once. Returns the number of messages relayed.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'OUTBOX_RELAY_BATCH_SIZE', 500)
+    email_batch_size = getattr(settings, 'BOOKING_CONFIRMATION_BATCH_SIZE', 100)
+    relayed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(dispatched_at__isnull=True)
+                .order_by('id')[:batch_size]
+            )
+            if not messages:
+                break
+            for task, args, kwargs in plan_dispatch(messages, email_batch_size):
+                publish(task, args, kwargs)
+            OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(dispatched_at=timezone.now())
+        relayed += len(messages)
+        batches += 1
+        if len(messages) < batch_size:
+            break
+    return relayed
+
+
+def prune(retention=None):
+    """
+    Delete dispatched messages older than the retention window. They are only
+    kept that long so late duplicates are still caught by `dedup_key`.
+    """
+    if retention is None:
+        retention = timedelta(days=getattr(settings, 'OUTBOX_RETENTION_DAYS', 7))
+    cutoff = timezone.now() - retention
+    deleted, _ = OutboxMessage.objects.filter(dispatched_at__lt=cutoff).delete()
+    return deleted
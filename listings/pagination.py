@@ -0,0 +1,209 @@
+# listings/pagination.py
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key, `-created_at, -id` by default.
+
+    Unlike DRF's CursorPagination, which keys on the first ordering field and
+    skips ties with an OFFSET, the cursor holds the full key of the boundary row,
+    so every page is a `WHERE (created_at, id) < (...) ORDER BY ... LIMIT n` that
+    an index on the same columns answers in O(page size) at any depth.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        """
+        The key to paginate on; the last field must be unique (normally `id`).
+        """
+        return getattr(view, 'pagination_ordering', None) or self.ordering
+
+    @staticmethod
+    def query_params(request):
+        # DRF requests have query_params, the plain Django requests of the async views only GET.
+        return getattr(request, 'query_params', request.GET)
+
+    def get_page_size(self, request):
+        try:
+            size = int(self.query_params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.build_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None, ordering=None):
+        """
+        The same page, fetched with the async ORM. `request` may be a plain
+        Django request here; `ordering` stands in for the view's pagination_ordering.
+        """
+        rows = [row async for row in self.page_queryset(queryset, request, view, ordering)]
+        return self.build_page(rows)
+
+    def page_queryset(self, queryset, request, view=None, ordering=None):
+        """
+        The queryset of one page plus one row, telling whether there is a next page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(ordering or self.get_ordering(request, queryset, view))
+        self.cursor = self.decode_cursor(request)
+        if self.cursor:
+            self.cursor['key'] = self.clean_key(queryset, self.cursor['key'])
+        self.reverse = bool(self.cursor and self.cursor['reverse'])
+
+        order_by = [self._flip(field) for field in self.ordering] if self.reverse else list(self.ordering)
+        queryset = queryset.order_by(*order_by)
+        if self.cursor:
+            queryset = queryset.filter(self.keyset_filter(order_by, self.cursor['key']))
+        return queryset[:self.page_size + 1]
+
+    def build_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        # Going forward there is always a way back once a cursor was used, and vice versa.
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = (self.cursor is not None) if not self.reverse else has_more
+        self.first_key = self.key_for(rows[0]) if rows else None
+        self.last_key = self.key_for(rows[-1]) if rows else None
+        return rows
+
+    def keyset_filter(self, order_by, key):
+        """
+        Rows strictly after `key` in `order_by` order, expanded into
+        `a >= x AND (a > x OR (a = x AND b > y) OR ...)`. The redundant leading
+        bound is what lets the planner seek into the index instead of scanning it.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(order_by, key):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        first = order_by[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": key[0]})
+        return bound & condition
+
+    def key_for(self, row):
+        values = []
+        for field in self.ordering:
+            value = row
+            for part in field.lstrip('-').split('__'):
+                value = value[part] if isinstance(value, dict) else getattr(value, part)
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _encode_value(value):
+        # Full precision on purpose: DjangoJSONEncoder truncates datetimes to
+        # milliseconds, which would make the boundary comparison inexact.
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+    def encode_cursor(self, key, reverse):
+        payload = json.dumps({'k': key, 'r': int(reverse)}, default=self._encode_value, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = self.query_params(request).get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            data = json.loads(payload)
+            key, reverse = data['k'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'key': key, 'reverse': reverse}
+
+    @staticmethod
+    def ordering_field(queryset, name):
+        """
+        The model field (or annotation output field) an ordering name refers to.
+        """
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model = queryset.model
+        parts = name.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.pk if parts[-1] == 'pk' else model._meta.get_field(parts[-1])
+
+    def clean_key(self, queryset, key):
+        """
+        The cursor's key values converted by their ordering fields, so that a
+        crafted cursor is a 404 rather than an error from the query.
+        """
+        cleaned = []
+        for field, value in zip(self.ordering, key):
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(self.ordering_field(queryset, field.lstrip('-')).to_python(value))
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_key is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,33 @@
+# listings/parsers.py
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one object per line) lazily: `request.data`
+    is a generator, so an upload is read line by line as it is consumed
+    instead of being loaded into memory first.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self._rows(stream, encoding)
+
+    @staticmethod
+    def _rows(stream, encoding):
+        if stream is None:
+            return
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number} - {exc}')
@@ -0,0 +1,138 @@
+# listings/pricing.py
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import fill_reads, get_versions, listing_version_key
+from .models import PricingRule
+
+WEEKLY_NIGHTS = 7
+MONTHLY_NIGHTS = 28
+WEEKEND_DAYS = (4, 5)  # Friday and Saturday nights
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_cents(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+def to_basis_points(percent):
+    return int((Decimal(percent) * 100).to_integral_value()) if percent is not None else 0
+
+
+def compile_calendar(listing, year, rules):
+    """
+    A listing's pricing for one year: the nightly rate in cents of every night
+    of the year (an int64 array indexed by day of year) and its stay-level terms.
+    """
+    first = date(year, 1, 1)
+    days = (date(year, 12, 31) - first).days + 1  # no date(year + 1, 1, 1): year 9999 is valid
+    rates = np.full(days, to_cents(listing.price_per_night), dtype=np.int64)
+    weekdays = (np.arange(days) + first.weekday()) % 7
+    terms = {'cleaning_fee': 0, 'weekly_bp': 0, 'monthly_bp': 0}
+    seasons = []
+    for rule in rules:
+        if rule.kind == PricingRule.WEEKEND and rule.amount is not None:
+            rates[np.isin(weekdays, WEEKEND_DAYS)] = to_cents(rule.amount)
+        elif rule.kind == PricingRule.SEASON and rule.amount is not None:
+            seasons.append(rule)
+        elif rule.kind == PricingRule.CLEANING_FEE and rule.amount is not None:
+            terms['cleaning_fee'] = to_cents(rule.amount)
+        elif rule.kind == PricingRule.WEEKLY_DISCOUNT:
+            terms['weekly_bp'] = to_basis_points(rule.percent)
+        elif rule.kind == PricingRule.MONTHLY_DISCOUNT:
+            terms['monthly_bp'] = to_basis_points(rule.percent)
+    # Seasons override the weekend rate, later seasons override earlier ones.
+    for rule in sorted(seasons, key=lambda rule: (rule.start_date, rule.id)):
+        start = max((rule.start_date - first).days, 0)
+        end = min((rule.end_date - first).days + 1, days)
+        if start < end:
+            rates[start:end] = to_cents(rule.amount)
+    return dict(terms, rates=rates)
+
+
+def calendar_key(listing_id, year, version):
+    return f'listings:pricing:{listing_id}:{year}:{version}'
+
+
+def get_calendars(listings, years):
+    """
+    {(listing_id, year): calendar} for every listing and year, from the cache
+    where possible; the rest is compiled from one query for all their rules.
+    Calendars are keyed on the listing's version counter, which is bumped when
+    the listing or one of its rules changes.
+    """
+    listings = {listing.id: listing for listing in listings}
+    versions = dict(zip(listings, get_versions([listing_version_key(pk) for pk in listings])))
+    keys = {(pk, year): calendar_key(pk, year, versions[pk]) for pk in listings for year in years}
+    cached = cache.get_many(list(keys.values()))
+    calendars = {slot: cached[key] for slot, key in keys.items() if key in cached}
+
+    missing = {pk for pk, year in keys if (pk, year) not in calendars}
+    if missing:
+        rules = {}
+        with fill_reads([listing_version_key(pk) for pk in missing]):
+            for rule in PricingRule.objects.filter(listing_id__in=missing):
+                rules.setdefault(rule.listing_id, []).append(rule)
+        compiled = {}
+        for pk, year in keys:
+            if (pk, year) not in calendars:
+                calendars[pk, year] = compile_calendar(listings[pk], year, rules.get(pk, []))
+                compiled[keys[pk, year]] = calendars[pk, year]
+        cache.set_many(compiled, settings.PRICING_CACHE_TIMEOUT)
+    return calendars
+
+
+def quote_stays(listings, check_in, check_out):
+    """
+    Quote the same stay at many listings in one vectorized pass.
+    Returns {listing_id: {'nights', 'subtotal', 'discount', 'cleaning_fee', 'total'}}
+    with amounts as Decimals.
+    """
+    listings = list(listings)
+    nights = (check_out - check_in).days
+    if not listings or nights <= 0:
+        return {}
+    years = range(check_in.year, (check_out - timedelta(days=1)).year + 1)
+    calendars = get_calendars(listings, years)
+    offset = (check_in - date(check_in.year, 1, 1)).days
+
+    # One row of nightly rates per listing, sliced out of its consecutive year calendars.
+    rates = np.stack([
+        np.concatenate([calendars[listing.id, year]['rates'] for year in years])[offset:offset + nights]
+        for listing in listings
+    ])
+    terms = [calendars[listing.id, years[0]] for listing in listings]
+    subtotals = rates.sum(axis=1)
+    monthly = np.array([term['monthly_bp'] for term in terms], dtype=np.int64)
+    weekly = np.array([term['weekly_bp'] for term in terms], dtype=np.int64)
+    if nights >= MONTHLY_NIGHTS:
+        discount_bp = np.where(monthly > 0, monthly, weekly)
+    elif nights >= WEEKLY_NIGHTS:
+        discount_bp = weekly
+    else:
+        discount_bp = np.zeros(len(listings), dtype=np.int64)
+    discounts = subtotals * discount_bp // 10000
+    fees = np.array([term['cleaning_fee'] for term in terms], dtype=np.int64)
+    totals = subtotals - discounts + fees
+
+    return {
+        listing.id: {
+            'nights': nights,
+            'subtotal': from_cents(subtotal),
+            'discount': from_cents(discount),
+            'cleaning_fee': from_cents(fee),
+            'total': from_cents(total),
+        }
+        for listing, subtotal, discount, fee, total in zip(listings, subtotals, discounts, fees, totals)
+    }
+
+
+def quote_stay(listing, check_in, check_out):
+    return quote_stays([listing], check_in, check_out).get(listing.id)
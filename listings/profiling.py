@@ -0,0 +1,182 @@
+# listings/profiling.py
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .instrumentation import count_queries
+
+PROFILE_INDEX_KEY = 'listings:profiles:index'
+
+# Phase timings of the request being profiled in this context, or None.
+_phases = ContextVar('listings_profile_phases', default=None)
+
+
+def profile_key(profile_id):
+    return f'listings:profiles:{profile_id}'
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the time spent in the block to phase `name` of the profiled request.
+    Nested blocks of the same phase are counted once. Costs one context
+    variable lookup when no request is being profiled.
+    """
+    phases = _phases.get()
+    if phases is None or name in phases['_active']:
+        yield
+        return
+    phases['_active'].add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+        phases['_active'].discard(name)
+
+
+def server_timing(phases):
+    return ', '.join(
+        f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items() if not name.startswith('_')
+    )
+
+
+def store_profile(profiler, meta):
+    """
+    Keep the raw pstats data of a request, plus a bounded index of recent profiles.
+    """
+    profiler.create_stats()
+    ttl = getattr(settings, 'PROFILING_TTL', 86400)
+    cache.set(profile_key(meta['id']), {'meta': meta, 'stats': marshal.dumps(profiler.stats)}, ttl)
+    index = [meta] + [entry for entry in cache.get(PROFILE_INDEX_KEY, []) if entry['id'] != meta['id']]
+    cache.set(PROFILE_INDEX_KEY, index[:getattr(settings, 'PROFILING_KEEP', 50)], ttl)
+
+
+def recent_profiles():
+    return [entry for entry in cache.get(PROFILE_INDEX_KEY, []) if cache.get(profile_key(entry['id'])) is not None]
+
+
+def load_profile(profile_id):
+    return cache.get(profile_key(profile_id))
+
+
+def profile_summary(stats_data, sort='cumulative', limit=40):
+    """
+    The pstats report of a stored profile, as text.
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(Loader(marshal.loads(stats_data)), stream=stream)
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+class Loader:
+    """
+    Lets pstats.Stats read stats already in memory (it only calls create_stats
+    and reads .stats from objects that are not file names).
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request with cProfile when a staff user asks for it (`?profile=1`
+    or an `X-Profile: 1` header, with PROFILING_STAFF_TRIGGER on) or when it is
+    picked at PROFILING_SAMPLE_RATE. Profiled responses get a Server-Timing
+    breakdown into db, serialize, render and total, and the profile is stored
+    for download from /api/profiles/. Other requests only pay for the checks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            # cProfile follows one thread, while an async request hops between the event
+            # loop and the sync executor, so async requests are never profiled.
+            return self.get_response(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def should_profile(self, request):
+        if getattr(settings, 'PROFILING_STAFF_TRIGGER', True) and (
+            request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+        ):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return True
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        phases = {'_active': set()}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread (e.g. a nested profiling tool).
+            _phases.reset(token)
+            return self.get_response(request)
+        try:
+            with count_queries() as counter:
+                response = self.get_response(request)
+        finally:
+            profiler.disable()
+            _phases.reset(token)
+        phases['db'] = counter.duration
+        phases['total'] = time.perf_counter() - start
+
+        meta = {
+            'id': uuid.uuid4().hex,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': getattr(getattr(request, 'user', None), 'username', '') or '',
+            'queries': counter.count,
+            'timings_ms': {name: round(seconds * 1000, 3) for name, seconds in phases.items() if not name.startswith('_')},
+            'created_at': timezone.now().isoformat(),
+        }
+        store_profile(profiler, meta)
+        timing = server_timing(phases) + f', profile;desc="{meta["id"]}"'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        DRF responses are rendered after the view returns, still inside the
+        middleware chain: time from here to the post-render callback is render time.
+        """
+        phases = _phases.get()
+        if phases is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                phases['render'] = phases.get('render', 0.0) + time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,96 @@
+# listings/ratings.py
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .caching import invalidate_listing
+from .models import Listing, Review
+
+STARS = range(1, 6)
+
+
+def histogram_field(rating):
+    return f'rating_{rating}'
+
+
+def apply_rating_change(listing_id, added=None, removed=None):
+    """
+    Fold one review's rating into (`added`) or out of (`removed`) a listing's
+    aggregates with a single UPDATE. Every column is computed from F()
+    expressions, so concurrent reviews of a listing never lose each other's updates.
+    """
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+    updates = {}
+    if added != removed:
+        if added is not None:
+            updates[histogram_field(added)] = F(histogram_field(added)) + 1
+        if removed is not None:
+            updates[histogram_field(removed)] = F(histogram_field(removed)) - 1
+    if count_delta or sum_delta:
+        count = F('rating_count') + count_delta
+        total = F('rating_sum') + sum_delta
+        updates['rating_count'] = count
+        updates['rating_sum'] = total
+        # SET expressions all see the row as it was before the UPDATE, so the
+        # average is taken from the new count and sum within the same statement.
+        updates['rating_avg'] = Case(
+            When(rating_count__gt=-count_delta, then=Cast(total, FloatField()) / Cast(count, FloatField())),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    if not updates:
+        return 0
+    return Listing.objects.filter(pk=listing_id).update(**updates)
+
+
+def rating_aggregates(listing_ids=None):
+    """
+    {listing_id: {field: value}} recomputed from the reviews table in one grouped query.
+    """
+    reviews = Review.objects.all()
+    if listing_ids is not None:
+        reviews = reviews.filter(listing_id__in=listing_ids)
+    rows = reviews.order_by().values('listing_id').annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{histogram_field(star): Count('id', filter=Q(rating=star)) for star in STARS},
+    )
+    aggregates = {}
+    for row in rows:
+        listing_id = row.pop('listing_id')
+        row['rating_avg'] = row['rating_sum'] / row['rating_count']
+        aggregates[listing_id] = row
+    return aggregates
+
+
+def reconcile_ratings(batch_size=1000, dry_run=False):
+    """
+    Rebuild every listing's aggregates from its reviews and rewrite the ones
+    that drifted, `batch_size` listings at a time. Returns the number of
+    listings that were (or with `dry_run`, would be) corrected.
+    """
+    fields = ['rating_count', 'rating_sum', 'rating_avg'] + [histogram_field(star) for star in STARS]
+    empty = dict.fromkeys(fields, 0)
+    empty['rating_avg'] = 0.0
+    corrected = 0
+    listings = Listing.objects.order_by('pk').only('pk', *fields)
+    last_pk = 0
+    while True:
+        batch = list(listings.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return corrected
+        last_pk = batch[-1].pk
+        aggregates = rating_aggregates([listing.pk for listing in batch])
+        stale = []
+        for listing in batch:
+            expected = aggregates.get(listing.pk, empty)
+            if any(getattr(listing, field) != expected[field] for field in fields):
+                for field in fields:
+                    setattr(listing, field, expected[field])
+                stale.append(listing)
+        corrected += len(stale)
+        if stale and not dry_run:
+            # bulk_update skips the Listing signals, so the cached responses are bumped here.
+            Listing.objects.bulk_update(stale, fields)
+            for listing in stale:
+                invalidate_listing(listing.pk)
@@ -0,0 +1,61 @@
+# listings/renderers.py
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack responses are only offered when it is installed
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: FastJSONRenderer falls back to DRF's encoder without it
+    orjson = None
+
+LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029'))
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    DRF's JSONRenderer, encoding compact responses with orjson when it is installed.
+
+    Types orjson does not handle the way DRF does (Decimals, dates and times, lazy
+    strings) go through DRF's encoder, so the output only differs in how some
+    floats are spelled (1e-05 becomes 0.00001, the same number). Indented responses
+    (`Accept: application/json; indent=4`), UNICODE_JSON = False, and data orjson
+    rejects (integers beyond 64 bits) go through the stock renderer.
+    """
+    options = orjson and orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    _default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # As the stock renderer does, escape the separators that are not valid in JavaScript strings.
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    `Accept: application/msgpack` (or `?format=msgpack`): the same data as the
+    JSON responses, Decimals and dates converted the way the JSON encoder does.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    _default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self._default, use_bin_type=True, datetime=False)
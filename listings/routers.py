@@ -0,0 +1,161 @@
+# listings/routers.py
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """
+    Where the reads of the current request or task may go, and whether it has written.
+    """
+    __slots__ = ('replicas', 'wrote')
+
+    def __init__(self, replicas=()):
+        self.replicas = tuple(replicas)
+        self.wrote = False
+
+
+_state = ContextVar('db_routing', default=None)
+_task_tokens = {}  # task id -> ContextVar token, to restore the state once the task ran
+
+
+def replica_aliases():
+    return tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+@contextmanager
+def reading_from(replicas):
+    """
+    Route the reads of the block to a random one of `replicas` (to the primary if there are none).
+    """
+    state = RoutingState(replicas)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def use_primary():
+    return reading_from(())
+
+
+def reading_replicas():
+    """
+    Whether the reads of the current context go to a replica.
+    """
+    state = _state.get()
+    return state is not None and not state.wrote and bool(state.replicas)
+
+
+class ReplicaRouter:
+    """
+    Reads go to one of the DATABASE_REPLICAS while the current context allows it
+    (a safe request from a client that is not pinned, see ReplicaRoutingMiddleware),
+    and to the primary everywhere else: management commands, Celery tasks, and any
+    request or task once it has written. Writes always go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not reading_replicas():
+            return DEFAULT_DB_ALIAS
+        return random.choice(_state.get().replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas follow the primary's schema through replication.
+        return False if db in replica_aliases() else None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends the reads of GET/HEAD/OPTIONS requests to the replicas, except for clients
+    that wrote in the last REPLICA_PIN_SECONDS: a request that writes sets a cookie
+    pinning its client to the primary for that long, so a guest who just booked sees
+    the booking even if the replicas lag behind. API clients that send credentials
+    in the Authorization header (and may not keep cookies) are pinned by those
+    credentials in the cache as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def credentials_pin_key(request):
+        # The header rather than request.user: DRF authenticates inside the view,
+        # after the reads of the request have been routed.
+        credentials = request.headers.get('Authorization')
+        if not credentials:
+            return None
+        return 'db:pin:' + hashlib.sha256(credentials.encode('utf-8')).hexdigest()
+
+    def replicas_for(self, request):
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return ()
+        pin_key = self.credentials_pin_key(request)
+        if pin_key is not None and cache.get(pin_key):
+            return ()
+        return replica_aliases()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with reading_from(self.replicas_for(request)) as state:
+            response = self.get_response(request)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        with reading_from(self.replicas_for(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(request, response, state)
+
+    def pin(self, request, response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+            pin_key = self.credentials_pin_key(request)
+            if pin_key is not None:
+                cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+@task_prerun.connect
+def route_task_to_primary(task_id=None, **kwargs):
+    # Tasks act on rows that were just written (the booking of a confirmation email),
+    # including when they run eagerly inside a request that reads from a replica.
+    _task_tokens[task_id] = _state.set(RoutingState())
+
+
+@task_postrun.connect
+def restore_task_routing(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        _state.reset(token)
@@ -0,0 +1,144 @@
+# listings/schema.py
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+# drf_yasg (and the inspectors it pulls in) is imported inside the functions below,
+# so workers only pay for it when a schema is generated or a docs page is served.
+
+CONTENT_TYPES = {'json': 'application/json', 'yaml': 'application/yaml'}
+GZIP_RE = re.compile(r'\bgzip\b')
+
+_schemas = {}  # format -> {'body', 'gzip', 'etag'}, for the life of the process
+_ui_views = {}
+_lock = threading.Lock()
+
+
+def api_info():
+    from drf_yasg import openapi
+    return openapi.Info(
+        title="ALX Travel App API",
+        default_version='v1',
+        description="API documentation for the ALX Travel App",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@alxtravel.local"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def generate_schema(fmt):
+    """
+    The public OpenAPI document in `fmt` (json or yaml), introspected from every view.
+    """
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    schema = swagger_settings.DEFAULT_GENERATOR_CLASS(api_info()).get_schema(request=None, public=True)
+    codec = OpenAPICodecJson if fmt == 'json' else OpenAPICodecYaml
+    return codec(validators=[]).encode(schema)
+
+
+def schema_entry(body, compressed=None):
+    return {
+        'body': body,
+        # mtime=0 keeps the compressed bytes identical across builds of the same schema
+        'gzip': compressed if compressed is not None else gzip.compress(body, mtime=0),
+        'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+    }
+
+
+def artifact_path(fmt):
+    return os.path.join(settings.SCHEMA_DIR, f'openapi.{fmt}')
+
+
+def write_artifacts(formats=tuple(CONTENT_TYPES)):
+    """
+    Precompute the schema at deploy time: write openapi.<fmt> and its gzipped
+    copy to SCHEMA_DIR for every format. Returns the paths written.
+    """
+    os.makedirs(settings.SCHEMA_DIR, exist_ok=True)
+    written = []
+    for fmt in formats:
+        entry = schema_entry(generate_schema(fmt))
+        for path, data in ((artifact_path(fmt), entry['body']), (artifact_path(fmt) + '.gz', entry['gzip'])):
+            # Replace atomically, so a running worker never reads half a file.
+            with open(f'{path}.tmp', 'wb') as artifact:
+                artifact.write(data)
+            os.replace(f'{path}.tmp', path)
+            written.append(path)
+    return written
+
+
+def read_artifact(fmt):
+    try:
+        with open(artifact_path(fmt), 'rb') as artifact:
+            body = artifact.read()
+    except FileNotFoundError:
+        return None
+    try:
+        with open(artifact_path(fmt) + '.gz', 'rb') as artifact:
+            compressed = artifact.read()
+    except FileNotFoundError:
+        compressed = None
+    return schema_entry(body, compressed)
+
+
+def load_schema(fmt):
+    """
+    The schema in `fmt`: from the process cache, else from the artifact written by
+    `manage.py precompute_schema`, else generated here once for the life of the process.
+    """
+    entry = _schemas.get(fmt)
+    if entry is None:
+        with _lock:
+            entry = _schemas.get(fmt)
+            if entry is None:
+                entry = _schemas[fmt] = read_artifact(fmt) or schema_entry(generate_schema(fmt))
+    return entry
+
+
+def reset():
+    _schemas.clear()
+
+
+@require_safe
+def schema_file(request, fmt):
+    """
+    /swagger.json and /swagger.yaml as a static response: ETag'd for conditional
+    requests, and gzipped for clients that accept it.
+    """
+    entry = load_schema(fmt)
+    compressed = bool(GZIP_RE.search(request.headers.get('Accept-Encoding', '')))
+    # Each encoding is a representation of its own, with its own tag.
+    etag = entry['etag'][:-1] + '-gz"' if compressed else entry['etag']
+    if set(parse_etags(request.headers.get('If-None-Match', ''))) & {etag, '*'}:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['gzip'] if compressed else entry['body'], content_type=CONTENT_TYPES[fmt])
+        if compressed:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.SCHEMA_MAX_AGE}'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def schema_ui(request, renderer):
+    """
+    Swagger UI or ReDoc. The pages load the spec from /swagger.json (SPEC_URL in
+    SWAGGER_SETTINGS and REDOC_SETTINGS), so rendering them generates nothing.
+    """
+    view = _ui_views.get(renderer)
+    if view is None:
+        from drf_yasg.views import get_schema_view
+        from rest_framework import permissions
+        schema_view = get_schema_view(api_info(), public=True, permission_classes=(permissions.AllowAny,))
+        view = _ui_views[renderer] = schema_view.with_ui(renderer, cache_timeout=settings.SCHEMA_MAX_AGE)
+    return view(request)
@@ -0,0 +1,159 @@
+# listings/search.py
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Listing
+
+# Relative weight of a term depending on the field it appears in. On Postgres the
+# same ordering is expressed with tsvector weights A, B and C (see migration 0005).
+FIELD_WEIGHTS = {'title': 3.0, 'amenities': 2.0, 'description': 1.0}
+
+# Results beyond this many are not ranked by the in-process index.
+MAX_RESULTS = 1000
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or the to with'.split())
+
+
+def tokenize(text):
+    """
+    Lower-case word tokens with stopwords dropped and a light plural strip,
+    so "Pools" matches "pool" the way Postgres' english stemmer would.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over listing title, amenities and description.
+
+    Used when the database has no full-text search of its own (SQLite in tests and
+    local development). It is built lazily from the database on first use and kept
+    current by the Listing save/delete signal receivers.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # term -> {listing_id: weighted term frequency}
+        self._terms = {}  # listing_id -> terms it is posted under
+        self._built = False
+
+    @property
+    def built(self):
+        return self._built
+
+    def build(self):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            rows = Listing.objects.values('id', *FIELD_WEIGHTS).iterator(chunk_size=2000)
+            for row in rows:
+                self._add(row['id'], row)
+            self._built = True
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            self._built = False
+
+    def update(self, listing):
+        """
+        Re-index one listing after it was saved. A no-op until the index is built.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(listing.pk)
+            self._add(listing.pk, {field: getattr(listing, field) for field in FIELD_WEIGHTS})
+
+    def remove(self, listing_id):
+        with self._lock:
+            if self._built:
+                self._remove(listing_id)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Ids and scores of listings containing every query term, best first.
+        Scores are TF-IDF with field weights.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            if not self._built:
+                self.build()
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            documents = len(self._terms) or 1
+            scores = {}
+            for posting in postings:
+                idf = math.log(1 + documents / len(posting))
+                for listing_id in candidates:
+                    scores[listing_id] = scores.get(listing_id, 0.0) + posting[listing_id] * idf
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[:limit]
+
+    def _add(self, listing_id, fields):
+        frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                frequencies[token] += weight
+        for term, frequency in frequencies.items():
+            self._postings[term][listing_id] = frequency
+        self._terms[listing_id] = tuple(frequencies)
+
+    def _remove(self, listing_id):
+        for term in self._terms.pop(listing_id, ()):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(listing_id, None)
+                if not posting:
+                    del self._postings[term]
+
+
+search_index = InvertedIndex()
+
+
+def uses_database_search():
+    return connection.vendor == 'postgresql'
+
+
+def search_listings(queryset, query):
+    """
+    Restrict `queryset` to listings matching `query`, annotated with a `rank`
+    (higher is more relevant) to order by.
+    """
+    if uses_database_search():
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.filter(
+            RawSQL(f'"listings_listing"."search_vector" @@ {tsquery}', (query,), output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f'ts_rank("listings_listing"."search_vector", {tsquery})', (query,), output_field=FloatField())
+        )
+
+    ranked = search_index.search(query)
+    if not ranked:
+        return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    return queryset.filter(id__in=[listing_id for listing_id, _ in ranked]).annotate(
+        rank=Case(
+            *[When(id=listing_id, then=Value(score)) for listing_id, score in ranked],
+            output_field=FloatField(),
+        )
+    )
@@ -1,20 +1,108 @@
+import math
+from datetime import date, timedelta
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Listing, Booking, Review
+from .amenities import amenity_errors, split_amenities
+from .facets import FACETS
+from .models import Listing, Booking, Review, BookedNight
+from .profiling import phase
+from .sparse import SparseFieldsSerializerMixin
 from django.contrib.auth.models import User
 
-class ListingSerializer(serializers.ModelSerializer):
+def stay_error(check_in, check_out):
+    """
+    Why a stay's dates cannot be booked or quoted, or None: a check-out that is not
+    after the check-in, past the booking horizon, or too many nights after it.
+    """
+    if check_out <= check_in:
+        return "Check-out must be after check-in."
+    if check_out > date.today() + timedelta(days=settings.BOOKING_HORIZON_DAYS):
+        return f"Check-out must be within {settings.BOOKING_HORIZON_DAYS} days from today."
+    if (check_out - check_in).days > settings.MAX_STAY_NIGHTS:
+        return f"Stays are limited to {settings.MAX_STAY_NIGHTS} nights."
+    return None
+
+class ProfiledListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        with phase('serialize'):
+            return super().to_representation(data)
+
+class ProfiledSerializerMixin:
+    """
+    Reports serialization time to the "serialize" phase of a profiled request.
+    """
+
+    def to_representation(self, instance):
+        with phase('serialize'):
+            return super().to_representation(instance)
+
+class ListingSerializer(SparseFieldsSerializerMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
     owner_username = serializers.CharField(source='owner.username', read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
 
     class Meta:
         model = Listing
         fields = [
-            'id', 'title', 'description', 'address', 'city', 'country',
+            'id', 'title', 'description', 'address', 'city', 'country', 'latitude', 'longitude',
             'price_per_night', 'max_guests', 'number_of_beds', 'number_of_baths',
-            'amenities', 'image_url', 'created_at', 'updated_at', 'owner', 'owner_username'
+            'amenities', 'image_url', 'created_at', 'updated_at', 'owner', 'owner_username',
+            'rating_count', 'rating_avg', 'rating_histogram'
         ]
         read_only_fields = ['owner'] # Owner should be set automatically on creation
+        list_serializer_class = ProfiledListSerializer
+        field_columns = {'rating_histogram': [f'rating_{star}' for star in range(1, 6)]}
+
+    def get_rating_histogram(self, obj):
+        return {str(star): getattr(obj, f'rating_{star}') for star in range(1, 6)}
+
+    def to_representation(self, instance):
+        return self.finish_representation(instance.pk, super().to_representation(instance))
+
+    def finish_representation(self, pk, data):
+        """
+        Additions to the fields, shared with the fast list path (listings/fastpath.py).
+        """
+        quotes = self.context.get('quotes')
+        if quotes is not None:
+            # Price of the requested stay, when the list was asked for dates.
+            quote = quotes.get(pk)
+            data['quote'] = {key: str(value) if key != 'nights' else value for key, value in quote.items()} if quote else None
+        return data
+
+    def validate_amenities(self, value):
+        user = getattr(self.context.get('request'), 'user', None)
+        errors = amenity_errors(split_amenities(value), allow_new=bool(user and user.is_staff))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Latitude and longitude must be given together.")
+        return attrs
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves primary keys from a `{field_name: {pk: instance}}` map in the
+    serializer context when one is given, so bulk imports can load the related
+    objects of a whole chunk in one query instead of one query per row.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is not None:
+            try:
+                return prefetched[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass # Unknown or malformed pk: let the regular lookup report it
+        return super().to_internal_value(data)
+
+class BookingSerializer(SparseFieldsSerializerMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
 
-class BookingSerializer(serializers.ModelSerializer):
     listing_title = serializers.CharField(source='listing.title', read_only=True)
     guest_username = serializers.CharField(source='guest.username', read_only=True)
 
@@ -24,4 +112,126 @@ class BookingSerializer(serializers.ModelSerializer):
             'id', 'listing', 'listing_title', 'guest', 'guest_username',
             'check_in_date', 'check_out_date', 'total_price', 'created_at'
         ]
-        read_only_fields = ['guest'] # Guest should be set automatically on creation
+        read_only_fields = ['guest', 'total_price'] # Set on creation: the guest from the user, the price by listings/pricing.py
+        list_serializer_class = ProfiledListSerializer
+
+    def validate(self, attrs):
+        """
+        Reject empty/inverted ranges and ranges overlapping an existing booking.
+        The overlap check is only a fast path; BookedNight's unique constraint is
+        what decides between concurrent requests.
+        """
+        listing = attrs.get('listing', getattr(self.instance, 'listing', None))
+        check_in = attrs.get('check_in_date', getattr(self.instance, 'check_in_date', None))
+        check_out = attrs.get('check_out_date', getattr(self.instance, 'check_out_date', None))
+        error = stay_error(check_in, check_out) if check_in and check_out else None
+        if error:
+            raise serializers.ValidationError({"check_out_date": error})
+
+        if self.context.get('bulk'):
+            return attrs # Bulk imports check overlap for the whole batch at once (listings/bulk.py)
+
+        taken = BookedNight.objects.filter(listing=listing, night__gte=check_in, night__lt=check_out)
+        if self.instance is not None:
+            taken = taken.exclude(booking=self.instance)
+        if taken.exists():
+            raise serializers.ValidationError("The listing is already booked for some of the requested nights.")
+        return attrs
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the availability search.
+    """
+    city = serializers.CharField(required=False, allow_blank=True)
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    guests = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        error = stay_error(attrs['check_in'], attrs['check_out'])
+        if error:
+            raise serializers.ValidationError({"check_out": error})
+        return attrs
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the owner analytics report.
+    """
+    MAX_DAYS = 731
+    start = serializers.DateField()
+    end = serializers.DateField() # exclusive, like a check-out date
+    period = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+    listing = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({"end": "End must be after start."})
+        if (attrs['end'] - attrs['start']).days > self.MAX_DAYS:
+            raise serializers.ValidationError({"end": f"At most {self.MAX_DAYS} days per report."})
+        return attrs
+
+class ListingQuerySerializer(serializers.Serializer):
+    """
+    Validates the ordering, rating and location filters of the listing list.
+    """
+    MAX_RADIUS_KM = 500
+    ORDERINGS = {
+        'rating': ('rating_avg', 'id'),
+        '-rating': ('-rating_avg', '-id'),
+    }
+
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), required=False)
+    min_rating = serializers.FloatField(required=False, min_value=0, max_value=5)
+    near = serializers.CharField(required=False) # "lat,lon"
+    radius_km = serializers.FloatField(required=False, min_value=0.001, max_value=MAX_RADIUS_KM)
+    bbox = serializers.CharField(required=False) # "min_lon,min_lat,max_lon,max_lat"
+    facets = serializers.CharField(required=False) # e.g. "city,price,amenities"
+    check_in = serializers.DateField(required=False) # with check_out, quote every result for these dates
+    check_out = serializers.DateField(required=False)
+
+    @staticmethod
+    def parse_coordinates(value, count):
+        try:
+            numbers = [float(part) for part in value.split(',')]
+        except ValueError:
+            numbers = []
+        if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+            raise serializers.ValidationError(f"Expected {count} comma-separated numbers.")
+        return numbers
+
+    @staticmethod
+    def check_point(latitude, longitude):
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            raise serializers.ValidationError("Coordinates out of range.")
+
+    def validate_near(self, value):
+        latitude, longitude = self.parse_coordinates(value, 2)
+        self.check_point(latitude, longitude)
+        return latitude, longitude
+
+    def validate_bbox(self, value):
+        min_lon, min_lat, max_lon, max_lat = self.parse_coordinates(value, 4)
+        self.check_point(min_lat, min_lon)
+        self.check_point(max_lat, max_lon)
+        if min_lat > max_lat:
+            raise serializers.ValidationError("The south edge must not be north of the north edge.")
+        return min_lat, min_lon, max_lat, max_lon # a min_lon east of max_lon crosses the antimeridian
+
+    def validate_facets(self, value):
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = sorted(set(names) - set(FACETS))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown facets: {', '.join(unknown)}. Choose from {', '.join(FACETS)}.")
+        return list(dict.fromkeys(names))
+
+    def validate(self, attrs):
+        if 'near' in attrs and 'radius_km' not in attrs:
+            raise serializers.ValidationError({"radius_km": "Required with near."})
+        if 'near' in attrs and 'bbox' in attrs:
+            raise serializers.ValidationError("Use either near or bbox, not both.")
+        if ('check_in' in attrs) != ('check_out' in attrs):
+            raise serializers.ValidationError("check_in and check_out must be given together.")
+        error = stay_error(attrs['check_in'], attrs['check_out']) if 'check_in' in attrs else None
+        if error:
+            raise serializers.ValidationError({"check_out": error})
+        return attrs
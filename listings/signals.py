@@ -0,0 +1,143 @@
+# listings/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .amenities import catalog, normalize_amenities
+from .analytics import BOOKING_FIELDS, apply_booking_change, booking_row, refresh_daily_stats
+from .caching import invalidate_listing
+from .geo import geohash_for
+from .models import Amenity, Booking, Listing, PricingRule, Review
+from .occupancy import sync_booking_nights
+from .ratings import apply_rating_change
+from .search import search_index
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_occupancy(sender, instance, **kwargs):
+    """
+    Keep the per-listing occupancy index in step with the booking's dates.
+    Deleted bookings take their nights with them through the cascade.
+    """
+    sync_booking_nights(instance)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_stay(sender, instance, **kwargs):
+    """
+    Note the stay before this save, so post_save can move it in the analytics rollup.
+    """
+    previous = None
+    if instance.pk is not None:
+        previous = Booking.objects.filter(pk=instance.pk).values_list(*BOOKING_FIELDS).first()
+    instance._previous_stay = previous
+
+
+@receiver(post_save, sender=Booking)
+def update_daily_stats(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_stay', None)
+    if instance.needs_review:
+        # A legacy overlapping booking (migration 0003): another booking may hold some
+        # of its old days, so those are recomputed from the occupancy index. Having
+        # saved, it now holds every night of its stay and needs no more review.
+        refresh_daily_stats(previous)
+        refresh_daily_stats(booking_row(instance))
+        Booking.objects.filter(pk=instance.pk).update(needs_review=False)
+        instance.needs_review = False
+    else:
+        apply_booking_change(previous, booking_row(instance))
+
+
+@receiver(post_delete, sender=Booking)
+def remove_daily_stats(sender, instance, **kwargs):
+    if instance.needs_review:
+        refresh_daily_stats(booking_row(instance))
+    else:
+        apply_booking_change(booking_row(instance), None)
+
+
+@receiver(pre_save, sender=Listing)
+def normalize_listing_amenities(sender, instance, **kwargs):
+    """
+    Resolve the free-text amenities against the catalog and store their bitmask.
+    """
+    instance.amenities, instance.amenity_mask = normalize_amenities(instance.amenities)
+
+
+@receiver(pre_save, sender=Listing)
+def update_listing_geohash(sender, instance, **kwargs):
+    instance.geohash = geohash_for(instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+def clear_amenity_catalog(sender, **kwargs):
+    catalog.changed()
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, **kwargs):
+    """
+    Re-index a saved listing in the in-process search index (Postgres keeps its
+    tsvector current with a trigger instead).
+    """
+    search_index.update(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    search_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_cached_listing(sender, instance, **kwargs):
+    invalidate_listing(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_owner_listings(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Listing responses embed the owner's username.
+    """
+    if not created and (update_fields is None or 'username' in update_fields):
+        for listing_id in instance.listings.values_list('id', flat=True):
+            invalidate_listing(listing_id)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """
+    Note what the review contributed before this save, so post_save can apply the difference.
+    """
+    previous = None
+    if instance.pk is not None:
+        previous = Review.objects.filter(pk=instance.pk).values_list('listing_id', 'rating').first()
+    instance._previous_rating = previous
+
+
+@receiver(post_save, sender=Review)
+def update_listing_ratings(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous and previous[0] != instance.listing_id:
+        # Moved to another listing: take it out of the old one entirely.
+        apply_rating_change(previous[0], removed=previous[1])
+        invalidate_listing(previous[0])
+        previous = None
+    apply_rating_change(instance.listing_id, added=instance.rating, removed=previous[1] if previous else None)
+    invalidate_listing(instance.listing_id)
+
+
+@receiver(post_delete, sender=Review)
+def remove_listing_rating(sender, instance, **kwargs):
+    apply_rating_change(instance.listing_id, removed=instance.rating)
+    invalidate_listing(instance.listing_id)
+
+
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def invalidate_listing_pricing(sender, instance, **kwargs):
+    """
+    Compiled rate calendars and quoted search results are keyed on the listing's version.
+    """
+    invalidate_listing(instance.listing_id)
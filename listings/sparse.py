@@ -0,0 +1,119 @@
+# listings/sparse.py
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def split_names(text):
+    return [name.strip() for name in (text or '').split(',') if name.strip()]
+
+
+def is_column(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False  # an annotation, such as the search rank
+    return True
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Renders only the fields named in the `fields` context set, when there is one,
+    and tells which model columns a field reads. `Meta.field_columns` maps the
+    fields that are not a plain (dotted) source, such as method fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        keep = self.context.get('fields')
+        if keep is not None:
+            fields = {name: field for name, field in fields.items() if name in keep}
+        return fields
+
+    @classmethod
+    def field_columns(cls, name, field):
+        columns = getattr(cls.Meta, 'field_columns', {})
+        if name in columns:
+            return tuple(columns[name])
+        source = field.source or name  # unbound fields have no source yet unless it was given
+        if source == '*':
+            return ()
+        return (source.replace('.', '__'),)
+
+
+class SparseFieldsViewMixin:
+    """
+    `?fields=id,title,city` renders only those fields, `?exclude=description` all
+    but those. The selection is pushed down to the queryset: only() the columns
+    the rendered fields read (or defer() the ones only the excluded fields read),
+    and select_related() just the relations they traverse.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def all_serializer_fields(self):
+        if not hasattr(self, '_all_serializer_fields'):
+            self._all_serializer_fields = self.get_serializer_class()().get_fields()
+        return self._all_serializer_fields
+
+    def sparse_fields(self):
+        """
+        The names of the fields to render, or None for all of them.
+        """
+        if self.request is None or getattr(self, 'swagger_fake_view', False):
+            return None  # schema generation (listings/schema.py) runs without a request
+        if self.action not in self.sparse_actions:
+            return None
+        params = self.request.query_params
+        names, excluded = split_names(params.get(FIELDS_PARAM)), split_names(params.get(EXCLUDE_PARAM))
+        if not names and not excluded:
+            return None
+        available = self.all_serializer_fields()
+        unknown = [name for name in names + excluded if name not in available]
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: f"Unknown field(s): {', '.join(unknown)}."})
+        return set(names or available) - set(excluded)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields = self.sparse_fields()
+        if fields is not None:
+            context['fields'] = fields
+        return context
+
+    def required_columns(self):
+        """
+        Columns needed whatever the fields: the pagination key of list pages.
+        """
+        if self.detail or self.paginator is None:
+            return []
+        return [field.lstrip('-') for field in self.paginator.get_ordering(self.request, None, self)]
+
+    def filter_queryset(self, queryset):
+        return self.sparse_queryset(super().filter_queryset(queryset))
+
+    def sparse_queryset(self, queryset):
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        columns = {}  # column -> read by a rendered field
+        for name, field in self.all_serializer_fields().items():
+            for column in serializer_class.field_columns(name, field):
+                columns[column] = columns.get(column, False) or name in fields
+        for column in ['pk'] + self.required_columns():
+            if column == 'pk' or is_column(queryset.model, column):
+                columns[column] = True
+        relations = {column.split('__')[0] for column, used in columns.items() if used and '__' in column}
+        for relation in relations:
+            columns[relation] = True  # the foreign key a join goes through cannot be deferred
+
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*sorted(relations))
+        if self.request.query_params.get(FIELDS_PARAM):
+            return queryset.only(*sorted(column for column, used in columns.items() if used))
+        # Relations that are no longer joined need no deferring of their columns.
+        unused = sorted(column for column, used in columns.items() if not used and '__' not in column)
+        return queryset.defer(*unused) if unused else queryset
@@ -1,8 +1,83 @@
 # listings/tasks.py
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import Booking # Assuming Booking model is what you need
+from django.core.mail import EmailMessage, get_connection
+from .models import Booking
+from .outbox import prune, relay
+
+
+def build_confirmation_message(booking, connection=None):
+    """
+    The confirmation email for a booking whose listing and guest are already loaded.
+    """
+    subject = f'Booking Confirmation for {booking.listing.title}'
+    message = (
+        f'Hi {booking.guest.username},\n\n'
+        f'Your booking for {booking.listing.title} has been confirmed.\n'
+        f'Check-in: {booking.check_in_date}\n'
+        f'Check-out: {booking.check_out_date}\n'
+        f'Total Price: ${booking.total_price}\n\n'
+        'Thank you for using alx_travel_app!'
+    )
+    return EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking.guest.email],
+        connection=connection,
+    )
+
+
+def retry_countdown(retries):
+    """
+    Exponential backoff for failed confirmations: 30s, 60s, 120s, ... capped at 15 minutes.
+    """
+    return min(30 * 2 ** retries, 900)
+
+
+@shared_task(bind=True, max_retries=5)
+def send_booking_confirmation_emails_task(self, booking_ids):
+    """
+    Sends the confirmation emails for a batch of bookings over a single
+    SMTP connection. Bookings are loaded in one query; a message that fails
+    does not stop the rest, and only the failed bookings are retried.
+    """
+    bookings = Booking.objects.select_related('listing', 'guest').in_bulk(booking_ids)
+    missing = [booking_id for booking_id in booking_ids if booking_id not in bookings]
+    if missing:
+        print(f"Bookings with IDs {missing} not found. Skipping their confirmations.")
+
+    failed = []
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+    try:
+        for booking_id in booking_ids:
+            if booking_id not in bookings:
+                continue
+            message = build_confirmation_message(bookings[booking_id], connection=connection)
+            try:
+                if connection.send_messages([message]):
+                    sent += 1
+                else:
+                    failed.append(booking_id)
+            except Exception as exc:
+                print(f"Failed to send booking confirmation for booking ID {booking_id}: {exc}")
+                failed.append(booking_id)
+    finally:
+        connection.close()
+
+    print(f"Sent {sent} booking confirmation(s) in one connection.")
+    if failed:
+        if self.request.retries >= self.max_retries:
+            print(f"Giving up on booking confirmations for booking IDs: {failed}")
+        else:
+            raise self.retry(args=(failed,), countdown=retry_countdown(self.request.retries))
+    return {'sent': sent, 'failed': failed, 'missing': missing}
+
 
 @shared_task
 def send_booking_confirmation_email_task(booking_id):
@@ -10,26 +85,20 @@ def send_booking_confirmation_email_task(booking_id):
     Sends an email confirmation for a new booking.
     This task will run in the background.
     """
-    try:
-        booking = Booking.objects.get(id=booking_id)
-        subject = f'Booking Confirmation for {booking.listing.title}'
-        message = (
-            f'Hi {booking.guest.username},\n\n'
-            f'Your booking for {booking.listing.title} has been confirmed.\n'
-            f'Check-in: {booking.check_in_date}\n'
-            f'Check-out: {booking.check_out_date}\n'
-            f'Total Price: ${booking.total_price}\n\n'
-            'Thank you for using alx_travel_app!'
-        )
-        recipient_list = [booking.guest.email]
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=recipient_list,
-            fail_silently=False,
-        )
-        print(f"Successfully sent booking confirmation for booking ID: {booking_id}")
-    except Booking.DoesNotExist:
-        print(f"Booking with ID {booking_id} not found. Task failed.")
+    return send_booking_confirmation_emails_task.delay([booking_id])
+
+
+@shared_task
+def relay_outbox_task():
+    """
+    Publishes pending outbox messages to the broker (scheduled by Celery beat).
+    """
+    return relay()
+
+
+@shared_task
+def prune_outbox_task():
+    """
+    Deletes outbox messages dispatched longer ago than OUTBOX_RETENTION_DAYS.
+    """
+    return prune()
@@ -0,0 +1,54 @@
+# listings/testing.py
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import connections
+from django.db.utils import load_backend
+
+from .instrumentation import count_queries
+
+
+@contextmanager
+def sqlite_replica(alias='replica'):
+    """
+    A second, empty SQLite database with every table, connected as `alias`: a read
+    replica that has not caught up with the primary yet. The connection is not
+    declared in DATABASES, so test cases may use it without listing it in `databases`.
+    """
+    directory = tempfile.TemporaryDirectory()
+    settings_dict = dict(
+        connections['default'].settings_dict, ENGINE='django.db.backends.sqlite3',
+        NAME=os.path.join(directory.name, 'replica.sqlite3'), OPTIONS={},
+    )
+    connections[alias] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+    try:
+        with connections[alias].schema_editor() as editor:
+            for model in apps.get_models():
+                editor.create_model(model)
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        directory.cleanup()
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for pinning the number of queries an endpoint may run.
+    """
+
+    def assertQueryBudget(self, budget, method, path, *args, **kwargs):
+        """
+        Request `path` with `self.client` and fail if it runs more than `budget` queries.
+        Returns the response so callers can make further assertions.
+        """
+        with count_queries(capture_sql=True) as counter:
+            response = getattr(self.client, method.lower())(path, *args, **kwargs)
+        if counter.count > budget:
+            self.fail(
+                f'{method.upper()} {path} ran {counter.count} queries, budget is {budget}:\n'
+                + '\n'.join(f'{i}. {sql}' for i, sql in enumerate(counter.queries, 1))
+            )
+        return response
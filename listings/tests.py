@@ -1,3 +1,1631 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import marshal
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .instrumentation import endpoint_stats
+from .metrics import metrics_registry
+from .amenities import CATALOG_VERSION_KEY, catalog, split_amenities
+from .analytics import rebuild_daily_stats
+from .benchmarks import CREATE_FROM, compare, run_suite, seed_fixture
+from .datagen import FIRST_NIGHT
+from .bulk import find_overlaps
+from .caching import COLLECTION_VERSION_KEY, bump_versions, recent_bump_key
+from .geo import covering_cells, encode, within_radius
+from .models import Amenity, Listing, Booking, BookedNight, DailyStat, OutboxMessage, PricingRule, Review
+from .outbox import enqueue, enqueue_booking_confirmation, relay
+from .pricing import quote_stay, quote_stays
+from .renderers import FastJSONRenderer, msgpack
+from .routers import PIN_COOKIE, ReplicaRouter, reading_from
+from .ratings import reconcile_ratings
+from . import schema
+from .search import search_index, tokenize
+from .tasks import send_booking_confirmation_emails_task
+from .testing import QueryBudgetMixin, sqlite_replica
+
+
+def make_listing(owner, **kwargs):
+    fields = {
+        'title': 'Cosy flat',
+        'description': 'A cosy flat in town.',
+        'address': '1 Main Street',
+        'city': 'Nairobi',
+        'country': 'Kenya',
+        'price_per_night': Decimal('50.00'),
+        'max_guests': 4,
+    }
+    fields.update(kwargs)
+    return Listing.objects.create(owner=owner, **fields)
+
+
+def make_booking(listing, guest, check_in, check_out, **kwargs):
+    return Booking.objects.create(
+        listing=listing, guest=guest,
+        check_in_date=check_in, check_out_date=check_out,
+        total_price=kwargs.pop('total_price', Decimal('100.00')), **kwargs
+    )
+
+
+class AvailabilitySearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host', password='pass')
+        self.guest = User.objects.create_user('guest', password='pass')
+        self.free = make_listing(self.host, title='Free')
+        self.taken = make_listing(self.host, title='Taken')
+        self.small = make_listing(self.host, title='Small', max_guests=2)
+        self.elsewhere = make_listing(self.host, title='Mombasa', city='Mombasa')
+        self.booking = make_booking(self.taken, self.guest, date(2025, 7, 10), date(2025, 7, 14))
+
+    def search(self, **params):
+        response = self.client.get('/api/listings/available/', params)
+        self.assertEqual(response.status_code, 200)
+        return {row['title'] for row in response.data['results']}
+
+    def test_booking_maintains_occupied_nights(self):
+        nights = BookedNight.objects.filter(booking=self.booking).values_list('night', flat=True)
+        self.assertEqual(sorted(nights), [date(2025, 7, d) for d in (10, 11, 12, 13)])
+
+        self.booking.check_out_date = date(2025, 7, 12)
+        self.booking.save()
+        self.assertEqual(BookedNight.objects.filter(booking=self.booking).count(), 2)
+
+        self.booking.delete()
+        self.assertFalse(BookedNight.objects.exists())
+
+    def test_overlapping_range_excludes_booked_listing(self):
+        titles = self.search(city='Nairobi', check_in='2025-07-13', check_out='2025-07-15', guests=3)
+        self.assertEqual(titles, {'Free'})
+
+    def test_adjacent_ranges_are_available(self):
+        self.assertIn('Taken', self.search(check_in='2025-07-14', check_out='2025-07-16'))
+        self.assertIn('Taken', self.search(check_in='2025-07-08', check_out='2025-07-10'))
+
+    def test_rejects_inverted_range(self):
+        response = self.client.get('/api/listings/available/', {'check_in': '2025-07-14', 'check_out': '2025-07-14'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingOverlapTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host', password='pass')
+        self.guest = User.objects.create_user('guest', password='pass')
+        self.listing = make_listing(self.host)
+        self.client.force_authenticate(self.guest)
+
+    def book(self, check_in, check_out):
+        return self.client.post('/api/bookings/', {
+            'listing': self.listing.id, 'check_in_date': check_in,
+            'check_out_date': check_out, 'total_price': '100.00',
+        })
+
+    def test_partially_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book('2025-08-01', '2025-08-05').status_code, 201)
+        self.assertEqual(self.book('2025-08-04', '2025-08-06').status_code, 400)
+        self.assertEqual(self.book('2025-07-30', '2025-08-10').status_code, 400)
+        self.assertEqual(self.book('2025-08-05', '2025-08-07').status_code, 201)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_constraint_rejects_overlap_that_skips_validation(self):
+        make_booking(self.listing, self.guest, date(2025, 8, 1), date(2025, 8, 5))
+        with self.assertRaises(IntegrityError):
+            make_booking(self.listing, self.guest, date(2025, 8, 3), date(2025, 8, 4))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_moving_a_booking_onto_another_is_rejected(self):
+        make_booking(self.listing, self.guest, date(2025, 8, 1), date(2025, 8, 5))
+        other = make_booking(self.listing, self.guest, date(2025, 8, 10), date(2025, 8, 12))
+        response = self.client.patch(f'/api/bookings/{other.id}/', {'check_in_date': '2025-08-04'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/bookings/{other.id}/', {'check_in_date': '2025-08-09'})
+        self.assertEqual(response.status_code, 200)
+
+
+class BookingContentionTests(TransactionTestCase):
+    """
+    Hammers a single listing from many threads and checks that no night is ever sold twice.
+    """
+    threads = 16
+    attempts_per_thread = 6
+
+    def test_concurrent_bookings_never_overlap(self):
+        host = User.objects.create_user('host', password='pass')
+        guests = [User.objects.create_user(f'guest{i}', password='pass') for i in range(self.threads)]
+        listing = make_listing(host)
+        start = date(2025, 9, 1)
+        statuses = []
+        barrier = threading.Barrier(self.threads)
+
+        def hammer(index):
+            # Failures come back as 500s instead of being raised: the test client collects
+            # exceptions through the global got_request_exception signal, so with clients in
+            # several threads one of them could raise another thread's error after its own
+            # booking had committed.
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(guests[index])
+            barrier.wait()
+            try:
+                for attempt in range(self.attempts_per_thread):
+                    # Ranges of 1-3 nights at staggered offsets, so threads collide constantly.
+                    check_in = start + timedelta(days=(index + attempt * 5) % 20)
+                    check_out = check_in + timedelta(days=1 + (index + attempt) % 3)
+                    payload = {
+                        'listing': listing.id, 'check_in_date': check_in.isoformat(),
+                        'check_out_date': check_out.isoformat(), 'total_price': '100.00',
+                    }
+                    for _ in range(50):
+                        status_code = client.post('/api/bookings/', payload).status_code
+                        if status_code != 500:
+                            statuses.append(status_code)
+                            break
+                        # SQLite serialises writers; retry like a client would on a 5xx.
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=hammer, args=(i,)) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertTrue(set(statuses) <= {201, 400, 409})
+        # A retried request may have committed before its response failed, so the
+        # database can hold more bookings than the 201s counted here.
+        self.assertGreater(statuses.count(201), 0)
+        self.assertGreaterEqual(Booking.objects.count(), statuses.count(201))
+
+        nights = list(BookedNight.objects.values_list('night', flat=True))
+        self.assertEqual(len(nights), len(set(nights)))
+        expected = sum((b.check_out_date - b.check_in_date).days for b in Booking.objects.all())
+        self.assertEqual(len(nights), expected)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.hosts = [User.objects.create_user(f'host{i}') for i in range(3)]
+
+    def add_rows(self, count):
+        for i in range(count):
+            listing = make_listing(self.hosts[i % 3], title=f'Listing {Listing.objects.count()}')
+            make_booking(listing, self.hosts[(i + 1) % 3], date(2025, 1, 1), date(2025, 1, 3))
+
+    def test_list_endpoints_run_a_constant_number_of_queries(self):
+        self.client.force_authenticate(self.staff)
+        for rows in (2, 12):
+            self.add_rows(rows)
+            self.assertQueryBudget(1, 'get', '/api/listings/')
+            self.assertQueryBudget(1, 'get', '/api/bookings/')
+
+    def test_detail_endpoints_run_a_single_query(self):
+        self.add_rows(1)
+        self.client.force_authenticate(self.staff)
+        self.assertQueryBudget(1, 'get', f'/api/listings/{Listing.objects.get().id}/')
+        self.assertQueryBudget(1, 'get', f'/api/bookings/{Booking.objects.get().id}/')
+
+    def test_middleware_records_endpoint_totals(self):
+        self.add_rows(2)
+        endpoint_stats.reset()
+        self.client.get('/api/listings/')
+        self.client.get('/api/listings/')
+        totals = endpoint_stats.snapshot()['GET listing-list']
+        self.assertEqual(totals['requests'], 2)
+        self.assertEqual(totals['max_queries'], 1)
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_header_in_debug(self):
+        cache.clear()  # a cached page would be served without a query
+        response = self.client.get('/api/listings/')
+        self.assertRegex(response['Server-Timing'], r'(^|, )db;dur=[0-9.]+;desc="1 queries"$')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        for i in range(7):
+            make_listing(self.host, title=f'Listing {i}')
+        # Force ties on created_at so the id part of the key has to break them.
+        first_ids = Listing.objects.order_by('id').values_list('id', flat=True)[:4]
+        Listing.objects.filter(id__in=list(first_ids)).update(created_at=Listing.objects.earliest('id').created_at)
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_pages_cover_every_row_once_in_key_order(self):
+        ids, pages = self.walk('/api/listings/?page_size=3')
+        expected = list(Listing.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_the_preceding_page(self):
+        _, pages = self.walk('/api/listings/?page_size=3')
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual(response.data['results'], pages[1]['results'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_garbage_cursor_is_a_404(self):
+        self.assertEqual(self.client.get('/api/listings/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_crafted_cursor_keys_are_a_404(self):
+        self.client.force_authenticate(self.host)
+        for key in (['garbage', 1], [None, None], [{'a': 1}, 1], ['2024-01-01T00:00:00+00:00', 'x']):
+            token = base64.urlsafe_b64encode(json.dumps({'k': key, 'r': 0}).encode()).decode()
+            for path in ('/api/listings/', '/api/bookings/', '/api/async/listings/'):
+                with self.subTest(key=key, path=path):
+                    self.assertEqual(self.client.get(path, {'cursor': token}).status_code, 404)
+
+
+class ListingSearchTests(TestCase):
+    def setUp(self):
+        search_index.reset()
+        catalog.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.villa = make_listing(self.host, title='Pool villa', description='Quiet garden.', amenities='wifi, pool')
+        self.flat = make_listing(self.host, title='City flat', description='Walk to the pool and the beach.',
+                                 amenities='wifi, kitchen')
+        self.tent = make_listing(self.host, title='Safari tent', description='Stars at night.', amenities='')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/listings/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.data['results']]
+
+    def test_tokenize_normalises_case_plurals_and_stopwords(self):
+        self.assertEqual(tokenize('The Pools and a Kitchen'), ['pool', 'kitchen'])
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('pools'), ['Pool villa', 'City flat'])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('pool kitchen'), ['City flat'])
+        self.assertEqual(self.search('pool igloo'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.search('stars'), ['Safari tent'])
+        self.tent.description = 'Lions at night.'
+        self.tent.save()
+        self.assertEqual(self.search('stars'), [])
+        self.assertEqual(self.search('lions'), ['Safari tent'])
+        self.tent.delete()
+        self.assertEqual(self.search('lions'), [])
+
+    def test_results_paginate_by_relevance(self):
+        response = self.client.get('/api/listings/', {'q': 'pool', 'page_size': 1})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Pool villa'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['title'] for row in response.data['results']], ['City flat'])
+        self.assertIsNone(response.data['next'])
+
+
+class AmenityFilterTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.villa = make_listing(self.host, title='Villa', amenities='WiFi, Pool, air conditioning')
+        self.flat = make_listing(self.host, title='Flat', amenities='wi-fi; kitchen')
+        self.tent = make_listing(self.host, title='Tent')
+
+    def test_unknown_amenities_only_reload_a_stale_catalog(self):
+        catalog.entries()
+        with self.assertNumQueries(0):
+            self.assertIsNone(catalog.mask_for(['wifi', 'sauna']))
+            self.assertIsNone(catalog.mask_for(['sauna']))
+        # Added by another process: no signal here, only the shared version moves.
+        Amenity.objects.bulk_create([Amenity(key='sauna', name='Sauna', bit=40)])
+        bump_versions([CATALOG_VERSION_KEY])
+        with self.assertNumQueries(1):
+            self.assertEqual(catalog.mask_for(['sauna']), 1 << 40)
+
+    def titles(self, amenities):
+        response = self.client.get('/api/listings/', {'amenities': amenities})
+        self.assertEqual(response.status_code, 200)
+        return {row['title'] for row in response.data['results']}
+
+    def test_free_text_is_normalized_into_the_catalog(self):
+        self.assertEqual(list(Amenity.objects.values_list('key', flat=True)), ['wifi', 'pool', 'ac', 'kitchen'])
+        self.flat.refresh_from_db()
+        self.assertEqual(self.flat.amenities, 'WiFi, kitchen')
+        self.assertEqual(self.flat.amenity_mask, 0b1001)
+
+    def test_serializer_still_emits_amenity_names(self):
+        response = self.client.get(f'/api/listings/{self.villa.id}/')
+        self.assertEqual(response.data['amenities'], 'WiFi, Pool, air conditioning')
+
+    def test_filter_requires_every_amenity(self):
+        self.assertEqual(self.titles('wifi'), {'Villa', 'Flat'})
+        self.assertEqual(self.titles('wifi,pool'), {'Villa'})
+        self.assertEqual(self.titles('AC, kitchen'), set())
+        self.assertEqual(self.titles('sauna'), set())
+
+    def test_editing_amenities_updates_the_mask(self):
+        self.tent.amenities = 'pool'
+        self.tent.save()
+        self.assertEqual(self.titles('pool'), {'Villa', 'Tent'})
+
+    def post_listing(self, user, amenities):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/listings/', {
+            'title': 'New', 'description': 'New.', 'address': '1 Main Street', 'city': 'Nairobi',
+            'country': 'Kenya', 'price_per_night': '40.00', 'max_guests': 2, 'amenities': amenities,
+        })
+
+    def test_only_staff_add_amenities_outside_the_vocabulary(self):
+        self.assertEqual(self.post_listing(self.host, 'WiFi, Gym').status_code, 201)
+        response = self.post_listing(self.host, 'wifi, sauna')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sauna', response.data['amenities'][0])
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.post_listing(staff, 'Sauna').status_code, 201)
+        self.assertTrue(Amenity.objects.filter(key='sauna').exists())
+
+    def test_malformed_amenities_are_rejected(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.post_listing(staff, 'wifi, !!!').status_code, 400)
+        self.assertEqual(self.post_listing(staff, 'x' * 51).status_code, 400)
+        self.assertFalse(Amenity.objects.filter(key='').exists())
+
+    def test_full_catalog_is_a_validation_error(self):
+        Amenity.objects.bulk_create(Amenity(key=f'extra{bit}', name=f'Extra {bit}', bit=bit) for bit in range(4, 63))
+        catalog.clear()
+        staff = User.objects.create_user('staff', is_staff=True)
+        response = self.post_listing(staff, 'wifi, sauna')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('full', response.data['amenities'][0])
+        self.assertEqual(self.post_listing(staff, 'wifi, extra 5').status_code, 201)
+
+
+class ListingResponseCacheTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.listing = make_listing(self.host, title='Villa')
+        self.other = make_listing(self.host, title='Flat')
+
+    def test_repeated_reads_are_served_from_cache(self):
+        first = self.assertQueryBudget(1, 'get', '/api/listings/')
+        second = self.assertQueryBudget(0, 'get', '/api/listings/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertQueryBudget(1, 'get', '/api/listings/', {'page_size': 1})
+        self.assertQueryBudget(1, 'get', f'/api/listings/{self.listing.id}/')
+        self.assertQueryBudget(0, 'get', f'/api/listings/{self.listing.id}/')
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def test_cached_links_follow_the_host_and_scheme(self):
+        for host, secure in [('a.example', False), ('b.example', False), ('b.example', True)]:
+            response = self.client.get('/api/listings/', {'page_size': 1}, HTTP_HOST=host, secure=secure)
+            scheme = 'https' if secure else 'http'
+            self.assertTrue(response.data['next'].startswith(f'{scheme}://{host}/api/listings/'))
+
+    def test_conditional_get_returns_not_modified(self):
+        etag = self.client.get(f'/api/listings/{self.listing.id}/')['ETag']
+        response = self.assertQueryBudget(0, 'get', f'/api/listings/{self.listing.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_saving_a_listing_invalidates_its_detail_and_the_collection_only(self):
+        list_etag = self.client.get('/api/listings/')['ETag']
+        detail_etag = self.client.get(f'/api/listings/{self.listing.id}/')['ETag']
+        other_etag = self.client.get(f'/api/listings/{self.other.id}/')['ETag']
+
+        self.listing.title = 'Renamed villa'
+        self.listing.save()
+
+        response = self.client.get(f'/api/listings/{self.listing.id}/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Renamed villa')
+        self.assertNotEqual(self.client.get('/api/listings/')['ETag'], list_etag)
+        response = self.client.get(f'/api/listings/{self.other.id}/', HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_deleting_a_listing_drops_it_from_cached_lists(self):
+        self.client.get('/api/listings/')
+        self.other.delete()
+        titles = [row['title'] for row in self.client.get('/api/listings/').data['results']]
+        self.assertEqual(titles, ['Villa'])
+
+
+class BookingConfirmationBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        host = User.objects.create_user('host')
+        listing = make_listing(host, title='Villa')
+        self.bookings = [
+            make_booking(listing, User.objects.create_user(f'guest{i}', email=f'guest{i}@example.com'),
+                         date(2025, 5, 1 + 2 * i), date(2025, 5, 2 + 2 * i))
+            for i in range(4)
+        ]
+        self.ids = [booking.id for booking in self.bookings]
+
+    def test_batch_is_sent_over_one_connection_with_one_query(self):
+        with mock.patch('listings.tasks.get_connection', wraps=mail.get_connection) as get_connection:
+            with self.assertNumQueries(1):
+                result = send_booking_confirmation_emails_task.apply(args=(self.ids + [999999],)).get()
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(result, {'sent': 4, 'failed': [], 'missing': [999999]})
+        self.assertEqual([message.to for message in mail.outbox], [[f'guest{i}@example.com'] for i in range(4)])
+        self.assertEqual(mail.outbox[0].subject, 'Booking Confirmation for Villa')
+
+    def test_only_failed_messages_are_retried(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        original = EmailBackend.send_messages
+        attempts = []
+
+        def flaky(backend, messages):
+            attempts.append(messages[0].to[0])
+            if messages[0].to[0] == 'guest2@example.com' and attempts.count('guest2@example.com') == 1:
+                raise ConnectionError('SMTP hiccup')
+            return original(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', flaky):
+            send_booking_confirmation_emails_task.apply(args=(self.ids,))
+        self.assertEqual(attempts.count('guest2@example.com'), 2)
+        self.assertEqual(attempts.count('guest1@example.com'), 1)
+        self.assertEqual(len(mail.outbox), 4)
+
+
+@mock.patch('listings.outbox.publish')
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.listing = make_listing(self.host)
+
+    def test_booking_request_only_writes_the_outbox(self, publish):
+        self.client.force_authenticate(self.guest)
+        response = self.client.post('/api/bookings/', {
+            'listing': self.listing.id, 'check_in_date': '2025-08-01',
+            'check_out_date': '2025-08-03', 'total_price': '100.00',
+        })
+        self.assertEqual(response.status_code, 201)
+        publish.assert_not_called()
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.task, message.args), ('listings.tasks.send_booking_confirmation_email_task', [response.data['id']]))
+        self.assertIsNone(message.dispatched_at)
+
+    def test_rolled_back_booking_leaves_no_message(self, publish):
+        make_booking(self.listing, self.guest, date(2025, 8, 1), date(2025, 8, 3))
+        self.client.force_authenticate(self.guest)
+        with mock.patch('listings.views.enqueue_booking_confirmation', side_effect=IntegrityError):
+            response = self.client.post('/api/bookings/', {
+                'listing': self.listing.id, 'check_in_date': '2025-08-05',
+                'check_out_date': '2025-08-06', 'total_price': '100.00',
+            })
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_duplicates_are_dropped(self, publish):
+        booking = make_booking(self.listing, self.guest, date(2025, 8, 1), date(2025, 8, 3))
+        enqueue_booking_confirmation(booking)
+        enqueue_booking_confirmation(booking)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    @override_settings(BOOKING_CONFIRMATION_BATCH_SIZE=2)
+    def test_relay_batches_confirmations_in_order_and_marks_dispatched(self, publish):
+        enqueue('listings.tasks.send_booking_confirmation_email_task', [1])
+        enqueue('listings.tasks.send_booking_confirmation_email_task', [2])
+        enqueue('listings.tasks.send_booking_confirmation_email_task', [3])
+        enqueue('listings.tasks.example_task', [7], {'flag': True})
+        enqueue('listings.tasks.send_booking_confirmation_email_task', [4])
+
+        self.assertEqual(relay(batch_size=3), 5)
+        self.assertEqual([call.args for call in publish.call_args_list], [
+            ('listings.tasks.send_booking_confirmation_emails_task', [[1, 2]], {}),
+            ('listings.tasks.send_booking_confirmation_emails_task', [[3]], {}),
+            ('listings.tasks.example_task', [7], {'flag': True}),
+            ('listings.tasks.send_booking_confirmation_emails_task', [[4]], {}),
+        ])
+        self.assertFalse(OutboxMessage.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertEqual(relay(), 0)
+
+    def test_broker_failure_keeps_messages_pending(self, publish):
+        enqueue('listings.tasks.send_booking_confirmation_email_task', [1])
+        publish.side_effect = ConnectionError('broker down')
+        with self.assertRaises(ConnectionError):
+            relay()
+        self.assertTrue(OutboxMessage.objects.filter(dispatched_at__isnull=True).exists())
+        publish.side_effect = None
+        self.assertEqual(relay(), 1)
+
+
+@override_settings(BULK_IMPORT_CHUNK_SIZE=2)
+class BulkImportTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        catalog.clear()
+        search_index.reset()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.client.force_authenticate(self.host)
+
+    def listing_row(self, title, **kwargs):
+        row = {
+            'title': title, 'description': 'Bulk imported.', 'address': '1 Main Street', 'city': 'Nairobi',
+            'country': 'Kenya', 'price_per_night': '40.00', 'max_guests': 2, 'amenities': 'wifi',
+        }
+        row.update(kwargs)
+        return row
+
+    def booking_row(self, listing, check_in, check_out):
+        return {'listing': listing.id, 'check_in_date': check_in, 'check_out_date': check_out, 'total_price': '80.00'}
+
+    def test_json_array_of_listings(self):
+        rows = [self.listing_row(f'Flat {i}') for i in range(5)]
+        response = self.client.post('/api/listings/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        listings = Listing.objects.filter(id__in=response.data['ids'])
+        self.assertEqual({listing.owner_id for listing in listings}, {self.host.id})
+        self.assertEqual({listing.amenity_mask for listing in listings}, {1})
+        titles = [row['title'] for row in self.client.get('/api/listings/', {'q': 'flat'}).data['results']]
+        self.assertEqual(len(titles), 5)
+
+    def test_ndjson_stream_of_listings(self):
+        body = '\n'.join(json.dumps(self.listing_row(f'Flat {i}')) for i in range(3)) + '\n'
+        response = self.client.post('/api/listings/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Listing.objects.count(), 3)
+
+    def test_any_invalid_row_rolls_back_and_reports_every_error(self):
+        rows = [self.listing_row('Good'), self.listing_row('Bad', max_guests='many'), self.listing_row('Good too'),
+                self.listing_row('', city='')]
+        response = self.client.post('/api/listings/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertIn('max_guests', response.data['errors'][0]['errors'])
+        self.assertFalse(Listing.objects.exists())
+
+    def test_constraint_failures_are_a_400_for_listings_and_a_409_for_bookings(self):
+        error = IntegrityError('CHECK constraint failed: listing_price_positive')
+        with mock.patch('listings.views.import_listings', side_effect=error):
+            response = self.client.post('/api/listings/bulk/', [self.listing_row('Flat')], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('listing_price_positive', response.data['errors'][0]['errors']['non_field_errors'][0])
+        with mock.patch('listings.views.import_bookings', side_effect=IntegrityError):
+            response = self.client.post('/api/bookings/bulk/', [], format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_bookings_are_checked_for_overlap_without_per_row_queries(self):
+        villa = make_listing(self.host, title='Villa')
+        flat = make_listing(self.host, title='Flat')
+        make_booking(villa, self.host, date(2025, 6, 10), date(2025, 6, 12))
+        rows = [
+            self.booking_row(villa, '2025-06-01', '2025-06-05'),
+            self.booking_row(flat, '2025-06-01', '2025-06-05'),
+            self.booking_row(villa, '2025-06-05', '2025-06-10'),
+            self.booking_row(flat, '2025-06-05', '2025-06-07'),
+        ]
+        # Per chunk, however many rows: the pricing rules of listings not priced yet, and the analytics rollup.
+        self.assertQueryBudget(15, 'post', '/api/bookings/bulk/', rows, format='json')
+        self.assertEqual(Booking.objects.count(), 5)
+        self.assertEqual(BookedNight.objects.count(), 2 + 4 + 4 + 5 + 2)
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+    def test_overlapping_booking_rows_are_rejected(self):
+        villa = make_listing(self.host, title='Villa')
+        make_booking(villa, self.host, date(2025, 6, 10), date(2025, 6, 12))
+        rows = [
+            self.booking_row(villa, '2025-06-01', '2025-06-05'),
+            self.booking_row(villa, '2025-06-04', '2025-06-06'),
+            self.booking_row(villa, '2025-06-11', '2025-06-13'),
+        ]
+        response = self.client.post('/api/bookings/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_find_overlaps_sweeps_sorted_ranges(self):
+        d = lambda day: date(2025, 1, day)
+        incoming = [(0, d(5), d(7)), (1, d(1), d(3)), (2, d(2), d(4)), (3, d(9), d(10)), (4, d(3), d(5))]
+        self.assertEqual(find_overlaps(incoming, existing=[(d(6), d(9))]), {0, 2})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.listing = make_listing(self.host)
+
+    def add_bookings(self, count):
+        start = date(2020, 1, 1)
+        Booking.objects.bulk_create(
+            Booking(listing=self.listing, guest=self.guest, check_in_date=start + timedelta(days=i),
+                    check_out_date=start + timedelta(days=i + 1), total_price=Decimal('50.00'))
+            for i in range(count)
+        )
+
+    def consume_peak(self, path):
+        tracemalloc.start()
+        try:
+            response = self.client.get(path)
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            return size, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_csv_export_is_scoped_to_the_guest(self):
+        make_booking(self.listing, self.guest, date(2025, 3, 1), date(2025, 3, 4))
+        make_booking(self.listing, self.host, date(2025, 3, 5), date(2025, 3, 6))
+        self.client.force_authenticate(self.guest)
+        response = self.client.get('/api/bookings/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="bookings.csv"', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'listing', 'listing_title'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('2025-03-01,2025-03-04,100.00', lines[1])
+
+    def test_ndjson_export_of_hosted_bookings(self):
+        make_booking(self.listing, self.guest, date(2025, 3, 1), date(2025, 3, 4))
+        self.client.force_authenticate(self.host)
+        response = self.client.get('/api/bookings/export.ndjson', {'scope': 'hosted'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['guest_username'], 'guest')
+        self.assertEqual(rows[0]['check_in_date'], '2025-03-01')
+
+    def test_listing_export_requires_authentication(self):
+        self.assertIn(self.client.get('/api/listings/export.csv').status_code, (401, 403))
+        self.client.force_authenticate(self.guest)
+        lines = b''.join(self.client.get('/api/listings/export.csv').streaming_content).splitlines()
+        self.assertEqual(len(lines), 1)  # header only: the guest owns no listings
+
+    @override_settings(EXPORT_CHUNK_SIZE=100)
+    def test_memory_stays_flat_as_the_export_grows(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_authenticate(staff)
+        self.add_bookings(500)
+        small_size, small_peak = self.consume_peak('/api/bookings/export.csv')
+        self.add_bookings(5000)
+        large_size, large_peak = self.consume_peak('/api/bookings/export.csv')
+        self.assertGreater(large_size, 10 * small_size)
+        self.assertLess(large_peak, 2 * small_peak)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Villa')
+        self.flat = make_listing(self.host, title='Flat')
+
+    def review(self, listing, rating):
+        return Review.objects.create(listing=listing, guest=self.guest, rating=rating)
+
+    def test_aggregates_follow_review_changes(self):
+        first = self.review(self.villa, 5)
+        self.review(self.villa, 2)
+        self.villa.refresh_from_db()
+        self.assertEqual((self.villa.rating_count, self.villa.rating_sum, self.villa.rating_avg), (2, 7, 3.5))
+
+        first.rating = 4
+        first.save()
+        self.villa.refresh_from_db()
+        self.assertEqual((self.villa.rating_4, self.villa.rating_5, self.villa.rating_avg), (1, 0, 3.0))
+
+        first.listing = self.flat
+        first.save()
+        self.villa.refresh_from_db()
+        self.flat.refresh_from_db()
+        self.assertEqual((self.villa.rating_count, self.villa.rating_avg), (1, 2.0))
+        self.assertEqual((self.flat.rating_count, self.flat.rating_4), (1, 1))
+
+        first.delete()
+        self.flat.refresh_from_db()
+        self.assertEqual((self.flat.rating_count, self.flat.rating_sum, self.flat.rating_avg), (0, 0, 0.0))
+
+    def test_reconcile_repairs_drift(self):
+        self.review(self.villa, 3)
+        Listing.objects.filter(pk=self.flat.pk).update(rating_count=9, rating_5=9)
+        self.assertEqual(reconcile_ratings(dry_run=True), 1)
+        self.assertEqual(reconcile_ratings(batch_size=1), 1)
+        self.flat.refresh_from_db()
+        self.assertEqual((self.flat.rating_count, self.flat.rating_5), (0, 0))
+        self.assertEqual(reconcile_ratings(), 0)
+
+    def test_ordering_and_min_rating(self):
+        self.review(self.villa, 3)
+        self.review(self.flat, 5)
+        make_listing(self.host, title='Unrated')
+        response = self.client.get('/api/listings/', {'ordering': '-rating', 'page_size': 2})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Flat', 'Villa'])
+        self.assertEqual(response.data['results'][0]['rating_histogram']['5'], 1)
+        rest = self.client.get(response.data['next'])
+        self.assertEqual([row['title'] for row in rest.data['results']], ['Unrated'])
+
+        response = self.client.get('/api/listings/', {'min_rating': 4})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Flat'])
+        self.assertEqual(self.client.get('/api/listings/', {'min_rating': 'high'}).status_code, 400)
+
+    def test_new_review_invalidates_cached_listing(self):
+        self.assertEqual(self.client.get(f'/api/listings/{self.villa.pk}/').data['rating_count'], 0)
+        self.review(self.villa, 4)
+        self.assertEqual(self.client.get(f'/api/listings/{self.villa.pk}/').data['rating_count'], 1)
+
+
+class GeoSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        make_listing(self.host, title='CBD', latitude=-1.2864, longitude=36.8172)
+        make_listing(self.host, title='Westlands', latitude=-1.2676, longitude=36.8108)
+        make_listing(self.host, title='Karen', latitude=-1.3197, longitude=36.7076)
+        make_listing(self.host, title='Mombasa', latitude=-4.0435, longitude=39.6682)
+        make_listing(self.host, title='Suva', latitude=-18.1416, longitude=178.4419)
+        make_listing(self.host, title='Nowhere')
+
+    def titles(self, **params):
+        response = self.client.get('/api/listings/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(row['title'] for row in response.data['results'])
+
+    def test_geohash_is_stored_on_save(self):
+        self.assertEqual(encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        listing = Listing.objects.get(title='CBD')
+        self.assertEqual(listing.geohash, encode(-1.2864, 36.8172))
+        self.assertEqual(Listing.objects.get(title='Nowhere').geohash, '')
+
+    def test_radius_search_refines_the_cell_candidates(self):
+        self.assertEqual(self.titles(near='-1.2864,36.8172', radius_km=5), ['CBD', 'Westlands'])
+        self.assertEqual(self.titles(near='-1.2864,36.8172', radius_km=15), ['CBD', 'Karen', 'Westlands'])
+        # Mombasa is ~440 km from the CBD.
+        self.assertNotIn('Mombasa', self.titles(near='-1.2864,36.8172', radius_km=435))
+        self.assertIn('Mombasa', self.titles(near='-1.2864,36.8172', radius_km=445))
+
+    def test_radius_refinement_runs_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            titles = sorted(within_radius(Listing.objects.all(), -1.2864, 36.8172, 15).values_list('title', flat=True))
+        self.assertEqual(titles, ['CBD', 'Karen', 'Westlands'])
+        self.assertEqual(len(queries), 1)  # no candidate ids sent back in an IN list
+        response = self.client.get('/api/async/listings/', {'near': '-1.2864,36.8172', 'radius_km': 15})
+        self.assertEqual(sorted(row['title'] for row in response.json()['results']), titles)
+
+    def test_bounding_box_search(self):
+        self.assertEqual(self.titles(bbox='36.7,-1.33,36.82,-1.28'), ['CBD', 'Karen'])
+        self.assertEqual(self.titles(bbox='178,-19,-179,-17'), ['Suva'])  # across the antimeridian
+        self.assertLessEqual(len(covering_cells(-19, 178, -17, -179)), 32)
+
+    def test_invalid_location_parameters(self):
+        for params in ({'near': '-1.28'}, {'near': '95,10', 'radius_km': 1}, {'near': '1,1'},
+                       {'bbox': '1,2,3'}, {'bbox': '0,10,1,5'}):
+            self.assertEqual(self.client.get('/api/listings/', params).status_code, 400, params)
+
+
+class FacetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        search_index.reset()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        make_listing(self.host, title='Pool villa', price_per_night=Decimal('250.00'), max_guests=8,
+                     number_of_beds=4, amenities='wifi, pool')
+        make_listing(self.host, title='Flat', price_per_night=Decimal('45.00'), max_guests=2, amenities='wifi')
+        make_listing(self.host, title='Beach house', city='Mombasa', price_per_night=Decimal('120.00'),
+                     max_guests=4, number_of_beds=2, amenities='pool, kitchen')
+
+    def counts(self, facet):
+        return {entry['value']: entry['count'] for entry in facet}
+
+    def test_bands_and_amenities_come_from_one_aggregate_query(self):
+        # The page, one aggregate for the bands and amenity bits, and one GROUP BY each for city and country.
+        response = self.assertQueryBudget(4, 'get', '/api/listings/', {'facets': 'city,country,price,guests,beds,amenities'})
+        facets = response.data['facets']
+        self.assertEqual(facets['city'], [{'value': 'Nairobi', 'count': 2}, {'value': 'Mombasa', 'count': 1}])
+        self.assertEqual(self.counts(facets['country']), {'Kenya': 3})
+        self.assertEqual(self.counts(facets['price']), {'0-50': 1, '50-100': 0, '100-200': 1, '200-500': 1, '500+': 0})
+        self.assertEqual(self.counts(facets['guests']), {'1-2': 1, '3-4': 1, '5-6': 0, '7+': 1})
+        self.assertEqual(self.counts(facets['beds']), {'1': 1, '2': 1, '3-4': 1, '5+': 0})
+        self.assertEqual(self.counts(facets['amenities']), {'wifi': 2, 'pool': 2, 'kitchen': 1})
+
+    @mock.patch('listings.facets.FACET_VALUE_LIMIT', 2)
+    def test_grouped_facets_are_capped(self):
+        make_listing(self.host, title='Lakeside', city='Kisumu')
+        make_listing(self.host, title='Lake view', city='Kisumu')
+        facets = self.client.get('/api/listings/', {'facets': 'city,price'}).data['facets']
+        self.assertEqual(facets['city'], [{'value': 'Kisumu', 'count': 2}, {'value': 'Nairobi', 'count': 2}])
+        self.assertEqual(sum(band['count'] for band in facets['price']), 5)
+
+    def test_facets_follow_filters_and_are_shared_across_pages(self):
+        response = self.client.get('/api/listings/', {'facets': 'city', 'q': 'pool', 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(self.counts(response.data['facets']['city']), {'Nairobi': 1, 'Mombasa': 1})
+        with mock.patch('listings.facets.compute_facets') as compute:
+            second = self.client.get(response.data['next'])
+        compute.assert_not_called()
+        self.assertEqual(second.data['facets'], response.data['facets'])
+
+    def test_facets_are_keyed_on_the_filters_only(self):
+        first = self.client.get('/api/listings/', {'facets': 'city', 'amenities': 'wifi'}).data['facets']
+        with mock.patch('listings.facets.compute_facets') as compute:
+            for params in ({'fields': 'id,title'}, {'exclude': 'description'}, {'ordering': '-rating'},
+                           {'check_in': date.today() + timedelta(days=30), 'check_out': date.today() + timedelta(days=32)}):
+                response = self.client.get('/api/listings/', dict(params, facets='city', amenities='Wi-Fi'))
+                self.assertEqual(response.data['facets'], first, params)
+        compute.assert_not_called()
+        other = self.client.get('/api/listings/', {'facets': 'city', 'amenities': 'pool'}).data['facets']
+        self.assertEqual(self.counts(other['city']), {'Nairobi': 1, 'Mombasa': 1})
+
+    def test_listing_changes_invalidate_facets(self):
+        self.client.get('/api/listings/', {'facets': 'city'})
+        make_listing(self.host, title='Another', city='Kisumu')
+        facets = self.client.get('/api/listings/', {'facets': 'city'}).data['facets']
+        self.assertEqual(self.counts(facets['city'])['Kisumu'], 1)
+        self.assertEqual(self.client.get('/api/listings/', {'facets': 'colour'}).status_code, 400)
+
+
+class AsyncReadPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        search_index.reset()
+        self.client = AsyncClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Pool villa', amenities='pool')
+        for i in range(3):
+            make_listing(self.host, title=f'Flat {i}')
+        make_booking(self.villa, self.guest, date(2025, 5, 1), date(2025, 5, 3))
+        make_booking(self.villa, self.host, date(2025, 5, 3), date(2025, 5, 5))
+
+    async def test_listing_list_matches_the_sync_endpoint(self):
+        response = await self.client.get('/api/async/listings/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        sync_data = (await sync_to_async(APIClient().get)('/api/listings/', {'page_size': 2})).json()
+        self.assertEqual(data['results'], sync_data['results'])
+        rest = (await self.client.get(data['next'])).json()
+        self.assertEqual([row['title'] for row in rest['results']], ['Flat 0', 'Pool villa'])
+
+    async def test_search_and_detail(self):
+        data = (await self.client.get('/api/async/listings/', {'q': 'pool'})).json()
+        self.assertEqual([row['title'] for row in data['results']], ['Pool villa'])
+        detail = await self.client.get(f'/api/async/listings/{self.villa.pk}/')
+        self.assertEqual(detail.json()['title'], 'Pool villa')
+        self.assertEqual((await self.client.get('/api/async/listings/999999/')).status_code, 404)
+        self.assertEqual((await self.client.get('/api/async/listings/', {'min_rating': 'x'})).status_code, 400)
+
+    async def test_amenity_filter_reloads_the_catalog(self):
+        data = (await self.client.get('/api/async/listings/', {'amenities': 'pool'})).json()
+        self.assertEqual([row['title'] for row in data['results']], ['Pool villa'])
+        # Not in the catalog: matches nothing.
+        response = await self.client.get('/api/async/listings/', {'amenities': 'sauna'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    async def test_booking_list_is_scoped_to_the_session_user(self):
+        self.assertEqual((await self.client.get('/api/async/bookings/')).json()['results'], [])
+        await self.client.aforce_login(self.guest)
+        results = (await self.client.get('/api/async/bookings/')).json()['results']
+        self.assertEqual([row['guest_username'] for row in results], ['guest'])
+
+
+class BenchmarkSuiteTests(TestCase):
+    """
+    Runs the benchmark suite on a small fixture, as a smoke test of every scenario.
+    """
+
+    def setUp(self):
+        cache.clear()
+        catalog.clear()
+        search_index.reset()
+        self.assertTrue(seed_fixture(listings=30, users=5, bookings_per_listing=2, reviews_per_listing=2))
+
+    def check(self, results):
+        self.assertEqual(set(results), {'listing-list', 'listing-detail', 'listing-search', 'listing-facets',
+                                        'booking-list', 'booking-detail', 'booking-create'})
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            # booking-create also writes the analytics rollup, and compiles a rate calendar for new listings
+            self.assertLessEqual(result['queries_per_request'], 14, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_fixture_is_deterministic_and_consistent(self):
+        self.assertFalse(seed_fixture())
+        self.assertEqual(Listing.objects.count(), 30)
+        self.assertEqual(BookedNight.objects.count(), sum(
+            (booking.check_out_date - booking.check_in_date).days for booking in Booking.objects.all()))
+        self.assertEqual(reconcile_ratings(dry_run=True), 0)
+
+    def test_suite_runs_over_wsgi_and_asgi(self):
+        outsider = User.objects.create_user('outsider')
+        kept = make_booking(make_listing(outsider), outsider, CREATE_FROM, CREATE_FROM + timedelta(days=2))
+        self.check(run_suite(requests=5))
+        self.check(run_suite(requests=5, client='asgi', concurrency=4))
+        self.assertEqual(list(Booking.objects.filter(check_in_date__gte=CREATE_FROM)), [kept])
+        self.assertFalse(User.objects.filter(is_staff=True).exists())
+
+    def test_compare_flags_regressions(self):
+        baseline = {'listing-list': {'p95_ms': 10.0, 'requests_per_second': 100.0, 'queries_per_request': 2}}
+        current = {'listing-list': {'p95_ms': 11.0, 'requests_per_second': 70.0, 'queries_per_request': 3}}
+        self.assertEqual([r['metric'] for r in compare(current, baseline)], ['queries_per_request', 'requests_per_second'])
+
+
+class GenerateTravelDataTests(TestCase):
+    def setUp(self):
+        catalog.clear()
+
+    def generate(self, **options):
+        call_command('generate_travel_data', users=20, listings=45, shard_size=10, workers=1,
+                     stdout=io.StringIO(), stderr=io.StringIO(), **options)
+        return list(Listing.objects.order_by('title').values_list('title', 'price_per_night', 'amenities', 'rating_count'))
+
+    def test_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(Listing.objects.count(), 45)
+        self.assertTrue(Booking.objects.exists())
+        self.assertEqual(BookedNight.objects.count(), sum(
+            (booking.check_out_date - booking.check_in_date).days for booking in Booking.objects.all()))
+        self.assertEqual(reconcile_ratings(dry_run=True), 0)
+        for listing in Listing.objects.exclude(amenities=''):
+            self.assertEqual(catalog.mask_for(split_amenities(listing.amenities)), listing.amenity_mask)
+        self.assertFalse(Listing.objects.filter(geohash='').exists())
+
+    @override_settings(BOOKING_HORIZON_DAYS=60)
+    def test_stays_follow_the_booking_horizon(self):
+        self.generate()
+        last = Booking.objects.order_by('-check_out_date').values_list('check_out_date', flat=True).first()
+        self.assertLessEqual(last, FIRST_NIGHT + timedelta(days=60))
+
+    def test_output_is_deterministic_per_seed(self):
+        first = self.generate(seed=7)
+        Listing.objects.all().delete()
+        self.assertEqual(self.generate(seed=7), first)
+        Listing.objects.all().delete()
+        self.assertNotEqual(self.generate(seed=8), first)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.host = User.objects.create_user('host')
+        make_listing(self.host)
+
+    def timings(self, response):
+        entries = re.findall(r'(\w+);(?:dur=([\d.]+)|desc="(\w+)")', response.get('Server-Timing', ''))
+        return {name: duration or description for name, duration, description in entries}
+
+    def test_staff_can_profile_a_request_and_download_it(self):
+        self.client.force_login(self.staff)
+        timings = self.timings(self.client.get('/api/listings/', {'profile': '1'}))
+        self.assertTrue({'db', 'serialize', 'render', 'total', 'profile'} <= set(timings))
+        self.assertLessEqual(float(timings['serialize']), float(timings['total']))
+
+        profiles = self.client.get('/api/profiles/').data
+        self.assertEqual([(p['id'], p['path']) for p in profiles], [(timings['profile'], '/api/listings/?profile=1')])
+        download = self.client.get(f"/api/profiles/{timings['profile']}.prof")
+        self.assertEqual(download['Content-Type'], 'application/octet-stream')
+        self.assertTrue(marshal.loads(download.content))
+        report = self.client.get(f"/api/profiles/{timings['profile']}.txt", {'sort': 'tottime'})
+        self.assertIn('function calls', report.content.decode())
+
+    @override_settings(DEBUG=True)
+    def test_query_count_in_debug_keeps_the_profile_timings(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/listings/', {'profile': '1'})
+        self.assertTrue({'serialize', 'render', 'total', 'profile'} <= set(self.timings(response)))
+        self.assertRegex(response['Server-Timing'], r', db;dur=[0-9.]+;desc="[0-9]+ queries"$')
+
+    def test_other_requests_are_not_profiled(self):
+        self.client.force_login(self.host)
+        self.assertNotIn('profile', self.timings(self.client.get('/api/listings/', HTTP_X_PROFILE='1')))
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled(self):
+        self.assertIn('profile', self.timings(self.client.get('/api/bookings/')))
+
+
+class MetricsTests(TestCase):
+    def sample(self, name, **labels):
+        return metrics_registry().get_sample_value(name, labels) or 0
+
+    def test_requests_are_counted_and_exposed(self):
+        before = self.sample('http_requests_total', method='GET', endpoint='listing-list', status='200')
+        self.client.get('/api/listings/')
+        self.assertEqual(self.sample('http_requests_total', method='GET', endpoint='listing-list', status='200'), before + 1)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="listing-list"', body)
+        self.assertIn('http_request_queries_count', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_task_lifecycle_signals(self):
+        name = send_booking_confirmation_emails_task.name
+        headers = {}
+        before_task_publish.send(sender=name, headers=headers, body=None)
+        self.assertIn('published_at', headers)
+        task = mock.Mock(spec=['name', 'request'])
+        task.name = name
+        task.request = mock.Mock(spec=['published_at'], published_at=headers['published_at'] - 2)
+        waits = self.sample('celery_task_queue_wait_seconds_count', task=name)
+        failures = self.sample('celery_tasks_total', task=name, state='FAILURE')
+
+        task_prerun.send(sender=task, task_id='t1', task=task)
+        task_failure.send(sender=task, task_id='t1', exception=ValueError('boom'))
+        task_postrun.send(sender=task, task_id='t1', task=task, state='FAILURE')
+
+        self.assertEqual(self.sample('celery_task_queue_wait_seconds_count', task=name), waits + 1)
+        self.assertGreaterEqual(self.sample('celery_task_queue_wait_seconds_sum', task=name), 2)
+        self.assertEqual(self.sample('celery_tasks_total', task=name, state='FAILURE'), failures + 1)
+        self.assertGreaterEqual(self.sample('celery_task_failures_total', task=name, exception='ValueError'), 1)
+        self.assertGreaterEqual(self.sample('celery_task_duration_seconds_count', task=name, state='FAILURE'), 1)
+
+    def test_multiprocess_samples_are_summed(self):
+        script = (
+            "from prometheus_client import Counter; "
+            "Counter('celery_tasks_total', '', ['task', 'state']).labels('t', 'SUCCESS').inc(3)"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', script], env=env, check=True)
+            with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+                self.assertEqual(self.sample('celery_tasks_total', task='t', state='SUCCESS'), 6)
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Villa', price_per_night=Decimal('100.00'))
+        self.flat = make_listing(self.host, title='Flat', price_per_night=Decimal('40.00'))
+        PricingRule.objects.create(listing=self.villa, kind=PricingRule.WEEKEND, amount=Decimal('150.00'))
+        PricingRule.objects.create(listing=self.villa, kind=PricingRule.SEASON, amount=Decimal('200.00'),
+                                   start_date=date(2025, 12, 20), end_date=date(2026, 1, 2))
+        PricingRule.objects.create(listing=self.villa, kind=PricingRule.CLEANING_FEE, amount=Decimal('25.00'))
+
+    def test_weekend_season_and_fees(self):
+        # Thursday 5 June to Monday 9 June 2025: Thu, Fri, Sat, Sun nights.
+        quote = quote_stay(self.villa, date(2025, 6, 5), date(2025, 6, 9))
+        self.assertEqual(quote['subtotal'], Decimal('500.00'))
+        self.assertEqual(quote['total'], Decimal('525.00'))
+        # Across the new year: Thu 18 and Fri 19 Dec, 14 seasonal nights overriding the weekends, Sat 3 Jan.
+        quote = quote_stay(self.villa, date(2025, 12, 18), date(2026, 1, 4))
+        self.assertEqual(quote['nights'], 17)
+        self.assertEqual(quote['subtotal'], Decimal('100.00') + Decimal('150.00') * 2 + Decimal('200.00') * 14)
+
+    def test_discounts(self):
+        PricingRule.objects.create(listing=self.flat, kind=PricingRule.WEEKLY_DISCOUNT, percent=Decimal('10'))
+        PricingRule.objects.create(listing=self.flat, kind=PricingRule.MONTHLY_DISCOUNT, percent=Decimal('25'))
+        quotes = quote_stays([self.flat], date(2025, 3, 1), date(2025, 3, 7))
+        self.assertEqual(quotes[self.flat.id]['discount'], Decimal('0.00'))
+        self.assertEqual(quote_stay(self.flat, date(2025, 3, 1), date(2025, 3, 8))['total'], Decimal('252.00'))
+        self.assertEqual(quote_stay(self.flat, date(2025, 3, 1), date(2025, 3, 29))['total'], Decimal('840.00'))
+
+    def test_last_representable_year(self):
+        quote = quote_stay(self.flat, date(9999, 12, 30), date(9999, 12, 31))
+        self.assertEqual(quote['total'], Decimal('40.00'))
+
+    def test_stays_are_bounded(self):
+        self.client.force_authenticate(self.guest)
+        far = {'check_in': '9999-12-30', 'check_out': '9999-12-31'}
+        long_stay = {'check_in': '1700-01-01', 'check_out': '2100-01-01'}
+        for params in (far, long_stay):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/listings/', params).status_code, 400)
+                self.assertEqual(self.client.get('/api/listings/available/', params).status_code, 400)
+                response = self.client.post('/api/bookings/', {
+                    'listing': self.flat.id, 'check_in_date': params['check_in'], 'check_out_date': params['check_out'],
+                })
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('check_out_date', response.data)
+
+    def test_booking_total_is_priced_by_the_server(self):
+        self.client.force_authenticate(self.guest)
+        response = self.client.post('/api/bookings/', {
+            'listing': self.villa.id, 'check_in_date': '2025-06-05', 'check_out_date': '2025-06-09',
+            'total_price': '1.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total_price'], '525.00')
+
+        response = self.client.patch(f"/api/bookings/{response.data['id']}/", {'check_out_date': '2025-06-06'},
+                                     format='json')
+        self.assertEqual(response.data['total_price'], '125.00')
+
+    def test_list_results_are_quoted_for_the_requested_dates(self):
+        params = {'check_in': '2025-06-05', 'check_out': '2025-06-09'}
+        results = {row['title']: row['quote'] for row in self.client.get('/api/listings/', params).data['results']}
+        self.assertEqual(results['Villa']['total'], '525.00')
+        self.assertEqual(results['Flat'], {'nights': 4, 'subtotal': '160.00', 'discount': '0.00',
+                                           'cleaning_fee': '0.00', 'total': '160.00'})
+        results = self.client.get('/api/listings/available/', params).data['results']
+        self.assertEqual({row['title']: row['quote']['total'] for row in results}['Villa'], '525.00')
+        self.assertNotIn('quote', self.client.get('/api/listings/').data['results'][0])
+        self.assertEqual(self.client.get('/api/listings/', {'check_in': '2025-06-05'}).status_code, 400)
+
+    def test_rule_changes_invalidate_compiled_calendars(self):
+        params = {'check_in': '2025-06-05', 'check_out': '2025-06-09'}
+        self.client.get('/api/listings/', params)
+        PricingRule.objects.filter(listing=self.villa, kind=PricingRule.CLEANING_FEE).delete()
+        results = {row['title']: row['quote'] for row in self.client.get('/api/listings/', params).data['results']}
+        self.assertEqual(results['Villa']['total'], '500.00')
+
+
+class OwnerAnalyticsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Villa')
+        self.flat = make_listing(self.host, title='Flat')
+        self.other = make_listing(self.guest, title='Not mine')
+        # Three nights in late June for 100.00 and four in early July for 200.00
+        self.june = make_booking(self.villa, self.guest, date(2025, 6, 28), date(2025, 7, 1), total_price=Decimal('100.00'))
+        make_booking(self.villa, self.guest, date(2025, 7, 1), date(2025, 7, 5), total_price=Decimal('200.00'))
+        make_booking(self.other, self.host, date(2025, 6, 1), date(2025, 6, 3))
+
+    def rollup(self):
+        return sorted(DailyStat.objects.values_list('listing_id', 'day', 'check_ins', 'revenue'))
+
+    def report(self, **params):
+        self.client.force_authenticate(self.host)
+        params = dict({'start': '2025-06-01', 'end': '2025-08-01'}, **params)
+        response = self.client.get('/api/analytics/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['title']: row for row in response.data['listings']}
+
+    def test_rollup_follows_bookings(self):
+        nights = DailyStat.objects.filter(listing=self.villa).order_by('day')
+        # 100.00 over three nights: the odd cent goes to the first night
+        self.assertEqual([stat.revenue for stat in nights[:3]], [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual([stat.check_ins for stat in nights], [1, 0, 0, 1, 0, 0, 0])
+
+        self.june.check_in_date = date(2025, 6, 29)
+        self.june.save()
+        self.assertEqual(DailyStat.objects.filter(listing=self.villa, day__lt=date(2025, 7, 1)).count(), 2)
+        before = self.rollup()
+        rebuild_daily_stats(batch_size=1)
+        self.assertEqual(self.rollup(), before)
+
+        self.june.delete()
+        self.assertFalse(DailyStat.objects.filter(listing=self.villa, day__lt=date(2025, 7, 1)).exists())
+
+    def test_report_by_month(self):
+        report = self.report(period='month')
+        self.assertEqual(set(report), {'Villa', 'Flat'})
+        june, july = report['Villa']['periods']
+        self.assertEqual((june['period'], june['days'], june['booked_nights']), (date(2025, 6, 1), 30, 3))
+        self.assertEqual((june['occupancy'], june['adr'], june['revenue']), (0.1, '33.33', '100.00'))
+        self.assertEqual((july['booked_nights'], july['adr'], july['revenue']), (4, '50.00', '200.00'))
+        self.assertEqual(report['Villa']['totals']['revenue'], '300.00')
+        self.assertEqual(report['Flat']['totals'], {'days': 61, 'booked_nights': 0, 'check_ins': 0,
+                                                    'occupancy': 0.0, 'adr': None, 'revenue': '0.00'})
+
+    def test_report_by_day_and_week(self):
+        days = self.report(start='2025-06-29', end='2025-07-02', listing=self.villa.id)['Villa']['periods']
+        self.assertEqual([day['booked_nights'] for day in days], [1, 1, 1])
+        # Weeks start on Monday and are clipped to the window: 28 June 2025 is a Saturday.
+        weeks = self.report(start='2025-06-28', end='2025-07-07', period='week')['Villa']['periods']
+        self.assertEqual([(week['period'], week['days'], week['booked_nights']) for week in weeks],
+                         [(date(2025, 6, 23), 2, 2), (date(2025, 6, 30), 7, 5)])
+
+    def test_report_is_owner_scoped_and_validated(self):
+        self.client.force_authenticate(self.host)
+        self.assertEqual(self.client.get('/api/analytics/', {
+            'start': '2025-06-01', 'end': '2025-07-01', 'listing': self.other.id,
+        }).status_code, 404)
+        self.assertEqual(self.client.get('/api/analytics/', {'start': '2025-06-01', 'end': '2025-06-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/', {'start': '2020-01-01', 'end': '2025-01-01'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/analytics/', {'start': '2025-06-01', 'end': '2025-07-01'}).status_code,
+                      (401, 403))
+
+    def test_report_reads_only_the_rollup(self):
+        self.client.force_authenticate(self.host)
+        self.assertQueryBudget(2, 'get', '/api/analytics/', {'start': '2024-01-01', 'end': '2025-12-31'})
+
+
+class SchemaTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(SCHEMA_DIR=self.directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def test_serves_the_precomputed_artifact(self):
+        call_command('precompute_schema', stdout=io.StringIO())
+        with open(os.path.join(self.directory.name, 'openapi.json'), 'rb') as artifact:
+            body = artifact.read()
+        paths = json.loads(body)['paths']
+        self.assertIn('/listings/available/', paths)
+        page = paths['/listings/']['get']['responses']['200']['schema']
+        self.assertEqual(page['properties']['results']['items'], {'$ref': '#/definitions/Listing'})
+        self.assertEqual(paths['/bookings/{id}/']['get']['responses']['200']['schema'], {'$ref': '#/definitions/Booking'})
+
+        with mock.patch.object(schema, 'generate_schema') as generate:
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.content, body)
+            response = self.client.get('/swagger.yaml', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertTrue(gzip.decompress(response.content).startswith(b'swagger:'))
+        generate.assert_not_called()
+
+    def test_conditional_requests(self):
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        gzipped = self.client.get('/swagger.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(gzipped['ETag'], etag)
+        self.assertEqual(gzip.decompress(gzipped.content), response.content)
+        self.assertEqual(self.client.post('/swagger.json').status_code, 405)
+
+    def test_generated_once_without_an_artifact(self):
+        with mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/swagger.json').status_code, 200)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_docs_pages_load_the_static_schema(self):
+        response = self.client.get('/swagger/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/swagger.json')
+        self.assertEqual(self.client.get('/redoc/').status_code, 200)
+
+    def test_urls_do_not_import_drf_yasg_views(self):
+        script = 'import sys, django; django.setup(); import alx_travel_app.urls; print("drf_yasg.views" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = User.objects.create_user('host')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Villa', image_url='https://example.com/villa.jpg')
+        make_booking(self.villa, self.guest, date(2025, 6, 1), date(2025, 6, 3))
+
+    def selected_columns(self, path, params, table):
+        """
+        The response, and the columns of each table in its SELECT from `table`.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        sql = next(query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql'])
+        columns = {}
+        for column in re.findall(r'"(\w+)"\."(\w+)"', sql.split(' FROM ')[0]):
+            columns.setdefault(column[0], set()).add(column[1])
+        return response, columns
+
+    def test_listing_fields_are_pushed_down(self):
+        response, columns = self.selected_columns('/api/listings/', {'fields': 'id,title,city,price_per_night,image_url'},
+                                                  'listings_listing')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'city', 'price_per_night', 'image_url'})
+        # created_at and id are the pagination key
+        self.assertEqual(columns, {'listings_listing': {'id', 'title', 'city', 'price_per_night', 'image_url', 'created_at'}})
+
+        response, columns = self.selected_columns(f'/api/listings/{self.villa.pk}/',
+                                                  {'fields': 'title,owner_username,rating_histogram'}, 'listings_listing')
+        self.assertEqual(response.data, {'title': 'Villa', 'owner_username': 'host',
+                                         'rating_histogram': {str(star): 0 for star in range(1, 6)}})
+        self.assertEqual(columns['listings_listing'], {'id', 'title', 'owner_id'} | {f'rating_{star}' for star in range(1, 6)})
+        self.assertEqual(columns['auth_user'], {'id', 'username'})
+
+    def test_listing_exclude_defers_columns_and_joins(self):
+        response, columns = self.selected_columns('/api/listings/', {'exclude': 'description,owner_username'},
+                                                  'listings_listing')
+        row = response.data['results'][0]
+        self.assertNotIn('description', row)
+        self.assertEqual(row['owner'], self.host.pk)
+        self.assertEqual(set(columns), {'listings_listing'})
+        self.assertNotIn('description', columns['listings_listing'])
+        self.assertIn('address', columns['listings_listing'])
+
+    def test_booking_fields_trim_the_joins(self):
+        self.client.force_authenticate(self.guest)
+        params = {'fields': 'id,listing_title,total_price'}
+        response, columns = self.selected_columns('/api/bookings/', params, 'listings_booking')
+        self.assertEqual(response.data['results'][0], {'id': self.villa.bookings.get().pk, 'listing_title': 'Villa',
+                                                       'total_price': '100.00'})
+        # values() rows of the fast list path need neither the foreign key nor the listing's pk
+        self.assertEqual(columns, {'listings_booking': {'id', 'total_price', 'created_at'},
+                                   'listings_listing': {'title'}})
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            _, columns = self.selected_columns('/api/bookings/', params, 'listings_booking')
+        self.assertEqual(columns, {'listings_booking': {'id', 'listing_id', 'total_price', 'created_at'},
+                                   'listings_listing': {'id', 'title'}})
+
+        _, columns = self.selected_columns('/api/bookings/', {'exclude': 'listing_title,guest_username'},
+                                           'listings_booking')
+        self.assertEqual(set(columns), {'listings_booking'})
+
+    def test_quotes_and_errors(self):
+        response = self.client.get('/api/listings/', {'fields': 'id,title', 'check_in': '2025-07-01',
+                                                      'check_out': '2025-07-03'})
+        self.assertEqual(response.data['results'][0]['quote']['total'], '100.00')
+        response = self.client.get('/api/listings/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+
+class FastPathParityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.host = User.objects.create_user('høst')
+        self.guest = User.objects.create_user('guest')
+        self.villa = make_listing(self.host, title='Villa \u2028 “Sunset”', latitude=0.00001, longitude=36.8,
+                                  price_per_night=Decimal('120.50'), amenities='WiFi, Pool', number_of_baths=Decimal('2.5'))
+        self.flat = make_listing(self.host, title='Flat', description='', image_url='https://example.com/flat.jpg')
+        make_listing(self.guest, title='Studio with a pool', latitude=None, longitude=None)
+        Review.objects.create(listing=self.villa, guest=self.guest, rating=4)
+        Review.objects.create(listing=self.flat, guest=self.guest, rating=5)
+        make_booking(self.villa, self.guest, date(2025, 6, 1), date(2025, 6, 3), total_price=Decimal('241.00'))
+        make_booking(self.flat, self.guest, date(2025, 6, 1), date(2025, 6, 2))
+
+    def fetch(self, path, params, fast, **headers):
+        cache.clear()  # cached list pages would hide the path that built them
+        with override_settings(FAST_LIST_SERIALIZATION=fast):
+            response = self.client.get(path, params, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertParity(self, path, params=None, **headers):
+        slow = self.fetch(path, params or {}, False, **headers)
+        fast = self.fetch(path, params or {}, True, **headers)
+        self.assertEqual(fast.content, slow.content, (path, params))
+        return fast
+
+    def test_listing_lists_are_byte_identical(self):
+        for params in [
+            {}, {'page_size': 1}, {'ordering': '-rating'}, {'q': 'pool'}, {'min_rating': 4},
+            {'check_in': '2025-07-01', 'check_out': '2025-07-08'}, {'fields': 'id,title,rating_histogram'},
+            {'exclude': 'description,owner_username'}, {'facets': 'city,price'},
+        ]:
+            self.assertParity('/api/listings/', params)
+        self.assertParity('/api/listings/available/', {'check_in': '2025-06-01', 'check_out': '2025-06-02'})
+        with override_settings(TIME_ZONE='Africa/Nairobi'):
+            response = self.assertParity('/api/listings/')
+        self.assertIn('+03:00', response.json()['results'][0]['created_at'])
+
+    def test_booking_lists_are_byte_identical(self):
+        self.client.force_authenticate(self.guest)
+        self.assertParity('/api/bookings/')
+        self.assertParity('/api/bookings/', {'fields': 'listing_title,check_in_date,total_price'})
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        self.assertParity('/api/bookings/', {'page_size': 1})
+
+    def test_next_pages_follow_the_same_cursors(self):
+        slow = self.fetch('/api/listings/', {'page_size': 1}, False).json()
+        fast = self.fetch('/api/listings/', {'page_size': 1}, True).json()
+        self.assertEqual(fast['next'], slow['next'])
+        self.assertEqual(self.fetch(fast['next'], {}, True).content, self.fetch(slow['next'], {}, False).content)
+
+    def test_json_renderer_matches_drf(self):
+        data = self.fetch('/api/listings/', {}, False).data
+        fast, stock = FastJSONRenderer().render(data), JSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(stock))
+        # orjson only spells some floats differently.
+        self.assertEqual(fast.replace(b'0.00001', b'1e-05'), stock)
+        data = {'at': timezone.now(), 'day': date(2025, 1, 2), 'price': Decimal('1.10'), 'lazy': gettext_lazy('Villa'),
+                'text': 'line\u2028break\u2029', 'emoji': '\u00e9\U0001f3e0', 7: [None, True]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render([2 ** 70]), JSONRenderer().render([2 ** 70]))  # too big for orjson
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_is_negotiated(self):
+        response = self.assertParity('/api/listings/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), self.fetch('/api/listings/', {}, True).json())
+
+
+class ReplicaRoutingTests(TestCase):
+    """
+    The test database is the primary; a second SQLite database with no rows stands
+    in for a replica that has not caught up, so a read shows where it was routed.
+    """
+    alias = 'replica'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(sqlite_replica(cls.alias))
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner')
+        self.guest = User.objects.create_user('guest', email='guest@example.com')
+        self.listing = make_listing(self.owner)
+        self.check_in = date.today() + timedelta(days=30)
+        override = override_settings(DATABASE_REPLICAS=[self.alias])
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+
+    def book(self, client):
+        client.force_authenticate(self.guest)
+        return client.post('/api/bookings/', {
+            'listing': self.listing.id, 'check_in_date': self.check_in,
+            'check_out_date': self.check_in + timedelta(days=2),
+        })
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Listing), 'default')
+        with reading_from([self.alias]) as state:
+            self.assertEqual(router.db_for_read(Listing), self.alias)
+            self.assertEqual(router.db_for_write(Booking), 'default')
+            self.assertTrue(state.wrote)
+            self.assertEqual(router.db_for_read(Listing), 'default')  # read your own writes
+        self.assertFalse(router.allow_migrate(self.alias, 'listings'))
+
+    def test_safe_requests_read_from_the_replica(self):
+        response = self.client.get('/api/listings/available/', {
+            'check_in': self.check_in, 'check_out': self.check_in + timedelta(days=2),
+        })
+        self.assertEqual(response.json()['results'], [])  # the replica has no listings yet
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        response = self.book(self.client)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        # The guest sees the booking right away; other clients read the lagging replica.
+        self.assertEqual(len(self.client.get('/api/bookings/').json()['results']), 1)
+        other = APIClient()
+        other.force_authenticate(self.guest)
+        self.assertEqual(other.get('/api/bookings/').json()['results'], [])
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post('/api/bookings/', {'listing': self.listing.id})
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_credentials_pin_clients_without_cookies(self):
+        self.guest.set_password('pass')
+        self.guest.save()
+        credentials = 'Basic ' + base64.b64encode(b'guest:pass').decode()
+        response = APIClient().post('/api/bookings/', {
+            'listing': self.listing.id, 'check_in_date': self.check_in,
+            'check_out_date': self.check_in + timedelta(days=2),
+        }, HTTP_AUTHORIZATION=credentials)
+        self.assertEqual(response.status_code, 201)
+
+        # A fresh client (no pin cookie) sending the same credentials reads the primary.
+        response = APIClient().get('/api/bookings/', HTTP_AUTHORIZATION=credentials)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_cache_misses_after_a_write_are_built_from_the_primary(self):
+        # The listing was just created, so the replica may not have it yet.
+        self.assertEqual(self.client.get('/api/listings/').json()['results'][0]['id'], self.listing.id)
+
+    def test_cache_misses_are_built_from_the_replica(self):
+        cache.delete(recent_bump_key(COLLECTION_VERSION_KEY))  # the write is older than REPLICA_PIN_SECONDS
+        self.assertEqual(self.client.get('/api/listings/').json()['results'], [])
+
+    def test_tasks_read_from_the_primary(self):
+        booking = make_booking(self.listing, self.guest, self.check_in, self.check_in + timedelta(days=2))
+        with reading_from([self.alias]):
+            result = send_booking_confirmation_emails_task.apply(args=([booking.id],)).get()
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class LegacyOverlapMigrationTests(TransactionTestCase):
+    """
+    Bookings made before migration 0003 could overlap; the migrations from there on must cope.
+    """
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.addCleanup(self.migrate, MigrationExecutor(connection).loader.graph.leaf_nodes())
+        apps = self.migrate([('listings', '0001_initial')])
+        owner = apps.get_model('auth', 'User').objects.create(username='host')
+        listing = apps.get_model('listings', 'Listing').objects.create(
+            owner=owner, title='Villa', description='Legacy.', address='1 Main Street', city='Nairobi',
+            country='Kenya', price_per_night=Decimal('100.00'), max_guests=2,
+        )
+        Booking = apps.get_model('listings', 'Booking')
+        self.first, self.second = [
+            Booking.objects.create(listing=listing, guest=owner, check_in_date=date(2024, 5, day),
+                                   check_out_date=date(2024, 5, day + 3), total_price=Decimal('300.00')).id
+            for day in (1, 3)
+        ]
+
+    def test_overlapping_bookings_are_flagged_for_review(self):
+        apps = self.migrate([('listings', '0003_booking_overlap_constraint')])
+        Booking = apps.get_model('listings', 'Booking')
+        self.assertEqual(list(Booking.objects.filter(needs_review=True).values_list('id', flat=True)), [self.second])
+        nights = apps.get_model('listings', 'BookedNight').objects.order_by('night').values_list('night', 'booking_id')
+        self.assertEqual(list(nights), [
+            (date(2024, 5, 1), self.first), (date(2024, 5, 2), self.first), (date(2024, 5, 3), self.first),
+            (date(2024, 5, 4), self.second), (date(2024, 5, 5), self.second),
+        ])
+
+    def test_daily_stats_backfill_counts_the_kept_nights(self):
+        apps = self.migrate([('listings', '0011_daily_stats')])
+        stats = apps.get_model('listings', 'DailyStat').objects.order_by('day').values_list('day', 'check_ins', 'revenue')
+        # May 3 stayed with the first booking; the second keeps its last two nights.
+        self.assertEqual(list(stats), [(date(2024, 5, day), int(day == 1), Decimal('100.00')) for day in range(1, 6)])
+
+    def latest_stats(self):
+        return list(DailyStat.objects.order_by('day').values_list('day', 'check_ins'))
+
+    def test_deleting_a_flagged_booking_keeps_the_contested_night(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        Booking.objects.get(pk=self.second).delete()
+        self.assertEqual(self.latest_stats(), [(date(2024, 5, day), int(day == 1)) for day in range(1, 4)])
+
+    def test_saving_a_flagged_booking_clears_the_flag(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        second = Booking.objects.get(pk=self.second)
+        second.check_in_date, second.check_out_date = date(2024, 5, 4), date(2024, 5, 6)
+        second.save()
+        self.assertFalse(Booking.objects.get(pk=self.second).needs_review)
+        self.assertEqual(self.latest_stats(), [(date(2024, 5, day), int(day in (1, 4))) for day in range(1, 6)])
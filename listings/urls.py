@@ -1,11 +1,30 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet, BookingViewSet
+from . import async_views
+from .views import ListingViewSet, BookingViewSet, owner_analytics, profile_download, profile_list
 
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet)
 router.register(r'bookings', BookingViewSet)
 
+export_view = {'get': 'export'}
+export_permissions = {'permission_classes': [IsAuthenticated]}
+
 urlpatterns = [
+    # Streaming exports, ahead of the router so "export.csv" is not taken for a pk with a format suffix
+    re_path(r'^listings/export\.(?P<fmt>csv|ndjson)/?$',
+            ListingViewSet.as_view(export_view, **export_permissions), name='listing-export'),
+    re_path(r'^bookings/export\.(?P<fmt>csv|ndjson)/?$',
+            BookingViewSet.as_view(export_view, **export_permissions), name='booking-export'),
+    # Native async read endpoints for ASGI deployments (listings/async_views.py)
+    path('async/listings/', async_views.listing_list, name='async-listing-list'),
+    path('async/listings/<int:pk>/', async_views.listing_detail, name='async-listing-detail'),
+    path('async/bookings/', async_views.booking_list, name='async-booking-list'),
+    # Stored request profiles, admin only (listings/profiling.py)
+    path('profiles/', profile_list, name='profile-list'),
+    re_path(r'^profiles/(?P<profile_id>[0-9a-f]{32})\.(?P<ext>prof|txt)$', profile_download, name='profile-download'),
+    # Occupancy and revenue of the user's own listings (listings/analytics.py)
+    path('analytics/', owner_analytics, name='owner-analytics'),
     path('', include(router.urls)),
 ]
@@ -1,16 +1,65 @@
-from rest_framework import viewsets, serializers
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
 from .models import Listing, Booking
-from .serializers import ListingSerializer, BookingSerializer
-from .tasks import send_booking_confirmation_email_task
+from .amenities import filter_by_amenities, split_amenities
+from .analytics import owner_report
+from .bulk import BulkImportError, import_bookings, import_listings
+from .caching import VersionedCacheMixin
+from .exceptions import BookingConflict
+from .exports import BOOKING_EXPORT_COLUMNS, LISTING_EXPORT_COLUMNS, streaming_export
+from .facets import cached_facets
+from .fastpath import FastListMixin
+from .geo import within_bbox, within_radius
+from .occupancy import available_listings
+from .outbox import enqueue_booking_confirmation
+from .parsers import NDJSONParser
+from .pricing import quote_stay, quote_stays
+from .profiling import load_profile, profile_summary, recent_profiles
+from .search import search_listings
+from .serializers import (
+    ListingSerializer, BookingSerializer, AvailabilitySearchSerializer, ListingQuerySerializer, AnalyticsQuerySerializer,
+)
 
-class ListingViewSet(viewsets.ModelViewSet):
+def constraint_name(exc):
+    # psycopg reports the constraint; SQLite only names it in the message.
+    diag = getattr(exc.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) or str(exc)
+
+def bulk_import_response(request, importer, user, conflict=None):
+    """
+    Run a bulk import over a JSON array or an NDJSON stream and report the outcome.
+    An IntegrityError raises `conflict` when given (the nights of an imported
+    booking were taken concurrently), and is a 400 naming the constraint otherwise.
+    """
+    rows = request.data
+    if isinstance(rows, (dict, str, bytes)):
+        return Response({'detail': 'Expected a JSON array or NDJSON rows.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ids = importer(rows, user, context={'request': request})
+    except BulkImportError as exc:
+        return Response({'created': 0, 'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except IntegrityError as exc:
+        if conflict is not None:
+            raise conflict()
+        message = f'The rows violate a database constraint: {constraint_name(exc)}.'
+        return Response({'created': 0, 'errors': [{'errors': {'non_field_errors': [message]}}]},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response({'created': len(ids), 'ids': ids}, status=status.HTTP_201_CREATED)
+
+class ListingViewSet(FastListMixin, VersionedCacheMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows listings to be viewed, created, updated or deleted.
     """
-    queryset = Listing.objects.all().order_by('-created_at')
+    queryset = Listing.objects.select_related('owner').order_by('-created_at', '-id')
     serializer_class = ListingSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] # Allow read-only access for unauthenticated users
+    sparse_actions = ('list', 'retrieve', 'available') # ?fields= / ?exclude= (listings/sparse.py)
+    fast_actions = ('list', 'available') # pages serialized from values() rows (listings/fastpath.py)
 
     def perform_create(self, serializer):
         """
@@ -18,11 +67,148 @@ class ListingViewSet(viewsets.ModelViewSet):
         """
         serializer.save(owner=self.request.user)
 
-class BookingViewSet(viewsets.ModelViewSet):
+    def search_query(self):
+        return self.request.query_params.get('q', '').strip()
+
+    def list_params(self):
+        params = ListingQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def get_queryset(self):
+        """
+        `?q=` switches the list to full-text search over title, amenities and description.
+        `?amenities=wifi,pool` keeps listings that have all of the given amenities.
+        `?min_rating=4` keeps listings whose average review rating is at least 4.
+        `?near=lat,lon&radius_km=5` and `?bbox=min_lon,min_lat,max_lon,max_lat` search by location.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'available'):
+            return queryset
+        amenities = split_amenities(self.request.query_params.get('amenities'))
+        if amenities:
+            queryset = filter_by_amenities(queryset, amenities)
+        params = self.list_params()
+        if params.get('min_rating') is not None:
+            queryset = queryset.filter(rating_avg__gte=params['min_rating'])
+        if 'bbox' in params:
+            queryset = within_bbox(queryset, *params['bbox'])
+        if 'near' in params:
+            queryset = within_radius(queryset, *params['near'], params['radius_km'])
+        if self.action == 'list' and self.search_query():
+            queryset = search_listings(queryset, self.search_query())
+        return queryset
+
+    @property
+    def pagination_ordering(self):
+        # `?ordering=-rating` pages by average rating (backed by listing_rating_id_idx);
+        # otherwise search results are paginated by relevance, most relevant first.
+        if self.action not in ('list', 'available'):
+            return None
+        ordering = self.list_params().get('ordering')
+        if ordering:
+            return ListingQuerySerializer.ORDERINGS[ordering]
+        if self.action == 'list' and self.search_query():
+            return ('-rank', '-id')
+        return None
+
+    def stay_dates(self):
+        """
+        The (check_in, check_out) to quote list results for, if the request has them.
+        """
+        if self.action == 'available':
+            params = AvailabilitySearchSerializer(data=self.request.query_params)
+        elif self.action == 'list':
+            params = ListingQuerySerializer(data=self.request.query_params)
+        else:
+            return None
+        params.is_valid(raise_exception=True)
+        if 'check_in' not in params.validated_data:
+            return None
+        return params.validated_data['check_in'], params.validated_data['check_out']
+
+    def paginate_queryset(self, queryset):
+        self.filtered_queryset = queryset # the unpaginated result set, for the facet counts
+        page = super().paginate_queryset(queryset)
+        dates = self.stay_dates()
+        if dates and page is not None:
+            # One vectorized pass over the whole page (listings/pricing.py); rows of the fast path
+            # only carry the columns the rate calendars read.
+            listings = [Listing(id=row['id'], price_per_night=row['price_per_night']) if isinstance(row, dict) else row
+                        for row in page]
+            self.quotes = quote_stays(listings, *dates)
+        return page
+
+    def required_columns(self):
+        columns = super().required_columns()
+        if self.stay_dates():
+            columns.append('price_per_night') # read by the rate calendars of the quotes
+        return columns
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        quotes = getattr(self, 'quotes', None)
+        if quotes is not None:
+            context['quotes'] = quotes
+        return context
+
+    def get_paginated_response(self, data):
+        """
+        `?facets=city,price,amenities` adds counts per facet value over the whole
+        filtered result set (not just this page) to the list response.
+        """
+        response = super().get_paginated_response(data)
+        params = self.list_params() if self.action == 'list' else {}
+        if params.get('facets'):
+            amenities = split_amenities(self.request.query_params.get('amenities'))
+            response.data['facets'] = cached_facets(
+                self.filtered_queryset, params['facets'], params, self.search_query(), amenities,
+            )
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated],
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many listings owned by the current user from a JSON array or an
+        NDJSON upload. All rows are created, or none and the per-row errors are returned.
+        """
+        return bulk_import_response(request, import_listings, request.user)
+
+    def export(self, request, fmt):
+        """
+        Stream the current user's listings (every listing for staff) as CSV or NDJSON.
+        Routed explicitly in listings/urls.py as /listings/export.<fmt>.
+        """
+        queryset = Listing.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(owner=request.user)
+        return streaming_export(queryset, LISTING_EXPORT_COLUMNS, fmt, 'listings')
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Listings free for every night between `check_in` and `check_out`,
+        optionally restricted to a `city` and a minimum number of `guests`.
+        """
+        params = AvailabilitySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = available_listings(
+            params.validated_data['check_in'],
+            params.validated_data['check_out'],
+            queryset=self.filter_queryset(self.get_queryset()),
+            city=params.validated_data.get('city'),
+            guests=params.validated_data.get('guests'),
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class BookingViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows bookings to be viewed, created, updated or deleted.
     """
-    queryset = Booking.objects.all().order_by('-created_at')
+    queryset = Booking.objects.select_related('listing', 'guest').order_by('-created_at', '-id')
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] # Allow read-only access for unauthenticated users
 
@@ -31,18 +217,59 @@ class BookingViewSet(viewsets.ModelViewSet):
         Set the guest of the booking to the current user on creation
         and trigger a background email notification task.
         """
-        # Ensure the listing exists before creating a booking
-        listing_id = self.request.data.get('listing')
+        # The listing was already resolved by the serializer. No lock is taken on it:
+        # the booking and its nights are inserted in one transaction, and the unique
+        # (listing, night) constraint rejects whichever of two overlapping requests
+        # commits second, so non-overlapping bookings never wait on each other.
+        # The confirmation email is recorded in the outbox in the same transaction, so it
+        # is sent if and only if the booking commits, without a broker round-trip here.
         try:
-            listing = Listing.objects.get(id=listing_id)
-        except Listing.DoesNotExist:
-            raise serializers.ValidationError({"listing": "Listing not found."})
+            with transaction.atomic():
+                booking = serializer.save(guest=self.request.user, total_price=self.quote_total(serializer))
+                enqueue_booking_confirmation(booking)
+        except IntegrityError:
+            raise BookingConflict()
 
-        # Save the booking instance
-        booking = serializer.save(guest=self.request.user, listing=listing)
+    def quote_total(self, serializer):
+        """
+        The server-side price of the stay being saved; the client's total_price is ignored.
+        """
+        instance = serializer.instance
+        data = serializer.validated_data
+        listing = data.get('listing', getattr(instance, 'listing', None))
+        check_in = data.get('check_in_date', getattr(instance, 'check_in_date', None))
+        check_out = data.get('check_out_date', getattr(instance, 'check_out_date', None))
+        return quote_stay(listing, check_in, check_out)['total']
 
-        # Trigger the Celery task to send a booking confirmation email
-        send_booking_confirmation_email_task.delay(booking.id)
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated],
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many bookings for the current user from a JSON array or an NDJSON
+        upload. All rows are created, or none and the per-row errors are returned.
+        """
+        return bulk_import_response(request, import_bookings, request.user, conflict=BookingConflict)
+
+    def export(self, request, fmt):
+        """
+        Stream bookings as CSV or NDJSON: every booking for staff, the user's own
+        bookings otherwise, or with `?scope=hosted` the bookings on the user's listings.
+        Routed explicitly in listings/urls.py as /bookings/export.<fmt>.
+        """
+        if request.query_params.get('scope') == 'hosted':
+            queryset = Booking.objects.filter(listing__owner=request.user)
+        else:
+            queryset = self.get_queryset()
+        return streaming_export(queryset, BOOKING_EXPORT_COLUMNS, fmt, 'bookings')
+
+    def perform_update(self, serializer):
+        """
+        Moving a booking to other dates is subject to the same overlap rule, and re-priced.
+        """
+        try:
+            serializer.save(total_price=self.quote_total(serializer))
+        except IntegrityError:
+            raise BookingConflict()
 
     def get_queryset(self):
         """
@@ -51,6 +278,8 @@ class BookingViewSet(viewsets.ModelViewSet):
         Or against the current authenticated user.
         """
         queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False):
+            return Booking.objects.none() # Schema generation (listings/schema.py) runs without a request
         user = self.request.user
         if user.is_authenticated:
             # Show all bookings if admin, otherwise only show user's bookings
@@ -58,3 +287,45 @@ class BookingViewSet(viewsets.ModelViewSet):
                 return queryset
             return queryset.filter(guest=user)
         return Booking.objects.none() # Don't show bookings to unauthenticated users
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_list(request):
+    """
+    Recent request profiles, newest first (see listings/profiling.py).
+    """
+    return Response(recent_profiles())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_download(request, profile_id, ext):
+    """
+    A stored profile as a pstats file (.prof, for snakeviz and friends) or as a text report (.txt).
+    """
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404('Profile not found or expired.')
+    if ext == 'txt':
+        sort = request.query_params.get('sort', 'cumulative')
+        try:
+            return HttpResponse(profile_summary(profile['stats'], sort=sort), content_type='text/plain; charset=utf-8')
+        except KeyError:
+            return Response({'detail': f'Unknown sort key {sort!r}.'}, status=status.HTTP_400_BAD_REQUEST)
+    response = HttpResponse(profile['stats'], content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="{profile_id}.prof"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def owner_analytics(request):
+    """
+    Occupancy, average daily rate and revenue of the user's listings between
+    `start` and `end`, by `period` (day, week or month), from the daily rollup.
+    """
+    params = AnalyticsQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    data = params.validated_data
+    report = owner_report(request.user, data['start'], data['end'], data['period'], data.get('listing'))
+    if 'listing' in data and not report['listings']:
+        raise Http404('No such listing of yours.')
+    return Response(report)
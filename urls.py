@@ -16,27 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from listings.metrics import metrics_view
+from listings.schema import schema_file, schema_ui
 
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="ALX Travel App API",
-      default_version='v1',
-      description="API documentation for the ALX Travel App",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@alxtravel.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
 urlpatterns = [
     path('admin/', admin.site.urls),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('api/', include('listings.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    # Precomputed by `manage.py precompute_schema`; drf_yasg is only imported for the docs pages
+    re_path(r'^swagger\.(?P<fmt>json|yaml)$', schema_file, name='schema-json'),
+    path('swagger/', schema_ui, {'renderer': 'swagger'}, name='schema-swagger-ui'),
+    path('redoc/', schema_ui, {'renderer': 'redoc'}, name='schema-redoc'),
 ]
\ No newline at end of file